@@ -0,0 +1,87 @@
+# benchmarks/_common.py
+# 基准测试公共工具：使用临时SQLite数据库创建应用，并模拟上游数据。
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+_tmpdir = tempfile.mkdtemp(prefix='guzi_bench_')
+os.environ.setdefault('TEST_DATABASE_URL', 'sqlite:///' + os.path.join(_tmpdir, 'bench.db'))
+os.environ.setdefault('SNAPSHOT_DIR', os.path.join(_tmpdir, 'snapshots'))
+os.environ.setdefault('SNAPSHOT_WARM_START', '0')
+os.environ.setdefault('REDIS_URL', '') # 只使用进程内缓存
+
+import pandas as pd
+
+from guzi_backend import create_app, db
+from guzi_backend.models import Stock
+from guzi_backend.services import data_service
+
+INDUSTRIES = ['银行', '保险', '券商', '白酒', '半导体', '医药', '汽车', '电力']
+
+
+def stock_codes(n: int) -> list:
+    return [f"{600000 + i:06d}" for i in range(n)]
+
+
+def fake_spot(codes, delay: float = 0.0):
+    """返回模拟的实时行情获取函数，每次调用等待delay秒模拟上游延迟。"""
+    rng = random.Random(1)
+    frame = pd.DataFrame({
+        '代码': codes,
+        '最新价': [rng.uniform(1, 100) for _ in codes],
+        '涨跌幅': [rng.uniform(-10, 10) for _ in codes],
+        '成交额': [rng.uniform(1e6, 1e9) for _ in codes],
+        '总市值': [rng.uniform(1e8, 1e12) for _ in codes],
+    })
+
+    def fetch():
+        time.sleep(delay)
+        return frame.copy()
+    return fetch
+
+
+def fake_valuation(codes, delay: float = 0.0):
+    """返回模拟的估值数据获取函数。"""
+    rng = random.Random(2)
+    frame = pd.DataFrame({
+        '股票代码': codes,
+        '市盈率': [rng.uniform(-5, 80) for _ in codes],
+        '市净率': [rng.uniform(-1, 10) for _ in codes],
+    })
+
+    def fetch():
+        time.sleep(delay)
+        return frame.copy()
+    return fetch
+
+
+def create_bench_app(n_stocks: int = 5000, upstream_delay: float = 0.0):
+    """创建测试配置的应用，写入n_stocks只股票，并把上游数据集替换为模拟数据。"""
+    app = create_app('testing')
+    codes = stock_codes(n_stocks)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.bulk_insert_mappings(Stock, [
+            {'code': code, 'name': f'股票{i}', 'industry': INDUSTRIES[i % len(INDUSTRIES)], 'market': 'A-Share'}
+            for i, code in enumerate(codes)
+        ])
+        db.session.commit()
+    data_service.DATASETS['spot']['fetch'] = fake_spot(codes, upstream_delay)
+    data_service.DATASETS['valuation']['fetch'] = fake_valuation(codes, upstream_delay)
+    return app
+
+
+def report(title: str, rows: list, columns: list):
+    """以对齐的表格打印基准结果。"""
+    print(f"\n{title}")
+    widths = [max(len(str(c)), *(len(str(r[i])) for r in rows)) for i, c in enumerate(columns)]
+    print('  '.join(str(c).ljust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print('  '.join(str(v).ljust(w) for v, w in zip(row, widths)))
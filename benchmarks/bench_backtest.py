@@ -0,0 +1,80 @@
+# benchmarks/bench_backtest.py
+# 在模拟的全市场日线矩阵上回测各内置策略，并对比参数扫描在单进程与进程池中的耗时。
+#
+# 用法：python benchmarks/bench_backtest.py [--stocks 5500] [--years 5] [--sweep 8] [--workers 4]
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from _common import INDUSTRIES, report, stock_codes
+from guzi_backend.services import snapshot_store
+from guzi_backend.services.analysis_service import STRATEGY_PARAMS
+from guzi_backend.services.backtest_service import run_backtest, run_parameter_sweep
+from guzi_backend.services.bar_store import BAR_STORE_FORMAT_VERSION, load_bar_store
+
+
+def build_store(directory: str, n_stocks: int, n_days: int) -> str:
+    """生成随机游走的日线矩阵：股票分批上市，少量停牌（NaN）。"""
+    rng = np.random.default_rng(0)
+    returns = rng.normal(0.0003, 0.025, (n_days, n_stocks))
+    close = 10 * np.cumprod(1 + returns, axis=0)
+    shares = rng.uniform(1e8, 5e9, n_stocks)
+    listed_from = rng.integers(0, n_days // 2, n_stocks) * (rng.random(n_stocks) < 0.2)
+    rows = np.arange(n_days)[:, None]
+    close[rows < listed_from] = np.nan
+    close[rng.random((n_days, n_stocks)) < 0.01] = np.nan
+
+    change = np.full_like(close, np.nan)
+    change[1:] = (close[1:] / close[:-1] - 1) * 100
+    arrays = {
+        'dates': np.busday_offset('2019-01-02', np.arange(n_days)).astype('datetime64[D]'),
+        'codes': np.asarray(stock_codes(n_stocks), dtype=str),
+        'industries': np.asarray([INDUSTRIES[i % len(INDUSTRIES)] for i in range(n_stocks)], dtype=str),
+        'close': close,
+        'change': change,
+        'amount': close * rng.uniform(1e6, 1e8, (n_days, n_stocks)),
+        'market_cap': close * shares,
+        'pe': rng.uniform(-20, 80, (n_days, n_stocks)),
+        'pb': rng.uniform(-1, 10, (n_days, n_stocks)),
+    }
+    return snapshot_store.publish_snapshot(directory, arrays, {'format': BAR_STORE_FORMAT_VERSION})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--stocks', type=int, default=5500)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--sweep', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='guzi_bars_')
+    n_days = args.years * 250
+    build_store(directory, args.stocks, n_days)
+    store = load_bar_store(directory)
+
+    rows = []
+    for strategy in STRATEGY_PARAMS:
+        started = time.perf_counter()
+        result = run_backtest(store, strategy)
+        elapsed = time.perf_counter() - started
+        rows.append((strategy, result['rebalances'], f"{result['stats']['annual_return']:.1%}",
+                     f"{result['average_turnover']:.1%}", f"{elapsed:.2f}"))
+    report(f"Single backtests: {n_days} trading days x {args.stocks} stocks, rebalance every 20 days",
+           rows, ['strategy', 'rebalances', 'annual', 'turnover', 'seconds'])
+
+    param_sets = [{'top_n': 10 + 10 * i, 'w_technical': 0.1 * (i % 5 + 1)} for i in range(args.sweep)]
+    rows = []
+    for workers in sorted({1, args.workers}):
+        started = time.perf_counter()
+        run_parameter_sweep(directory, 'comprehensive', param_sets, workers=workers)
+        rows.append((workers, len(param_sets), f"{time.perf_counter() - started:.2f}"))
+    report(f"Parameter sweep (comprehensive, {os.cpu_count()} CPUs)", rows, ['workers', 'param sets', 'seconds'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+# benchmarks/bench_db_concurrency.py
+# 股票列表同步（update_stock_list_in_db）进行期间，对比SQLite回滚日志模式与WAL模式下的读取延迟。
+#
+# 用法：python benchmarks/bench_db_concurrency.py [--stocks 20000] [--readers 4] [--syncs 3]
+#
+# 写线程反复执行股票列表同步，每次同步都修改全部股票名称；
+# 多个读进程同时按行业查询股票列表，统计读取吞吐量和延迟分布。
+
+import argparse
+import contextlib
+import io
+import multiprocessing
+import time
+
+from _common import INDUSTRIES, create_bench_app, report, stock_codes
+from guzi_backend import db
+from guzi_backend.cache import cache
+from guzi_backend.config import TestingConfig
+from guzi_backend.models import Stock
+from guzi_backend.services import data_service
+
+MODES = (
+    ('rollback journal', {'journal_mode': 'DELETE', 'synchronous': 'FULL'}),
+    ('WAL + tuned pragmas', TestingConfig.SQLITE_PRAGMAS),
+)
+
+
+def seed_upstream(codes, generation: int):
+    """把模拟的上游股票列表和行业映射写入本地缓存，每一代的股票名称都不同。"""
+    cache.set_many({
+        'all_stocks_a_shares': [{'code': code, 'name': f'股票{i}-{generation}'} for i, code in enumerate(codes)],
+        'stock_industry_map': {code: INDUSTRIES[i % len(INDUSTRIES)] for i, code in enumerate(codes)},
+    })
+
+
+def read_loop(app, stop, results):
+    """读进程：按行业查询股票列表直到写入结束，返回每次查询的耗时。"""
+    with app.app_context():
+        db.engine.dispose(close=False)  # 不复用父进程的连接
+        latencies = []
+        while not stop.is_set():
+            started = time.perf_counter()
+            db.session.query(Stock.code, Stock.name).filter(Stock.industry == '银行').all()
+            db.session.rollback()
+            latencies.append(time.perf_counter() - started)
+    results.put(latencies)
+
+
+def run(app, codes, readers: int, syncs: int) -> tuple:
+    # 读取放在独立进程中，读写竞争的只是数据库锁而不是GIL
+    context = multiprocessing.get_context('fork')
+    stop = context.Event()
+    results = context.Queue()
+    processes = [context.Process(target=read_loop, args=(app, stop, results)) for _ in range(readers)]
+    for process in processes:
+        process.start()
+
+    sync_times = []
+    with app.app_context():
+        for generation in range(1, syncs + 1):
+            seed_upstream(codes, generation)
+            started = time.perf_counter()
+            data_service.update_stock_list_in_db()
+            sync_times.append(time.perf_counter() - started)
+    stop.set()
+    latencies = sorted(value for _ in processes for value in results.get())
+    for process in processes:
+        process.join()
+
+    elapsed = sum(sync_times)
+    return (
+        len(latencies) / elapsed,
+        latencies[len(latencies) // 2],
+        latencies[int(len(latencies) * 0.99) - 1],
+        latencies[-1],
+        elapsed / syncs,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--stocks', type=int, default=20000)
+    parser.add_argument('--readers', type=int, default=4, help='并发读进程数')
+    parser.add_argument('--syncs', type=int, default=3, help='写线程执行的同步次数')
+    args = parser.parse_args()
+
+    codes = stock_codes(args.stocks)
+    rows = []
+    for label, pragmas in MODES:
+        TestingConfig.SQLITE_PRAGMAS = pragmas
+        with contextlib.redirect_stdout(io.StringIO()):
+            app = create_bench_app(args.stocks)
+            rps, p50, p99, worst, sync = run(app, codes, args.readers, args.syncs)
+        with app.app_context():
+            db.engine.dispose()
+        rows.append((label, f"{rps:.0f}", f"{p50 * 1000:.1f}", f"{p99 * 1000:.1f}", f"{worst * 1000:.0f}", f"{sync:.2f}"))
+
+    report(
+        f"reads during stock-list sync, {args.stocks} stocks, {args.readers} readers",
+        rows, ['journal', 'reads/s', 'p50 ms', 'p99 ms', 'max ms', 'sync s']
+    )
+
+
+if __name__ == '__main__':
+    main()
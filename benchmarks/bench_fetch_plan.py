@@ -0,0 +1,98 @@
+# benchmarks/bench_fetch_plan.py
+# 对比综合评分接口在上游较慢时，获取计划执行器（fetch_bundle）按顺序获取与在线程池中并发获取缺失数据集的吞吐量。
+#
+# 用法：python benchmarks/bench_fetch_plan.py [--delay 0.3] [--clients 8] [--requests 64]
+#
+# 每个请求都使用空的请求级缓存，模拟每次都要访问上游（冷启动/缓存失效）的情况。
+# 并发模式下同时进行的请求会共享同一数据集的进行中获取任务。
+
+import argparse
+import contextlib
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import g
+
+from _common import create_bench_app, report
+from guzi_backend.cache import cache
+from guzi_backend.services import data_service
+
+
+class RequestScopedCache:
+    """每个请求开始时为空的缓存，替换进程级缓存以模拟冷请求。"""
+
+    def _store(self) -> dict:
+        if 'bench_cache' not in g:
+            g.bench_cache = {}
+        return g.bench_cache
+
+    def get(self, key, default=None):
+        return self._store().get(key, default)
+
+    def __contains__(self, key):
+        return key in self._store()
+
+    def __getitem__(self, key):
+        return self._store()[key]
+
+    def __setitem__(self, key, value):
+        self._store()[key] = value
+
+    def items(self):
+        return self._store().items()
+
+    def clear(self):
+        self._store().clear()
+
+
+class NoStoreCache(dict):
+    """从不保存任何内容的原始数据缓存，上游获取线程中没有请求上下文，无法使用请求级缓存。"""
+
+    def __setitem__(self, key, value):
+        pass
+
+
+def run(app, clients: int, total: int) -> tuple:
+    def one(_):
+        with app.test_client() as client:
+            started = time.perf_counter()
+            response = client.get('/api/v1/analysis/comprehensive-score')
+            assert response.status_code == 200, response.status_code
+            return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        latencies = sorted(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+    return total / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--delay', type=float, default=0.3, help='模拟的单个上游数据集延迟（秒）')
+    parser.add_argument('--clients', type=int, default=8, help='并发客户端（worker线程）数')
+    parser.add_argument('--requests', type=int, default=64)
+    parser.add_argument('--stocks', type=int, default=5000)
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = create_bench_app(args.stocks, args.delay)
+    data_service._aligned_cache = RequestScopedCache()
+    cache.local = NoStoreCache()
+
+    rows = []
+    for label, concurrent in (('sequential', False), ('concurrent fan-out', True)):
+        app.config['ASYNC_UPSTREAM_FETCH'] = concurrent
+        with contextlib.redirect_stdout(io.StringIO()):
+            rps, p50, p95 = run(app, args.clients, args.requests)
+        rows.append((label, f"{rps:.2f}", f"{p50 * 1000:.0f}", f"{p95 * 1000:.0f}"))
+
+    report(
+        f"comprehensive-score, upstream delay {args.delay}s per dataset, {args.clients} clients",
+        rows, ['mode', 'req/s', 'p50 ms', 'p95 ms']
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# benchmarks/bench_json.py
+# 对比Flask默认JSON提供器与FastJSONProvider（orjson + DataFrame直接序列化）生成大响应的耗时。
+#
+# 用法：python benchmarks/bench_json.py [--stocks 5000] [--repeat 20]
+
+import argparse
+import contextlib
+import io
+import time
+
+import numpy as np
+import pandas as pd
+from flask.json.provider import DefaultJSONProvider
+
+from _common import INDUSTRIES, create_bench_app, report, stock_codes
+from guzi_backend.json_provider import FastJSONProvider, frame_json, orjson
+
+
+def timed(func, repeat: int) -> float:
+    """多次执行取最快一次的耗时（毫秒）。"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--stocks', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = create_bench_app(n_stocks=10)
+    default_provider = DefaultJSONProvider(app)
+    fast_provider = FastJSONProvider(app)
+
+    codes = stock_codes(args.stocks)
+    rng = np.random.default_rng(0)
+    stocks_df = pd.DataFrame({'code': codes, 'name': [f'股票{i}' for i in range(args.stocks)]})
+    # 全市场评分列表：每只股票一个字典，数值为NumPy标量（与策略直接读取对齐数组时一致）
+    scores = [
+        {
+            'code': code, 'name': f'股票{i}', 'industry': INDUSTRIES[i % len(INDUSTRIES)],
+            'comprehensive_score': np.float64(s), 'market_cap': np.float64(m),
+            'change_percent': np.float64(c), 'pe': np.float64(pe), 'pb': np.float64(pb)
+        }
+        for i, (code, s, m, c, pe, pb) in enumerate(zip(
+            codes, rng.random(args.stocks), rng.uniform(1e8, 1e12, args.stocks), rng.uniform(-10, 10, args.stocks),
+            rng.uniform(-5, 80, args.stocks), rng.uniform(-1, 10, args.stocks)
+        ))
+    ]
+
+    def envelope(data):
+        return {"code": 0, "message": "Success", "data": data}
+
+    cases = (
+        ('all-stocks (DataFrame)',
+         lambda: default_provider.response(envelope({
+             'count': len(stocks_df), 'stocks': stocks_df.to_dict(orient='records')})),
+         lambda: fast_provider.response(envelope({
+             'count': len(stocks_df), 'stocks': frame_json(stocks_df)}))),
+        ('comprehensive scores (dicts)',
+         lambda: default_provider.response(envelope({'stocks': scores})),
+         lambda: fast_provider.response(envelope({'stocks': scores}))),
+    )
+
+    rows = []
+    with app.app_context():
+        for label, before, after in cases:
+            size = len(after().get_data())
+            before_ms, after_ms = timed(before, args.repeat), timed(after, args.repeat)
+            rows.append((label, f"{size / 1024:.0f}", f"{before_ms:.2f}", f"{after_ms:.2f}", f"{before_ms / after_ms:.1f}x"))
+
+    report(
+        f"JSON response encoding, {args.stocks} stocks (orjson {'available' if orjson else 'not installed'})",
+        rows, ['payload', 'KB', 'default ms', 'fast ms', 'speedup']
+    )
+
+
+if __name__ == '__main__':
+    main()
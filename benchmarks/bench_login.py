@@ -0,0 +1,68 @@
+# benchmarks/bench_login.py
+# 测量登录接口在不同密码哈希参数和哈希线程数下的吞吐量（每核QPS）。
+#
+# 用法：python benchmarks/bench_login.py [--clients 16] [--requests 200] [--methods scrypt:32768:8:1 pbkdf2:sha256:600000]
+#
+# 每组参数都会先注册一个用户，再由多个客户端线程并发登录；503表示哈希线程池已满被拒绝的请求。
+
+import argparse
+import contextlib
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from _common import create_bench_app, report
+from guzi_backend.services.password_service import password_hasher
+
+
+def run(app, clients: int, total: int) -> tuple:
+    def one(i):
+        with app.test_client() as client:
+            response = client.post('/api/v1/auth/login', json={'username': 'bench', 'password': 'bench-password'})
+            return response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        statuses = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+    ok = statuses.count(200)
+    assert ok + statuses.count(503) == total, set(statuses)
+    return ok / elapsed, statuses.count(503)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=16, help='并发客户端（请求线程）数')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--workers', type=int, nargs='+', default=sorted({1, os.cpu_count() or 1}),
+                        help='密码哈希线程数（占用的核心数）')
+    parser.add_argument('--methods', nargs='+', default=['scrypt:32768:8:1', 'scrypt:16384:8:1', 'pbkdf2:sha256:600000'])
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = create_bench_app(n_stocks=10)
+
+    rows = []
+    for method in args.methods:
+        for workers in args.workers:
+            app.config.update(PASSWORD_HASH_METHOD=method, PASSWORD_HASH_WORKERS=workers,
+                              PASSWORD_HASH_MAX_PENDING=args.clients)
+            password_hasher.init_app(app)
+            with app.test_client() as client:
+                client.post('/api/v1/auth/register', json={
+                    'username': 'bench', 'email': 'bench@example.com', 'password': 'bench-password'
+                })
+                # 参数与已保存的哈希不同时，第一次登录会按新参数重新哈希
+                client.post('/api/v1/auth/login', json={'username': 'bench', 'password': 'bench-password'})
+            qps, rejected = run(app, args.clients, args.requests)
+            rows.append((method, workers, f"{qps:.1f}", f"{qps / workers:.1f}", rejected))
+
+    report(
+        f"login, {args.clients} clients, {args.requests} requests",
+        rows, ['hash method', 'hash threads', 'login/s', 'login/s per core', '503']
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# benchmarks/bench_startup.py
+# 测量应用启动（导入guzi_backend并执行create_app）的耗时，列出导入最慢的模块，
+# 并检查重量级依赖（akshare、pandas、Gemini SDK、redis）没有在启动时被导入。
+#
+# 用法：python benchmarks/bench_startup.py [--repeat 5] [--top 10]
+# 启动时导入了受保护的模块时以非零状态退出，可用于CI检查。
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+from _common import ROOT, report
+
+# 启动时不应导入的模块，只在首次获取数据或调用大模型时导入
+GUARDED_MODULES = ('akshare', 'pandas', 'google.generativeai', 'redis')
+
+STARTUP_SCRIPT = f"""
+import sys, time
+started = time.perf_counter()
+from guzi_backend import create_app
+create_app('testing')
+print('startup:', time.perf_counter() - started)
+print('imported:', ','.join(m for m in {GUARDED_MODULES!r} if m in sys.modules))
+"""
+
+
+def run_startup(importtime: bool = False):
+    """在新的解释器中启动应用，返回 (耗时秒数, 已导入的受保护模块, importtime输出)。"""
+    env = dict(os.environ, REDIS_URL='redis://127.0.0.1:1/0', PYTHONWARNINGS='ignore')
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', STARTUP_SCRIPT]
+    result = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    values = dict(line.split(': ', 1) for line in result.stdout.splitlines() if line.startswith(('startup:', 'imported:')))
+    imported = [m for m in values['imported'].split(',') if m]
+    return float(values['startup']), imported, result.stderr
+
+
+def slowest_imports(importtime_output: str, top: int) -> list:
+    """解析 -X importtime 的输出，返回自身耗时最长的模块 (模块名, 自身毫秒, 累计毫秒)。"""
+    rows = []
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((name.strip(), int(own) / 1000, int(cumulative) / 1000))
+    rows.sort(key=lambda row: row[1], reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    timings, imported = [], []
+    for _ in range(args.repeat):
+        elapsed, imported, _ = run_startup()
+        timings.append(elapsed)
+    _, _, importtime_output = run_startup(importtime=True)
+
+    report(
+        f"create_app startup over {args.repeat} runs",
+        [(f"{min(timings):.3f}", f"{statistics.median(timings):.3f}", ', '.join(imported) or 'none')],
+        ['best s', 'median s', 'guarded modules imported']
+    )
+    report(
+        "Slowest imports (python -X importtime)",
+        [(name, f"{own:.1f}", f"{cumulative:.1f}") for name, own, cumulative in slowest_imports(importtime_output, args.top)],
+        ['module', 'self ms', 'cumulative ms']
+    )
+    if imported:
+        sys.exit(f"Heavy modules imported at startup: {', '.join(imported)}")
+
+
+if __name__ == '__main__':
+    main()
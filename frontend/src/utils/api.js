@@ -89,4 +89,11 @@ export const getGeminiGenerateDebug = (prompt) => {
   return api.get('/debug/gemini-generate', { params: { prompt } })
 }
 
+// 订阅自选股行情推送（SSE），EventSource无法设置请求头，令牌通过查询参数传递
+export const subscribeWatchlistQuotes = (token, onQuote) => {
+  const source = new EventSource(`${API_BASE_URL}/watchlist/stream?jwt=${encodeURIComponent(token)}`)
+  source.addEventListener('quote', (event) => onQuote(JSON.parse(event.data)))
+  return source
+}
+
 export default api
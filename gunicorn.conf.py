@@ -0,0 +1,60 @@
+# gunicorn.conf.py
+# 多worker生产部署配置：gunicorn -c gunicorn.conf.py run:app
+#
+# 主进程启动时拉起唯一的快照刷新进程（flask refresh-snapshot），
+# 各worker以 MARKET_DATA_MODE=shared 只读挂载其发布的内存映射快照，
+# 不再各自持有一份行情/估值数据，单个worker的内存占用与worker数量无关。
+# 同时拉起 JOB_WORKERS 个后台任务进程（flask jobs-worker），执行 /api/v1/admin/jobs 提交的任务。
+#
+# 自选股行情推送（SSE）的订阅索引在每个worker进程内维护，增删自选股的请求可能由另一个worker处理：
+# 配置REDIS_URL时变化经Redis频道即时同步到持有连接的worker；未配置Redis时各连接每个心跳（15秒）
+# 从数据库重新加载一次自选股，变化最多延迟一个心跳间隔才生效。
+# 有SSE连接的worker由后台线程每秒检查一次共享快照，新行情不依赖请求到达即可推送。
+#
+# 每个SSE连接占用一个gthread线程：每个worker最多同时保持 WATCHLIST_MAX_STREAMS（默认8）个连接，
+# 超出时返回503，其余线程留给普通请求。需要支持更多连接时同时调大 GUNICORN_THREADS 和 WATCHLIST_MAX_STREAMS。
+
+import multiprocessing
+import os
+import subprocess
+import sys
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+# 使用线程worker，SSE长连接（/api/v1/watchlist/stream）只占用线程而不是整个worker进程，连接数上限见文件开头
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+
+# worker在加载应用前读取该环境变量
+os.environ.setdefault('MARKET_DATA_MODE', 'shared')
+
+_refresher = None
+_job_workers = []
+
+
+def _flask_command(*args):
+    return subprocess.Popen(
+        [sys.executable, '-m', 'flask', '--app', 'run', *args],
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+
+
+def on_starting(server):
+    """启动快照刷新进程（设置 SNAPSHOT_REFRESHER=0 可改为单独部署）和后台任务进程（JOB_WORKERS=0 时不启动）。"""
+    global _refresher
+    if os.environ.get('SNAPSHOT_REFRESHER', '1') != '0':
+        _refresher = _flask_command('refresh-snapshot')
+        server.log.info(f"Started snapshot refresher (pid {_refresher.pid}).")
+    for _ in range(int(os.environ.get('JOB_WORKERS', 1))):
+        worker = _flask_command('jobs-worker')
+        _job_workers.append(worker)
+        server.log.info(f"Started job worker (pid {worker.pid}).")
+
+
+def on_exit(server):
+    """主进程退出时停止刷新进程和后台任务进程。"""
+    for process in [_refresher, *_job_workers]:
+        if process is not None and process.poll() is None:
+            process.terminate()
+            process.wait(timeout=10)
@@ -4,7 +4,10 @@ from flask import Flask
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from .config import config
-from .database import db
+from .database import db, apply_sqlite_pragmas
+from .json_provider import FastJSONProvider
+from .compression import compressor
+from .cache import cache
 from .services.ai_manager import ai_manager
 
 # 初始化JWTManager
@@ -20,11 +23,37 @@ def create_app(config_name='default'):
     # 从配置对象中加载配置
     app.config.from_object(config[config_name])
 
+    # 使用orjson序列化响应，原生支持NumPy/pandas类型
+    app.json = FastJSONProvider(app)
+
+    # 按Accept-Encoding压缩响应（gzip，以及已安装时的brotli、zstd）
+    compressor.init_app(app)
+
+    # 读取Redis缓存配置（首次使用时才创建连接池）
+    cache.init_app(app)
+
     # 初始化JWT
     jwt.init_app(app)
 
     # 初始化SQLAlchemy
     db.init_app(app)
+    apply_sqlite_pragmas(app)
+
+    # 注册JWT的current_user加载函数（带身份缓存）
+    from .services.identity_cache import identity_cache
+    identity_cache.init_app(app, jwt)
+
+    # 初始化密码哈希线程池
+    from .services.password_service import password_hasher
+    password_hasher.init_app(app)
+
+    # 加载磁盘上的市场数据快照，冷启动后立即可用
+    from .services import data_service
+    data_service.init_app(app)
+
+    # 行情推送中心：跨worker进程同步自选股变化时在应用上下文中读取数据库
+    from .services.quote_hub import quote_hub
+    quote_hub.init_app(app)
 
     # 初始化AI管理器
     ai_manager.init_app(app)
@@ -40,4 +69,10 @@ def create_app(config_name='default'):
     from .routes.watchlist import watchlist_bp
     app.register_blueprint(watchlist_bp)
 
+    from .routes.stocks import stocks_bp
+    app.register_blueprint(stocks_bp)
+
+    from .routes.admin import admin_bp
+    app.register_blueprint(admin_bp)
+
     return app
@@ -0,0 +1,201 @@
+# guzi_backend/cache.py
+
+import json
+import threading
+import time
+from .lazy import lazy_import
+
+redis = lazy_import('redis')
+
+# 未调用init_app时（例如脚本直接导入服务模块）使用的默认配置，与config.Config一致
+DEFAULT_CONFIG = {
+    'REDIS_URL': 'redis://localhost:6379/0',
+    'REDIS_CONNECT_TIMEOUT': 1.0,
+    'REDIS_SOCKET_TIMEOUT': 2.0,
+    'REDIS_HEALTH_CHECK_INTERVAL': 30,
+    'REDIS_MAX_CONNECTIONS': 20,
+    'REDIS_POOL_TIMEOUT': 2.0,
+    'REDIS_RETRIES': 2,
+    'REDIS_RETRY_SECONDS': 30,
+}
+DEFAULT_EXPIRATION_SECONDS = 3600
+
+
+class CacheStore:
+    """
+    共享缓存层：优先使用Redis，不可用时使用进程内缓存。
+
+    - 进程内所有线程共享一个有界连接池（BlockingConnectionPool），连接、读写和取连接都有超时；
+    - 连接错误和超时先由redis-py按指数退避自动重连重试，仍然失败时在REDIS_RETRY_SECONDS内改用进程内缓存，
+      之后自动恢复使用Redis，Redis故障不会让每个请求都等待超时；
+    - get_many/set_many 用一次MGET或一次流水线完成多个键的读写；
+    - 客户端可以注入（init_app(app, client=...) 或 use_client），例如测试中使用fakeredis。
+
+    值以JSON保存；进程内缓存按读取时传入的有效期判断过期。
+    """
+
+    def __init__(self):
+        self.config = dict(DEFAULT_CONFIG)
+        self.local = {}
+        self._client = None
+        self._injected = False
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app, client=None):
+        """读取Redis配置（不在此时连接）；传入client时使用该客户端而不是按REDIS_URL创建连接池。"""
+        self.config = {name: app.config.get(name, default) for name, default in DEFAULT_CONFIG.items()}
+        self.reset()
+        if client is not None:
+            self.use_client(client)
+        app.extensions['cache_store'] = self
+
+    def use_client(self, client):
+        """注入已创建的Redis客户端（或兼容对象），传入None时只使用进程内缓存。"""
+        with self._lock:
+            self._close()
+            self._client = client
+            self._injected = True
+            self._retry_at = 0.0
+
+    def reset(self):
+        """断开连接池并清空进程内缓存，下次访问时按当前配置重新创建。"""
+        with self._lock:
+            self._close()
+            self._client = None
+            self._injected = False
+            self._retry_at = 0.0
+        self.local.clear()
+
+    def _close(self):
+        if not self._injected and self._client not in (None, False):
+            self._client.connection_pool.disconnect()
+
+    @property
+    def client(self):
+        """当前可用的Redis客户端，未配置或处于故障回退期内时为None。首次访问时创建连接池。"""
+        if self._injected:
+            return self._client if time.monotonic() >= self._retry_at else None
+        if self._client is None:
+            with self._lock:
+                if self._client is None and not self._injected:
+                    self._client = self._create_client()
+        if self._client is False or time.monotonic() < self._retry_at:
+            return None
+        return self._client
+
+    def _create_client(self):
+        config = self.config
+        if not config['REDIS_URL']:
+            return False
+        from redis.backoff import ExponentialBackoff
+        from redis.retry import Retry
+        pool = redis.BlockingConnectionPool.from_url(
+            config['REDIS_URL'],
+            max_connections=config['REDIS_MAX_CONNECTIONS'],
+            timeout=config['REDIS_POOL_TIMEOUT'],
+            decode_responses=True,
+            socket_connect_timeout=config['REDIS_CONNECT_TIMEOUT'],
+            socket_timeout=config['REDIS_SOCKET_TIMEOUT'],
+            health_check_interval=config['REDIS_HEALTH_CHECK_INTERVAL'],
+            retry=Retry(ExponentialBackoff(cap=0.5, base=0.05), config['REDIS_RETRIES']),
+            retry_on_error=[redis.exceptions.ConnectionError, redis.exceptions.TimeoutError],
+        )
+        return redis.Redis(connection_pool=pool)
+
+    def _failed(self, e: Exception):
+        """重试后仍然失败：在REDIS_RETRY_SECONDS内使用进程内缓存。"""
+        seconds = self.config['REDIS_RETRY_SECONDS']
+        print(f"Redis unavailable: {e}. Falling back to local in-memory cache for {seconds}s.")
+        self._retry_at = time.monotonic() + seconds
+
+    def _redis_errors(self):
+        """按故障处理的异常（连接池耗尽时redis-py也抛出ConnectionError）。"""
+        return (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError)
+
+    # --- 进程内缓存 ---
+    def _local_get(self, key: str, expiration: int):
+        item = self.local.get(key)
+        if item is not None and time.time() - item['timestamp'] < expiration:
+            return item['data']
+        return None
+
+    def _local_set(self, key: str, data):
+        self.local[key] = {'data': data, 'timestamp': time.time()}
+
+    # --- 读写接口 ---
+    def get(self, key: str, expiration: int = DEFAULT_EXPIRATION_SECONDS):
+        """读取一个键，不存在或已过期时返回None。"""
+        return self.get_many([key], {key: expiration}).get(key)
+
+    def get_many(self, keys, expirations: dict = None) -> dict:
+        """
+        一次往返读取多个键（MGET）。
+
+        Args:
+            keys (list): 键列表。
+            expirations (dict): 各键在进程内缓存中的有效期（秒），默认DEFAULT_EXPIRATION_SECONDS。
+
+        Returns:
+            dict: 命中的键到值的映射，未命中的键不出现在结果中。
+        """
+        keys = list(keys)
+        if not keys:
+            return {}
+        client = self.client
+        if client is not None:
+            try:
+                values = client.mget(keys)
+            except self._redis_errors() as e:
+                self._failed(e)
+            else:
+                found = {key: json.loads(value) for key, value in zip(keys, values) if value}
+                for key in found:
+                    print(f"Cache hit for {key} in Redis.")
+                return found
+
+        expirations = expirations or {}
+        found = {}
+        for key in keys:
+            data = self._local_get(key, expirations.get(key, DEFAULT_EXPIRATION_SECONDS))
+            if data:
+                print(f"Cache hit for {key} in local memory.")
+                found[key] = data
+        return found
+
+    def set(self, key: str, data, expiration: int = DEFAULT_EXPIRATION_SECONDS):
+        """写入一个键，expiration为有效期（秒）。"""
+        self.set_many({key: data}, {key: expiration})
+
+    def set_many(self, items: dict, expirations: dict = None):
+        """
+        一次往返写入多个键（非事务流水线中的多个SETEX）。
+
+        Args:
+            items (dict): 键到值的映射，值须可JSON序列化。
+            expirations (dict): 各键的有效期（秒），默认DEFAULT_EXPIRATION_SECONDS。
+        """
+        if not items:
+            return
+        expirations = expirations or {}
+        client = self.client
+        if client is not None:
+            try:
+                with client.pipeline(transaction=False) as pipe:
+                    for key, data in items.items():
+                        pipe.setex(key, expirations.get(key, DEFAULT_EXPIRATION_SECONDS), json.dumps(data))
+                    pipe.execute()
+            except self._redis_errors() as e:
+                print(f"Redis connection error, could not cache {', '.join(items)}: {e}")
+                self._failed(e)
+            else:
+                for key in items:
+                    print(f"Cached {key} in Redis.")
+                return
+        for key, data in items.items():
+            self._local_set(key, data)
+            print(f"Cached {key} in local memory.")
+
+
+# 全局缓存实例
+cache = CacheStore()
@@ -0,0 +1,92 @@
+# guzi_backend/compression.py
+
+import gzip
+from flask import request
+
+try:
+    import brotli
+except ImportError: # 可选依赖，未安装时不提供br编码
+    brotli = None
+
+try:
+    import zstandard
+except ImportError: # 可选依赖，未安装时不提供zstd编码
+    zstandard = None
+
+# 可压缩的响应类型
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript'}
+DEFAULT_LEVELS = {'br': 5, 'zstd': 3, 'gzip': 6}
+
+
+def _compress_gzip(data: bytes, level: int) -> bytes:
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _compress_br(data: bytes, level: int) -> bytes:
+    return brotli.compress(data, quality=level)
+
+
+def _compress_zstd(data: bytes, level: int) -> bytes:
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+# 服务端偏好顺序：客户端给出相同权重时优先使用靠前的编码
+_COMPRESSORS = {'br': _compress_br, 'zstd': _compress_zstd, 'gzip': _compress_gzip}
+_AVAILABLE = [name for name, module in (('br', brotli), ('zstd', zstandard), ('gzip', gzip)) if module is not None]
+
+
+class Compressor:
+    """
+    按Accept-Encoding协商gzip/brotli/zstd并压缩响应。
+
+    after_request中压缩普通响应；按数据版本缓存的响应（response_cache）通过compress()
+    为每种编码只压缩一次，之后的请求直接返回预压缩的字节，不再经过中间件。
+    """
+
+    def __init__(self):
+        self.min_size = 500
+        self.levels = dict(DEFAULT_LEVELS)
+        self.encodings = list(_AVAILABLE)
+
+    def init_app(self, app):
+        """读取配置并注册after_request压缩钩子。"""
+        self.min_size = app.config.get('COMPRESSION_MIN_SIZE', 500)
+        self.levels = {**DEFAULT_LEVELS, **app.config.get('COMPRESSION_LEVELS', {})}
+        enabled = app.config.get('COMPRESSION_ENCODINGS') or _AVAILABLE
+        self.encodings = [name for name in enabled if name in _AVAILABLE]
+        app.after_request(self.compress_response)
+
+    def negotiate(self, size: int):
+        """根据当前请求的Accept-Encoding和响应大小选择编码，不需要压缩时返回None。"""
+        if size < self.min_size or not self.encodings:
+            return None
+        encoding = request.accept_encodings.best_match(self.encodings)
+        return encoding if encoding in _COMPRESSORS else None
+
+    def compress(self, data: bytes, encoding: str) -> bytes:
+        """按配置的级别压缩数据。"""
+        return _COMPRESSORS[encoding](data, self.levels[encoding])
+
+    def compress_response(self, response):
+        """压缩尚未编码的完整响应，流式响应（SSE等）和条件请求的304不处理。"""
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code < 200 or response.status_code in (204, 304)
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        data = response.get_data()
+        encoding = self.negotiate(len(data))
+        if encoding is None:
+            return response
+        response.set_data(self.compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        if response.get_etag()[0]:
+            etag, weak = response.get_etag()
+            response.set_etag(f'{etag}-{encoding}', weak)
+        return response
+
+
+# 全局压缩器实例
+compressor = Compressor()
@@ -11,6 +11,91 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'super-secret-jwt-key' # 用于JWT签名和验证
 
+    # 市场数据模式：'local' 每个进程自行获取上游数据；'shared' 挂载刷新进程发布的共享快照（多worker部署）
+    MARKET_DATA_MODE = os.environ.get('MARKET_DATA_MODE') or 'local'
+    SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR') or os.path.join(basedir, '../snapshots')
+    SNAPSHOT_REFRESH_SECONDS = int(os.environ.get('SNAPSHOT_REFRESH_SECONDS') or 60)
+    # 每个进程最多同时保持的自选股行情推送（SSE）连接数：每个连接占用一个worker线程，应小于GUNICORN_THREADS
+    WATCHLIST_MAX_STREAMS = int(os.environ.get('WATCHLIST_MAX_STREAMS') or 8)
+    # 行业映射需要逐个爬取数百个行业页面，按该间隔（秒）在后台线程中单独刷新，发布快照时沿用最近一次的结果
+    INDUSTRY_MAP_REFRESH_SECONDS = int(os.environ.get('INDUSTRY_MAP_REFRESH_SECONDS') or 6 * 3600)
+    # 获取计划执行器（fetch_bundle）是否在线程池中并发获取多个缺失的上游数据集（设为0时按顺序获取，用于对比或排查问题）
+    ASYNC_UPSTREAM_FETCH = os.environ.get('ASYNC_UPSTREAM_FETCH', '1') != '0'
+    # 启动时从磁盘快照预热股票列表、行业映射、行情和估值数据
+    SNAPSHOT_WARM_START = os.environ.get('SNAPSHOT_WARM_START', '1') != '0'
+    # 上游熔断：连续失败该次数后打开，退避时间内直接使用最近一次成功获取的数据；
+    # 之后每次探测失败退避时间加倍（秒），不超过上限
+    UPSTREAM_FAILURE_THRESHOLD = int(os.environ.get('UPSTREAM_FAILURE_THRESHOLD') or 3)
+    UPSTREAM_RETRY_SECONDS = float(os.environ.get('UPSTREAM_RETRY_SECONDS') or 30)
+    UPSTREAM_MAX_RETRY_SECONDS = float(os.environ.get('UPSTREAM_MAX_RETRY_SECONDS') or 600)
+    # Redis缓存：首次使用时连接，设为空字符串时只使用进程内缓存；连接/读写超时（秒）避免Redis不可达时阻塞启动和请求
+    REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+    REDIS_CONNECT_TIMEOUT = float(os.environ.get('REDIS_CONNECT_TIMEOUT') or 1.0)
+    REDIS_SOCKET_TIMEOUT = float(os.environ.get('REDIS_SOCKET_TIMEOUT') or 2.0)
+    # 空闲超过该秒数的连接在使用前先PING检查
+    REDIS_HEALTH_CHECK_INTERVAL = int(os.environ.get('REDIS_HEALTH_CHECK_INTERVAL') or 30)
+    # 每个进程的连接池大小（不小于worker线程数）及等待空闲连接的超时（秒）
+    REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS') or 20)
+    REDIS_POOL_TIMEOUT = float(os.environ.get('REDIS_POOL_TIMEOUT') or 2.0)
+    # 连接错误或超时时自动重连重试的次数；仍然失败时在REDIS_RETRY_SECONDS内改用进程内缓存
+    REDIS_RETRIES = int(os.environ.get('REDIS_RETRIES') or 2)
+    REDIS_RETRY_SECONDS = int(os.environ.get('REDIS_RETRY_SECONDS') or 30)
+    # 回测使用的日线矩阵存储目录（由 flask sync-bars 生成）
+    BAR_STORE_DIR = os.environ.get('BAR_STORE_DIR') or os.path.join(basedir, '../bars')
+    # 相似股索引目录（由 flask build-similar 生成）、计算收益相关性的交易日数、每只股票保存的相似股数量
+    SIMILARITY_DIR = os.environ.get('SIMILARITY_DIR') or os.path.join(basedir, '../similar')
+    SIMILARITY_WINDOW = int(os.environ.get('SIMILARITY_WINDOW') or 250)
+    SIMILARITY_TOP_K = int(os.environ.get('SIMILARITY_TOP_K') or 50)
+
+    # 后台任务（flask jobs-worker）：空闲时轮询间隔（秒）、进度与心跳写入间隔（秒）、
+    # 超过该秒数没有心跳的运行中任务视为worker已退出并重新排队，最多领取执行的次数
+    JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS') or 2.0)
+    JOB_HEARTBEAT_SECONDS = float(os.environ.get('JOB_HEARTBEAT_SECONDS') or 2.0)
+    JOB_STALE_SECONDS = int(os.environ.get('JOB_STALE_SECONDS') or 300)
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS') or 3)
+    # 自选股AI点评批量生成：同时进行的模型请求数，单条点评最多尝试的次数
+    COMMENTARY_CONCURRENCY = int(os.environ.get('COMMENTARY_CONCURRENCY') or 4)
+    COMMENTARY_MAX_ATTEMPTS = int(os.environ.get('COMMENTARY_MAX_ATTEMPTS') or 3)
+    # 发给LLM的提示词预算（估算token数，见services/prompt_builder.py）：通用请求（如情绪分析）和单条自选股点评
+    PROMPT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET') or 1500)
+    COMMENTARY_PROMPT_TOKENS = int(os.environ.get('COMMENTARY_PROMPT_TOKENS') or 600)
+    # 可以调用 /api/v1/admin 接口的用户名（逗号分隔）
+    ADMIN_USERNAMES = [name.strip() for name in (os.environ.get('ADMIN_USERNAMES') or '').split(',') if name.strip()]
+
+    # 密码哈希参数（werkzeug格式，例如 scrypt:32768:8:1 或 pbkdf2:sha256:600000），修改后旧密码在下次登录时自动重新哈希
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'scrypt:32768:8:1'
+    # 密码哈希线程数（默认CPU核心数）及最多排队的哈希任务数（默认线程数的4倍），超过后登录/注册返回503
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or 0) or None
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING') or 0) or None
+    # JWT身份缓存有效期（秒），期间已认证请求不再查询用户表；以及每个进程最多缓存的身份数
+    IDENTITY_CACHE_TTL_SECONDS = int(os.environ.get('IDENTITY_CACHE_TTL_SECONDS') or 30)
+    IDENTITY_CACHE_MAX_ENTRIES = int(os.environ.get('IDENTITY_CACHE_MAX_ENTRIES') or 10000)
+
+    # SQLite连接参数，在每个新连接上执行（对其他数据库无效）
+    # WAL：读写互不阻塞；NORMAL：WAL下仍能保证数据库一致性，只在掉电时可能丢失最近的事务
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,  # 256MB 内存映射读取
+        'cache_size': -64 * 1024,        # 64MB 页缓存（负数单位为KB）
+    }
+    # 响应压缩：小于该字节数的响应不压缩；各编码的压缩级别；启用的编码（按服务端偏好排序，未安装的自动跳过）
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE') or 500)
+    COMPRESSION_LEVELS = {
+        'br': int(os.environ.get('COMPRESSION_BR_LEVEL') or 5),
+        'zstd': int(os.environ.get('COMPRESSION_ZSTD_LEVEL') or 3),
+        'gzip': int(os.environ.get('COMPRESSION_GZIP_LEVEL') or 6),
+    }
+    COMPRESSION_ENCODINGS = ['br', 'zstd', 'gzip']
+
+    # 只读副本：配置后分析接口和自选股列表等只读查询发往副本，写入仍走主库
+    REPLICA_DATABASE_URL = os.environ.get('REPLICA_DATABASE_URL')
+    SQLALCHEMY_BINDS = {'replica': REPLICA_DATABASE_URL} if REPLICA_DATABASE_URL else {}
+    # 提交写入后该时间（秒）内，同一调用方的只读查询仍走主库，避免读到副本尚未同步的旧数据
+    REPLICA_STICKY_SECONDS = float(os.environ.get('REPLICA_STICKY_SECONDS') or 5)
+    # 连接池配置只在生产环境设置：SQLite（尤其是测试常用的内存数据库 sqlite://）使用的连接池不接受这些参数
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+
 class DevelopmentConfig(Config):
     """开发环境配置"""
     # 使用SQLite作为开发数据库
@@ -22,6 +107,14 @@ class ProductionConfig(Config):
     """生产环境配置"""
     # 生产环境应使用PostgreSQL
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
+    # 连接池大小按 gunicorn worker数 × 线程数 估算，确保总连接数不超过数据库的max_connections
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE') or 10),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW') or 20),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT') or 30),
+        'pool_pre_ping': True,  # 取出连接时检测，避免使用被数据库或代理断开的连接
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE') or 1800),  # 定期重建连接，早于服务端空闲超时
+    }
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
 
 class TestingConfig(Config):
@@ -1,7 +1,144 @@
 # guzi_backend/database.py
 
+import threading
+import time
+from contextlib import contextmanager
+from flask import current_app, has_app_context, has_request_context, request
+from flask_jwt_extended import get_jwt_identity
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+# 只读副本在 SQLALCHEMY_BINDS 中的键
+REPLICA_BIND_KEY = 'replica'
+DEFAULT_REPLICA_STICKY_SECONDS = 5
+
+# 最近提交过写入的调用方（用户/客户端，None表示请求之外的后台任务） -> 提交时间
+_recent_writes = {}
+_recent_writes_lock = threading.Lock()
+
+
+class RoutingSession(Session):
+    """
+    读写分离会话：read_only() 范围内的查询发往只读副本（SQLALCHEMY_BINDS['replica']），其余全部发往主库。
+
+    以下情况即使在只读范围内也使用主库，保证“读到自己的写入”：
+    flush/写语句本身；当前调用方在 REPLICA_STICKY_SECONDS 内提交过写入；
+    请求之外的任务（股票同步等）在该时间窗口内提交过写入（对所有调用方生效）。
+    未配置副本时与普通会话完全相同。
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if (bind is None and self.info.get('read_only') and not self._flushing
+                and not getattr(clause, 'is_dml', False)):
+            engines = self._db.engines
+            replica = engines.get(REPLICA_BIND_KEY)
+            if replica is not None and engine is engines.get(None) and not _sticky_to_primary():
+                return replica
+        return engine
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _record_pending_write(session, _flush_context):
+    session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _record_commit(session):
+    if session.info.pop('wrote', False):
+        _mark_recent_write()
+
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def _forget_pending_write(session, _previous_transaction):
+    session.info.pop('wrote', None)
+
+
+def _writer_key():
+    """当前调用方：已认证请求为JWT身份，匿名请求为客户端地址，请求之外为None。"""
+    if not has_request_context():
+        return None
+    try:
+        identity = get_jwt_identity()
+    except Exception:
+        identity = None # 未经过JWT校验的接口
+    return identity or request.remote_addr
+
+
+def _sticky_seconds() -> float:
+    if has_app_context():
+        return current_app.config.get('REPLICA_STICKY_SECONDS', DEFAULT_REPLICA_STICKY_SECONDS)
+    return DEFAULT_REPLICA_STICKY_SECONDS
+
+
+def _mark_recent_write():
+    now = time.monotonic()
+    with _recent_writes_lock:
+        if len(_recent_writes) > 10000:
+            window = _sticky_seconds()
+            for key in [key for key, at in _recent_writes.items() if now - at > window]:
+                del _recent_writes[key]
+        _recent_writes[_writer_key()] = now
+
+
+def _sticky_to_primary() -> bool:
+    """当前调用方或后台任务是否刚提交过写入（副本可能尚未同步）。"""
+    window = _sticky_seconds()
+    now = time.monotonic()
+    for key in {None, _writer_key()}:
+        at = _recent_writes.get(key)
+        if at is not None and now - at < window:
+            return True
+    return False
+
+
+@contextmanager
+def read_only():
+    """
+    将范围内的查询路由到只读副本，可用作上下文管理器或装饰器：
+
+        with read_only():
+            rows = db.session.query(Stock).all()
+
+        @read_only()
+        def get_watchlist(): ...
+    """
+    session = db.session()
+    previous = session.info.get('read_only', False)
+    session.info['read_only'] = True
+    try:
+        yield session
+    finally:
+        session.info['read_only'] = previous
+
 
 # 创建一个SQLAlchemy实例，但不与任何应用关联
 # 应用实例将在应用工厂中进行关联
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+def apply_sqlite_pragmas(app):
+    """
+    为应用的所有SQLite引擎注册连接事件，在每个新连接上执行配置中的 SQLITE_PRAGMAS。
+    WAL模式下读取不会被写事务阻塞，股票列表同步期间接口仍可正常查询。
+    """
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+    if not pragmas:
+        return
+
+    with app.app_context():
+        engines = list(db.engines.values())
+
+    for engine in engines:
+        if engine.dialect.name != 'sqlite':
+            continue
+
+        @event.listens_for(engine, 'connect')
+        def set_sqlite_pragmas(dbapi_connection, _connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                for name, value in pragmas.items():
+                    cursor.execute(f"PRAGMA {name}={value}")
+            finally:
+                cursor.close()
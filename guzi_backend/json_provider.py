@@ -0,0 +1,146 @@
+# guzi_backend/json_provider.py
+
+import datetime
+import decimal
+import json
+import math
+import uuid
+
+import numpy as np
+from flask.json.provider import JSONProvider
+from .lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+try:
+    import orjson
+except ImportError: # orjson为可选依赖，未安装时退回标准库json
+    orjson = None
+
+
+class RawJSON:
+    """已经序列化好的JSON片段（例如由DataFrame直接生成），序列化时原样嵌入，不再解析。"""
+
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data.encode() if isinstance(data, str) else data
+
+
+def frame_json(df: 'pd.DataFrame', orient: str = 'records') -> RawJSON:
+    """
+    将DataFrame直接序列化为JSON片段（pandas的C实现），不构建中间的字典列表。
+    NaN/NaT输出为null，时间输出为ISO 8601字符串。
+    """
+    return RawJSON(df.to_json(orient=orient, force_ascii=False, date_format='iso'))
+
+
+def _to_builtin(obj):
+    """把NumPy、pandas等类型转换为可JSON序列化的内置类型，无法转换时抛出TypeError。"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        value = obj.item()
+        return None if isinstance(value, float) and not math.isfinite(value) else value
+    if pd.is_imported: # pandas尚未导入时对象不可能是pandas类型，不为此触发导入
+        if isinstance(obj, (pd.Series, pd.Index)):
+            return obj.tolist()
+        if isinstance(obj, pd.DataFrame):
+            return obj.to_dict(orient='records')
+        if obj is pd.NaT or obj is pd.NA:
+            return None
+        if isinstance(obj, pd.Timedelta):
+            return obj.isoformat()
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _finite(obj):
+    """
+    把嵌套的字典、列表中的NaN/Infinity替换为None（与orjson的输出一致）。
+    只在标准库json路径上使用：标准库直接输出float，不经过default。
+    """
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(value) for value in obj]
+    return obj
+
+
+class _Fragments:
+    """
+    序列化过程中遇到RawJSON时先输出占位字符串，编码完成后再替换为原始字节。
+    占位符包含随机串，不会与正常数据冲突。
+    """
+
+    def __init__(self):
+        self._nonce = uuid.uuid4().hex
+        self._parts = []
+
+    def placeholder(self, fragment: RawJSON) -> str:
+        self._parts.append(fragment.data)
+        return f'\x00{self._nonce}:{len(self._parts) - 1}\x00'
+
+    def splice(self, encoded: bytes) -> bytes:
+        for i, data in enumerate(self._parts):
+            encoded = encoded.replace(f'"\\u0000{self._nonce}:{i}\\u0000"'.encode(), data, 1)
+        return encoded
+
+
+class FastJSONProvider(JSONProvider):
+    """
+    基于orjson的JSON提供器（未安装orjson时使用标准库json，行为一致）。
+
+    原生支持NumPy数组和标量、pandas标量/时间、datetime，NaN输出为null；
+    支持嵌入RawJSON片段（frame_json），大表格可直接从DataFrame生成字节。
+    响应体直接使用编码后的字节，不再经过str中转。
+    """
+
+    sort_keys = True
+    mimetype = 'application/json'
+
+    def dumps_bytes(self, obj, **kwargs) -> bytes:
+        """序列化为UTF-8字节。"""
+        fragments = None
+
+        def default(value):
+            nonlocal fragments
+            if isinstance(value, RawJSON):
+                if fragments is None:
+                    fragments = _Fragments()
+                return fragments.placeholder(value)
+            return _to_builtin(value)
+
+        sort_keys = kwargs.pop('sort_keys', self.sort_keys)
+        if orjson is not None:
+            option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+            if sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            encoded = orjson.dumps(obj, default=default, option=option)
+        else:
+            encoded = json.dumps(
+                _finite(obj), default=lambda value: _finite(default(value)), sort_keys=sort_keys,
+                ensure_ascii=False, separators=(',', ':'), allow_nan=False
+            ).encode()
+        return fragments.splice(encoded) if fragments is not None else encoded
+
+    def dumps(self, obj, **kwargs) -> str:
+        return self.dumps_bytes(obj, **kwargs).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is not None:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj) + b"\n", mimetype=self.mimetype)
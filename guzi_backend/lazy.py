@@ -0,0 +1,43 @@
+# guzi_backend/lazy.py
+
+import importlib
+import sys
+import threading
+
+
+class LazyModule:
+    """
+    延迟导入的模块代理：首次访问属性时才真正导入模块。
+
+    akshare、pandas等重量级依赖只在实际获取数据时才需要，
+    应用启动、CLI命令和后台任务进程不再为它们付出数秒的导入时间。
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    @property
+    def is_imported(self) -> bool:
+        """模块是否已被导入（由本代理或其他代码导入）。"""
+        return self._module is not None or self._name in sys.modules
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f'<LazyModule {self._name} ({state})>'
+
+
+def lazy_import(name: str) -> LazyModule:
+    """返回模块的延迟导入代理，用法与 import 后的模块对象相同。"""
+    return LazyModule(name)
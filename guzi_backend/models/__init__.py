@@ -4,3 +4,5 @@
 from .stock import Stock
 from .user import User
 from .watchlist import UserWatchlist
+from .job import Job
+from .commentary import StockCommentary
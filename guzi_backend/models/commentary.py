@@ -0,0 +1,36 @@
+# guzi_backend/models/commentary.py
+
+from datetime import datetime
+from ..database import db
+
+class StockCommentary(db.Model):
+    """股票AI点评模型：每晚为自选股批量生成，每只股票保留最新一条"""
+    __tablename__ = 'stock_commentaries'
+
+    stock_code = db.Column(db.String(20), db.ForeignKey('stocks.code'), primary_key=True, comment='股票代码')
+    summary = db.Column(db.Text, nullable=False, comment='AI生成的点评')
+    model = db.Column(db.String(50), nullable=False, comment='生成点评的模型')
+    prompt_hash = db.Column(db.String(64), nullable=False, comment='提示词哈希，输入数据未变化时不重新生成')
+    batch_date = db.Column(db.Date, nullable=False, index=True, comment='最近一次处理该股票的批次日期')
+    data_as_of = db.Column(db.DateTime(timezone=True), nullable=True, comment='点评所依据的行情数据时间')
+    generated_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, comment='生成时间')
+
+    stock = db.relationship('Stock', backref=db.backref('commentary', lazy=True, uselist=False))
+
+    def to_dict(self, latest_batch_date=None):
+        """
+        接口返回的点评。stale表示该股票在最近一个批次（latest_batch_date）中重新生成失败，
+        返回的仍是更早批次的点评。
+        """
+        return {
+            'code': self.stock_code,
+            'summary': self.summary,
+            'model': self.model,
+            'batch_date': self.batch_date.isoformat(),
+            'stale': latest_batch_date is not None and self.batch_date < latest_batch_date,
+            'data_as_of': self.data_as_of.isoformat() if self.data_as_of else None,
+            'generated_at': self.generated_at.isoformat() if self.generated_at else None,
+        }
+
+    def __repr__(self):
+        return f'<StockCommentary {self.stock_code} {self.batch_date}>'
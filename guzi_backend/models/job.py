@@ -0,0 +1,53 @@
+# guzi_backend/models/job.py
+
+from datetime import datetime
+from ..database import db
+
+class Job(db.Model):
+    """后台任务模型：任务状态持久化在数据库中，由 flask jobs-worker 进程领取执行"""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_status_priority', 'status', 'priority', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True, comment='主键ID')
+    kind = db.Column(db.String(50), nullable=False, comment='任务类型，见job_queue.JOB_HANDLERS')
+    params = db.Column(db.JSON, nullable=False, default=dict, comment='任务参数')
+    dedup_key = db.Column(db.String(64), nullable=False, index=True, comment='任务类型与参数的哈希')
+    # 排队或运行中时等于dedup_key，结束后置空；唯一约束保证相同任务同时只有一个在排队或运行
+    active_key = db.Column(db.String(64), unique=True, nullable=True, comment='未结束任务的去重键')
+    priority = db.Column(db.Integer, nullable=False, default=0, comment='优先级，数值大的先执行')
+    status = db.Column(db.String(20), nullable=False, default='queued', comment='状态 (queued, running, succeeded, failed)')
+    progress = db.Column(db.JSON, nullable=True, comment='进度，例如已爬取行业数、已同步行数')
+    result = db.Column(db.JSON, nullable=True, comment='执行结果')
+    error = db.Column(db.Text, nullable=True, comment='失败原因')
+    attempts = db.Column(db.Integer, nullable=False, default=0, comment='已领取执行的次数')
+    worker = db.Column(db.String(100), nullable=True, comment='执行该任务的worker（主机名:进程号）')
+    created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, comment='创建时间')
+    started_at = db.Column(db.DateTime(timezone=True), nullable=True, comment='开始执行时间')
+    heartbeat_at = db.Column(db.DateTime(timezone=True), nullable=True, comment='worker最后一次心跳时间')
+    finished_at = db.Column(db.DateTime(timezone=True), nullable=True, comment='结束时间')
+
+    def to_dict(self):
+        """接口返回的任务状态。"""
+        def iso(value):
+            return value.isoformat() if value else None
+        return {
+            'id': self.id,
+            'type': self.kind,
+            'params': self.params,
+            'priority': self.priority,
+            'status': self.status,
+            'progress': self.progress or {},
+            'result': self.result,
+            'error': self.error,
+            'attempts': self.attempts,
+            'worker': self.worker,
+            'created_at': iso(self.created_at),
+            'started_at': iso(self.started_at),
+            'heartbeat_at': iso(self.heartbeat_at),
+            'finished_at': iso(self.finished_at),
+        }
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
@@ -1,8 +1,8 @@
 # guzi_backend/models/user.py
 
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
 from ..database import db
+from ..services.password_service import password_hasher
 
 class User(db.Model):
     """用户模型"""
@@ -15,12 +15,16 @@ class User(db.Model):
     created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, comment='账户创建时间')
 
     def set_password(self, password):
-        """设置用户密码，进行哈希处理。"""
-        self.password_hash = generate_password_hash(password)
+        """设置用户密码，按配置的哈希参数在哈希线程池中处理。"""
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
         """验证用户密码。"""
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        """密码哈希参数是否已过时（配置变更后，在下次登录成功时重新哈希）。"""
+        return password_hasher.needs_rehash(self.password_hash)
 
     def __repr__(self):
         return f'<User {self.username}>'
@@ -0,0 +1,52 @@
+# guzi_backend/routes/admin.py
+
+from functools import wraps
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, current_user
+from ..services import job_queue
+
+admin_bp = Blueprint('admin', __name__, url_prefix='/api/v1/admin')
+
+def admin_required(view):
+    """要求已登录且用户名在ADMIN_USERNAMES配置中。"""
+    @wraps(view)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        if current_user.username not in current_app.config.get('ADMIN_USERNAMES', ()):
+            return jsonify({"code": 40301, "message": "Admin privileges required", "data": None}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+@admin_bp.route('/jobs', methods=['POST'])
+@admin_required
+def create_job():
+    """
+    提交后台任务，由 flask jobs-worker 进程执行，接口立即返回。
+    请求体：{"type": "update_stocks", "params": {...}, "priority": 0}。
+    相同类型和参数的任务已在排队或运行时返回该任务（deduplicated为true）。
+    """
+    data = request.get_json(silent=True) or {}
+    kind = data.get('type')
+    if not kind:
+        return jsonify({"code": 40001, "message": "Job type is required", "data": None}), 400
+    priority = data.get('priority', 0)
+    if isinstance(priority, bool) or not isinstance(priority, int):
+        return jsonify({"code": 40002, "message": "priority must be an integer", "data": None}), 400
+
+    try:
+        job, created = job_queue.enqueue(kind, data.get('params'), priority)
+    except job_queue.JobError as e:
+        return jsonify({"code": 40002, "message": str(e), "data": None}), 400
+
+    payload = dict(job.to_dict(), deduplicated=not created)
+    message = "Job queued" if created else "Identical job already queued or running"
+    return jsonify({"code": 0, "message": message, "data": payload}), 202 if created else 200
+
+@admin_bp.route('/jobs/<int:job_id>', methods=['GET'])
+@admin_required
+def get_job(job_id):
+    """查询任务状态、进度和结果。"""
+    job = job_queue.get_job(job_id)
+    if job is None:
+        return jsonify({"code": 40406, "message": "Job not found", "data": None}), 404
+    return jsonify({"code": 0, "message": "Success", "data": job.to_dict()}), 200
@@ -1,13 +1,21 @@
 # guzi_backend/routes/auth.py
 
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask_jwt_extended import create_access_token, jwt_required, current_user
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
 from ..database import db
 from ..models import User
+from ..services.password_service import HashPoolSaturated, password_hasher
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/v1/auth')
 
+def _server_busy():
+    """密码哈希线程池已满时的响应。"""
+    response = jsonify({"code": 50301, "message": "Server busy, please retry later"})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     """用户注册接口。"""
@@ -19,17 +27,22 @@ def register():
     if not username or not email or not password:
         return jsonify({"code": 40001, "message": "Missing username, email or password"}), 400
 
-    if User.query.filter_by(username=username).first():
-        return jsonify({"code": 40002, "message": "Username already exists"}), 400
-
-    if User.query.filter_by(email=email).first():
-        return jsonify({"code": 40003, "message": "Email already exists"}), 400
-
     new_user = User(username=username, email=email)
-    new_user.set_password(password)
+    try:
+        new_user.set_password(password)
+    except HashPoolSaturated:
+        return _server_busy()
 
+    # 直接插入，由数据库唯一约束保证用户名和邮箱不重复；冲突时才查询一次判断是哪个字段重复
     db.session.add(new_user)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        existing = User.query.filter(or_(User.username == username, User.email == email)).first()
+        if existing is not None and existing.username == username:
+            return jsonify({"code": 40002, "message": "Username already exists"}), 400
+        return jsonify({"code": 40003, "message": "Email already exists"}), 400
 
     return jsonify({"code": 0, "message": "User registered successfully"}), 201
 
@@ -45,8 +58,25 @@ def login():
 
     user = User.query.filter_by(username=username).first()
 
-    if user and user.check_password(password):
-        access_token = create_access_token(identity=user.id)
+    try:
+        if user is not None:
+            authenticated = user.check_password(password)
+        else:
+            # 用户不存在时同样计算一次哈希，避免通过响应时间判断用户名是否存在
+            authenticated = password_hasher.verify_unknown_user(password)
+    except HashPoolSaturated:
+        return _server_busy()
+
+    if authenticated and user.password_needs_rehash():
+        # 哈希参数已调整：用户提供了正确密码，顺便按新参数重新哈希
+        try:
+            user.set_password(password)
+            db.session.commit()
+        except HashPoolSaturated:
+            pass # 线程池繁忙时保留旧哈希，下次登录再处理
+
+    if authenticated:
+        access_token = create_access_token(identity=str(user.id)) # JWT的sub必须是字符串
         return jsonify({"code": 0, "message": "Login successful", "data": {"access_token": access_token}}), 200
     else:
         return jsonify({"code": 40101, "message": "Invalid credentials"}), 401
@@ -55,5 +85,4 @@ def login():
 @jwt_required()
 def protected():
     """受保护的测试接口。"""
-    current_user_id = get_jwt_identity()
-    return jsonify({"code": 0, "message": "Access granted", "data": {"user_id": current_user_id}}), 200
+    return jsonify({"code": 0, "message": "Access granted", "data": {"user_id": current_user.id}}), 200
@@ -1,8 +1,13 @@
 # guzi_backend/routes/main.py
 
 from flask import Blueprint, jsonify, current_app, request
+from guzi_backend.json_provider import frame_json
 from guzi_backend.services import data_service
 from guzi_backend.services import analysis_service
+from guzi_backend.services import screener
+from guzi_backend.services.analysis_service import STRATEGY_DATASETS
+from guzi_backend.services.circuit_breaker import UpstreamUnavailable
+from guzi_backend.services.response_cache import cached_json_response
 
 # 创建一个名为'main'的蓝图
 main = Blueprint('main', __name__)
@@ -24,6 +29,11 @@ def api_base():
         }
     })
 
+@main.route('/api/v1/system/snapshot')
+def get_snapshot_status():
+    """返回市场数据快照的版本和新鲜度信息。"""
+    return jsonify({"code": 0, "message": "Success", "data": data_service.get_snapshot_status()})
+
 @main.route('/api/v1/debug/all-stocks')
 def get_all_stocks_debug():
     """一个用于调试的端点，获取所有A股列表。"""
@@ -35,15 +45,13 @@ def get_all_stocks_debug():
             "data": None
         }), 500
     
-    # 将DataFrame转换为JSON格式
-    stocks_json = stocks_df.to_dict(orient='records')
-    
+    # DataFrame直接序列化为JSON片段，不构建中间的字典列表
     return jsonify({
         "code": 0,
         "message": "Success",
         "data": {
-            "count": len(stocks_json),
-            "stocks": stocks_json
+            "count": len(stocks_df),
+            "stocks": frame_json(stocks_df)
         }
     })
 
@@ -63,62 +71,151 @@ def gemini_generate_debug():
     except Exception as e:
         return jsonify({"code": 50003, "message": f"AI service error: {e}", "data": None}), 500
 
+def _upstream_unavailable(e: UpstreamUnavailable):
+    """上游数据不可用且没有可回退的历史数据时的响应，Retry-After为熔断器下次探测前的秒数。"""
+    response = jsonify({"code": 50302, "message": str(e), "data": None})
+    response.headers['Retry-After'] = str(max(1, round(e.retry_in))) if e.retry_in is not None else '30'
+    return response, 503
+
+def _strategy_params(strategy: str):
+    """从查询参数解析策略参数（top_n、w_*权重、阈值），返回 (params, 错误响应)。"""
+    try:
+        return analysis_service.normalize_params(strategy, request.args), None
+    except ValueError as e:
+        return None, (jsonify({"code": 40002, "message": str(e), "data": None}), 400)
+
 @main.route('/api/v1/analysis/sector-leaders')
 def get_sector_leaders():
-    """获取指定行业的龙一龙二股票。"""
+    """获取指定行业的龙头股票（默认龙一龙二）。可选参数：top_n, w_market_cap, w_change, w_amount。"""
     industry_name = request.args.get('industry')
     if not industry_name:
         return jsonify({"code": 40001, "message": "Industry name parameter is required.", "data": None}), 400
+    params, error = _strategy_params('sector_leaders')
+    if error:
+        return error
 
-    try:
-        leaders = analysis_service.identify_sector_leaders(industry_name)
+    def build():
+        leaders = analysis_service.identify_sector_leaders(industry_name, params)
         if not leaders:
-            return jsonify({"code": 40401, "message": f"No leaders found for industry: {industry_name}", "data": []}), 404
-        return jsonify({"code": 0, "message": "Success", "data": {"industry": industry_name, "leaders": leaders}})
+            return {"code": 40401, "message": f"No leaders found for industry: {industry_name}", "data": []}, 404
+        return {"code": 0, "message": "Success", "data": {"industry": industry_name, "leaders": leaders}}, 200
+
+    try:
+        return cached_json_response(('sector-leaders', industry_name, params), STRATEGY_DATASETS['sector_leaders'], build)
+    except UpstreamUnavailable as e:
+        return _upstream_unavailable(e)
     except Exception as e:
         return jsonify({"code": 50004, "message": f"Analysis service error: {e}", "data": None}), 500
 
 @main.route('/api/v1/analysis/institutional-holdings')
 def get_institutional_holdings():
-    """获取机构偏好股票列表。"""
-    try:
-        institutional_stocks = analysis_service.analyze_institutional_holdings()
+    """获取机构偏好股票列表。可选参数：top_n, w_market_cap, w_amount, w_stability。"""
+    params, error = _strategy_params('institutional')
+    if error:
+        return error
+
+    def build():
+        institutional_stocks = analysis_service.analyze_institutional_holdings(params)
         if not institutional_stocks:
-            return jsonify({"code": 40402, "message": "No institutional preferred stocks found.", "data": []}), 404
-        return jsonify({"code": 0, "message": "Success", "data": {"stocks": institutional_stocks}})
+            return {"code": 40402, "message": "No institutional preferred stocks found.", "data": []}, 404
+        return {"code": 0, "message": "Success", "data": {"stocks": institutional_stocks}}, 200
+
+    try:
+        return cached_json_response(('institutional-holdings', params), STRATEGY_DATASETS['institutional'], build)
+    except UpstreamUnavailable as e:
+        return _upstream_unavailable(e)
     except Exception as e:
         return jsonify({"code": 50005, "message": f"Analysis service error: {e}", "data": None}), 500
 
 @main.route('/api/v1/analysis/small-cap-leaders')
 def get_small_cap_leaders():
-    """获取中小票龙头股列表。"""
-    try:
-        # 可以通过查询参数传入市值阈值，这里使用默认值
-        leaders = analysis_service.identify_small_cap_leaders()
+    """获取中小票龙头股列表。可选参数：top_n, market_cap_threshold, w_market_cap, w_momentum, w_liquidity。"""
+    params, error = _strategy_params('small_cap')
+    if error:
+        return error
+
+    def build():
+        leaders = analysis_service.identify_small_cap_leaders(params)
         if not leaders:
-            return jsonify({"code": 40403, "message": "No small-cap leaders found.", "data": []}), 404
-        return jsonify({"code": 0, "message": "Success", "data": {"stocks": leaders}})
+            return {"code": 40403, "message": "No small-cap leaders found.", "data": []}, 404
+        return {"code": 0, "message": "Success", "data": {"stocks": leaders}}, 200
+
+    try:
+        return cached_json_response(('small-cap-leaders', params), STRATEGY_DATASETS['small_cap'], build)
+    except UpstreamUnavailable as e:
+        return _upstream_unavailable(e)
     except Exception as e:
         return jsonify({"code": 50006, "message": f"Analysis service error: {e}", "data": None}), 500
 
 @main.route('/api/v1/analysis/undervalued-stocks')
 def get_undervalued_stocks():
-    """获取低估股票列表。"""
-    try:
-        undervalued_stocks = analysis_service.identify_undervalued_stocks()
+    """获取低估股票列表。可选参数：top_n, w_pe, w_pb。"""
+    params, error = _strategy_params('undervalued')
+    if error:
+        return error
+
+    def build():
+        undervalued_stocks = analysis_service.identify_undervalued_stocks(params)
         if not undervalued_stocks:
-            return jsonify({"code": 40404, "message": "No undervalued stocks found.", "data": []}), 404
-        return jsonify({"code": 0, "message": "Success", "data": {"stocks": undervalued_stocks}})
+            return {"code": 40404, "message": "No undervalued stocks found.", "data": []}, 404
+        return {"code": 0, "message": "Success", "data": {"stocks": undervalued_stocks}}, 200
+
+    try:
+        return cached_json_response(('undervalued-stocks', params), STRATEGY_DATASETS['undervalued'], build)
+    except UpstreamUnavailable as e:
+        return _upstream_unavailable(e)
     except Exception as e:
         return jsonify({"code": 50007, "message": f"Analysis service error: {e}", "data": None}), 500
 
 @main.route('/api/v1/analysis/comprehensive-score')
 def get_comprehensive_scores():
-    """获取所有股票的综合评分。"""
-    try:
-        scored_stocks = analysis_service.get_comprehensive_score()
+    """获取所有股票的综合评分。行情和估值数据并发获取。可选参数：top_n, w_technical, w_fundamental, w_valuation。"""
+    params, error = _strategy_params('comprehensive')
+    if error:
+        return error
+
+    def build():
+        scored_stocks = analysis_service.get_comprehensive_score(params)
         if not scored_stocks:
-            return jsonify({"code": 40405, "message": "No stocks found for comprehensive scoring.", "data": []}), 404
-        return jsonify({"code": 0, "message": "Success", "data": {"stocks": scored_stocks}})
+            return {"code": 40405, "message": "No stocks found for comprehensive scoring.", "data": []}, 404
+        return {"code": 0, "message": "Success", "data": {"stocks": scored_stocks}}, 200
+
+    try:
+        return cached_json_response(('comprehensive-score', params), STRATEGY_DATASETS['comprehensive'], build)
+    except UpstreamUnavailable as e:
+        return _upstream_unavailable(e)
     except Exception as e:
         return jsonify({"code": 50008, "message": f"Analysis service error: {e}", "data": None}), 500
+
+@main.route('/api/v1/screener')
+def screen_stocks():
+    """
+    按表达式筛选股票。
+    参数：q 筛选表达式，例如 pe < 15 and pb < 2 and industry in ("银行","保险") and market_cap > 1e10；
+    sort 排序字段；order asc/desc（默认desc）；limit 返回数量（默认50）。
+    可用字段：price, change_percent, volume_amount, market_cap, pe, pb, code, name, industry。
+    """
+    expression = screener.normalize_expression(request.args.get('q', ''))
+    sort = request.args.get('sort') or None
+    descending = request.args.get('order', 'desc').lower() != 'asc'
+    limit = request.args.get('limit', screener.DEFAULT_LIMIT, type=int)
+    if not 1 <= limit <= screener.MAX_LIMIT:
+        return jsonify({"code": 40002, "message": f"limit must be between 1 and {screener.MAX_LIMIT}.", "data": None}), 400
+    try:
+        datasets = screener.required_datasets(expression, sort)
+    except screener.ScreenerError as e:
+        return jsonify({"code": 40002, "message": str(e), "data": None}), 400
+
+    def build():
+        try:
+            result = screener.screen(expression, sort, descending, limit)
+        except screener.ScreenerError as e:
+            return {"code": 40002, "message": str(e), "data": None}, 400
+        return {"code": 0, "message": "Success", "data": result}, 200
+
+    try:
+        return cached_json_response(('screener', expression, sort, descending, limit), datasets, build)
+    except UpstreamUnavailable as e:
+        return _upstream_unavailable(e)
+    except Exception as e:
+        return jsonify({"code": 50009, "message": f"Screener error: {e}", "data": None}), 500
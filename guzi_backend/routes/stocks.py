@@ -0,0 +1,46 @@
+# guzi_backend/routes/stocks.py
+
+from flask import Blueprint, jsonify, request
+from ..database import db, read_only
+from ..models import Stock
+from ..services import commentary_service, similarity_service
+
+stocks_bp = Blueprint('stocks', __name__, url_prefix='/api/v1/stocks')
+
+@stocks_bp.route('/<code>/ai-summary', methods=['GET'])
+@read_only()
+def get_ai_summary(code):
+    """
+    获取股票的AI点评。点评由每晚的批量任务（flask generate-commentary）预先生成，这里只读取数据库。
+    该股票在最近一个批次中生成失败时仍返回上一批次的点评，并标记stale为true。
+    """
+    stock = db.session.get(Stock, code)
+    if stock is None:
+        return jsonify({"code": 40402, "message": "Stock not found", "data": None}), 404
+    commentary = commentary_service.get_commentary(code)
+    if commentary is None:
+        return jsonify({"code": 40407, "message": "No AI summary available for this stock yet", "data": None}), 404
+    data = dict(commentary.to_dict(commentary_service.latest_batch_date()), name=stock.name)
+    return jsonify({"code": 0, "message": "Success", "data": data}), 200
+
+@stocks_bp.route('/<code>/similar', methods=['GET'])
+@read_only()
+def get_similar_stocks(code):
+    """
+    获取近期收益走势与该股最相似（日收益相关系数最高）的股票。
+    相似股由每晚的任务（flask build-similar）预先计算，这里只读取索引。
+
+    查询参数：limit 返回数量（默认10）；industry 只返回指定行业的股票，为 same 时使用该股票自身的行业。
+    """
+    stock = db.session.get(Stock, code)
+    if stock is None:
+        return jsonify({"code": 40402, "message": "Stock not found", "data": None}), 404
+    limit = max(request.args.get('limit', 10, type=int), 1) # 不超过索引中保存的数量（SIMILARITY_TOP_K）
+    industry = request.args.get('industry') or None
+    if industry == 'same':
+        industry = stock.industry or ''
+    result = similarity_service.similar_stocks(code, limit, industry)
+    if result is None:
+        return jsonify({"code": 40408, "message": "No similarity data available for this stock yet", "data": None}), 404
+    return jsonify({"code": 0, "message": "Success",
+                    "data": dict(result, code=code, name=stock.name, industry=stock.industry, industry_filter=industry)}), 200
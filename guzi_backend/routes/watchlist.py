@@ -1,32 +1,44 @@
 # guzi_backend/routes/watchlist.py
 
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+import queue
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from flask_jwt_extended import jwt_required, current_user
+from sqlalchemy import delete, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.exc import IntegrityError
-from ..database import db
-from ..models import User, Stock, UserWatchlist
+from ..database import db, read_only
+from ..models import Stock, UserWatchlist
+from ..services.quote_hub import quote_hub, TooManyStreams
 
 watchlist_bp = Blueprint('watchlist', __name__, url_prefix='/api/v1/watchlist')
 
+# SSE心跳间隔（秒），跨进程通知不可用时心跳同时用于重新加载自选股
+STREAM_HEARTBEAT_SECONDS = 15
+# 批量接口单次最多处理的股票代码数
+WATCHLIST_BATCH_LIMIT = 500
+# 支持 INSERT ... ON CONFLICT DO NOTHING 的方言
+_CONFLICT_IGNORE_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
 @watchlist_bp.route('/', methods=['GET'])
 @jwt_required()
+@read_only()
 def get_watchlist():
-    """获取当前用户的自选股列表。"""
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-
-    if not user:
-        return jsonify({"code": 40401, "message": "User not found"}), 404
-
-    # 通过关系加载自选股
+    """获取当前用户的自选股列表。用户是否存在由JWT的current_user加载函数（身份缓存）确认。"""
+    # 一次联表查询读取自选股及股票信息
+    rows = (
+        db.session.query(Stock.code, Stock.name, Stock.industry, UserWatchlist.added_at)
+        .join(Stock, UserWatchlist.stock_code == Stock.code)
+        .filter(UserWatchlist.user_id == current_user.id)
+        .order_by(UserWatchlist.added_at)
+    )
     watchlist_stocks = [
         {
-            "code": item.stock.code,
-            "name": item.stock.name,
-            "industry": item.stock.industry,
-            "added_at": item.added_at.isoformat()
+            "code": code,
+            "name": name,
+            "industry": industry,
+            "added_at": added_at.isoformat()
         }
-        for item in user.watchlist_items
+        for code, name, industry, added_at in rows
     ]
 
     return jsonify({"code": 0, "message": "Success", "data": {"watchlist": watchlist_stocks}}), 200
@@ -35,7 +47,7 @@ def get_watchlist():
 @jwt_required()
 def add_to_watchlist():
     """添加股票到用户的自选股列表。"""
-    current_user_id = get_jwt_identity()
+    current_user_id = current_user.id
     data = request.get_json()
     stock_code = data.get('stock_code')
 
@@ -50,6 +62,7 @@ def add_to_watchlist():
         new_item = UserWatchlist(user_id=current_user_id, stock_code=stock_code)
         db.session.add(new_item)
         db.session.commit()
+        quote_hub.watchlist_changed(current_user_id, added=[stock_code])
         return jsonify({"code": 0, "message": "Stock added to watchlist"}), 201
     except IntegrityError:
         db.session.rollback()
@@ -62,7 +75,7 @@ def add_to_watchlist():
 @jwt_required()
 def remove_from_watchlist(stock_code):
     """从用户的自选股列表移除股票。"""
-    current_user_id = get_jwt_identity()
+    current_user_id = current_user.id
 
     item = UserWatchlist.query.filter_by(user_id=current_user_id, stock_code=stock_code).first()
 
@@ -72,7 +85,147 @@ def remove_from_watchlist(stock_code):
     try:
         db.session.delete(item)
         db.session.commit()
+        quote_hub.watchlist_changed(current_user_id, removed=[stock_code])
         return jsonify({"code": 0, "message": "Stock removed from watchlist"}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({"code": 50002, "message": f"Failed to remove stock from watchlist: {e}"}), 500
+
+def _batch_codes():
+    """解析批量请求体中的 stock_codes，去重并保持顺序；格式错误时返回错误响应。"""
+    data = request.get_json(silent=True) or {}
+    codes = data.get('stock_codes')
+    if not isinstance(codes, list) or not codes:
+        return None, (jsonify({"code": 40001, "message": "stock_codes must be a non-empty list"}), 400)
+    codes = list(dict.fromkeys(str(code) for code in codes))
+    if len(codes) > WATCHLIST_BATCH_LIMIT:
+        return None, (jsonify({"code": 40004, "message": f"At most {WATCHLIST_BATCH_LIMIT} stock codes per request"}), 400)
+    return codes, None
+
+def _insert_ignoring_conflicts(user_id, codes) -> set:
+    """
+    一条语句插入多只自选股，已存在的跳过，返回实际新增的股票代码。
+    其他数据库方言退化为先查询已存在的代码再插入其余代码。
+    """
+    rows = [{'user_id': user_id, 'stock_code': code} for code in codes]
+    dialect = db.engine.dialect
+    conflict_insert = _CONFLICT_IGNORE_INSERTS.get(dialect.name)
+    if conflict_insert is not None and dialect.insert_returning:
+        statement = (
+            conflict_insert(UserWatchlist).values(rows)
+            .on_conflict_do_nothing(index_elements=['user_id', 'stock_code'])
+            .returning(UserWatchlist.stock_code)
+        )
+        return set(db.session.scalars(statement))
+
+    existing = set(db.session.scalars(
+        select(UserWatchlist.stock_code)
+        .where(UserWatchlist.user_id == user_id, UserWatchlist.stock_code.in_(codes))
+    ))
+    new_rows = [row for row in rows if row['stock_code'] not in existing]
+    if new_rows:
+        db.session.execute(insert(UserWatchlist), new_rows)
+    return {row['stock_code'] for row in new_rows}
+
+@watchlist_bp.route('/batch', methods=['POST'])
+@jwt_required()
+def add_to_watchlist_batch():
+    """
+    批量添加自选股。请求体：{"stock_codes": ["600000", ...]}
+    用一次IN查询校验所有代码，一条语句插入，返回每个代码的结果：added / exists / not_found。
+    """
+    codes, error = _batch_codes()
+    if error:
+        return error
+
+    current_user_id = current_user.id
+    known = set(db.session.scalars(select(Stock.code).where(Stock.code.in_(codes))))
+    try:
+        added = _insert_ignoring_conflicts(current_user_id, [code for code in codes if code in known])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"code": 50001, "message": f"Failed to add stocks to watchlist: {e}"}), 500
+
+    if added:
+        quote_hub.watchlist_changed(current_user_id, added=added)
+    results = {
+        code: 'added' if code in added else 'exists' if code in known else 'not_found'
+        for code in codes
+    }
+    return jsonify({"code": 0, "message": f"{len(added)} stocks added to watchlist", "data": {"results": results}}), 200
+
+@watchlist_bp.route('/batch', methods=['DELETE'])
+@jwt_required()
+def remove_from_watchlist_batch():
+    """
+    批量移除自选股。请求体：{"stock_codes": ["600000", ...]}
+    一条语句删除，返回每个代码的结果：removed / not_in_watchlist。
+    """
+    codes, error = _batch_codes()
+    if error:
+        return error
+
+    current_user_id = current_user.id
+    condition = (UserWatchlist.user_id == current_user_id) & UserWatchlist.stock_code.in_(codes)
+    try:
+        if db.engine.dialect.delete_returning:
+            removed = set(db.session.scalars(delete(UserWatchlist).where(condition).returning(UserWatchlist.stock_code)))
+        else:
+            removed = set(db.session.scalars(select(UserWatchlist.stock_code).where(condition)))
+            db.session.execute(delete(UserWatchlist).where(condition))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"code": 50002, "message": f"Failed to remove stocks from watchlist: {e}"}), 500
+
+    if removed:
+        quote_hub.watchlist_changed(current_user_id, removed=removed)
+    results = {code: 'removed' if code in removed else 'not_in_watchlist' for code in codes}
+    return jsonify({"code": 0, "message": f"{len(removed)} stocks removed from watchlist", "data": {"results": results}}), 200
+
+@watchlist_bp.route('/stream', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def stream_watchlist_quotes():
+    """
+    通过SSE推送当前用户自选股的行情变化。
+    浏览器EventSource无法设置请求头，可通过查询参数 ?jwt=<token> 传递令牌。
+    其他worker进程处理的自选股增删经quote_hub的跨进程通知同步到本连接；通知不可用时每次心跳从数据库重新加载。
+    每个连接占用一个worker线程，当前进程的连接数达到WATCHLIST_MAX_STREAMS时返回503。
+    """
+    current_user_id = current_user.id
+    with read_only():
+        symbols = [code for (code,) in db.session.query(UserWatchlist.stock_code).filter_by(user_id=current_user_id)]
+    db.session.close() # 长连接期间不占用数据库连接
+
+    try:
+        subscription = quote_hub.subscribe(current_user_id, symbols)
+    except TooManyStreams as e:
+        response = jsonify({"code": 50303, "message": str(e), "data": None})
+        response.headers['Retry-After'] = str(STREAM_HEARTBEAT_SECONDS)
+        return response, 503
+    # 订阅后再取当前行情作为首批消息，之后只推送变化
+    initial_messages = quote_hub.snapshot_messages(symbols)
+
+    def events():
+        try:
+            for message in initial_messages:
+                yield message
+            while True:
+                try:
+                    yield subscription.messages.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    if quote_hub.needs_resync:
+                        try:
+                            quote_hub.reload_user(current_user_id)
+                        except Exception as e:
+                            print(f"Watchlist reload failed during stream heartbeat: {e}")
+                    yield ": heartbeat\n\n"
+        finally:
+            quote_hub.unsubscribe(subscription)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
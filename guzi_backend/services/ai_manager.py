@@ -3,6 +3,7 @@
 from flask import current_app
 from .ai_service import AIServiceAdapter
 from .gemini_adapter import GeminiAdapter
+from .prompt_builder import DEFAULT_TOKEN_BUDGET
 
 class AIManager:
     """AI服务管理器，负责初始化和提供AI服务适配器。"""
@@ -16,8 +17,9 @@ class AIManager:
         with app.app_context():
             # 初始化Gemini适配器
             gemini_api_key = current_app.config.get('GEMINI_API_KEY')
+            token_budget = current_app.config.get('PROMPT_TOKEN_BUDGET', DEFAULT_TOKEN_BUDGET)
             if gemini_api_key:
-                self.adapters['gemini'] = GeminiAdapter(gemini_api_key)
+                self.adapters['gemini'] = GeminiAdapter(gemini_api_key, token_budget)
                 print("Gemini AI service initialized.")
             else:
                 print("Gemini API key not found. Gemini service not initialized.")
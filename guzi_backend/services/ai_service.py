@@ -1,6 +1,8 @@
 # guzi_backend/services/ai_service.py
 
+import asyncio
 from abc import ABC, abstractmethod
+from .prompt_builder import DEFAULT_TOKEN_BUDGET
 
 class AIServiceAdapter(ABC):
     """AI服务适配器抽象基类。"""
@@ -23,8 +25,13 @@ class AIServiceAdapter(ABC):
 
 class BaseAIServiceAdapter(AIServiceAdapter):
     """基础AI服务适配器，提供通用功能。"""
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, token_budget: int = DEFAULT_TOKEN_BUDGET):
         self.api_key = api_key
+        self.token_budget = token_budget # 由适配器自行构建的提示词的预算（估算token数）
+
+    async def generate_text_async(self, prompt: str) -> str:
+        """异步生成文本。默认在线程中执行同步实现，支持原生异步的适配器可以覆盖。"""
+        return await asyncio.to_thread(self.generate_text, prompt)
 
     def _handle_api_error(self, e: Exception):
         """处理API调用中可能出现的错误。"""
@@ -1,553 +1,574 @@
 # guzi_backend/services/analysis_service.py
 
-from flask import current_app
-from sqlalchemy import func
-from ..database import db
-from ..models import Stock
-from .data_service import get_all_stocks # 可能会用到实时数据，但目前只获取基础列表
-import akshare as ak
-import pandas as pd
-
-def identify_sector_leaders(industry_name: str):
+import threading
+from collections import OrderedDict
+import numpy as np
+from .data_service import get_symbol_index, fetch_bundle
+from .circuit_breaker import UpstreamUnavailable
+from . import change_feed
+
+# 接口允许返回的最多股票数
+MAX_TOP_N = 500
+
+# 各策略可调参数及默认值：top_n为返回数量，w_开头的为评分权重（归一化为和为1），其余为阈值
+STRATEGY_PARAMS = {
+    'sector_leaders': {'top_n': 2, 'w_market_cap': 0.4, 'w_change': 0.3, 'w_amount': 0.3},
+    'institutional': {'top_n': 10, 'w_market_cap': 0.4, 'w_amount': 0.3, 'w_stability': 0.3},
+    'small_cap': {
+        'top_n': 10, 'market_cap_threshold': 500_000_000_000, # 5000亿作为中小市值上限示例
+        'w_market_cap': 0.3, 'w_momentum': 0.4, 'w_liquidity': 0.3
+    },
+    'undervalued': {'top_n': 10, 'w_pe': 0.5, 'w_pb': 0.5},
+    'comprehensive': {'top_n': 20, 'w_technical': 0.3, 'w_fundamental': 0.4, 'w_valuation': 0.3},
+}
+
+
+class _LRUCache:
+    """线程安全的有界LRU缓存。"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard_where(self, predicate):
+        """移除键满足条件的所有条目。"""
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# --- 结果缓存（由变化订阅驱动失效） ---
+# 行业龙头缓存：(行业名, 参数) -> 龙头结果，只失效成分股发生变化的行业
+_leader_cache = _LRUCache(512)
+# 全市场排名缓存：(策略名, 参数) -> (依赖数据的版本号, 结果)，常用参数组合常驻内存，少见的组合按LRU淘汰
+_ranking_cache = _LRUCache(128)
+
+# 各策略依赖的上游数据集，由获取计划执行器（fetch_bundle）一次性并发准备
+STRATEGY_DATASETS = {
+    'sector_leaders': ('spot',),
+    'institutional': ('spot',),
+    'small_cap': ('spot',),
+    'undervalued': ('valuation',),
+    'comprehensive': ('spot', 'valuation'),
+}
+
+
+def _on_spot_change(delta):
+    """行情变化时只失效包含变化股票的行业龙头缓存。"""
+    if delta.reset:
+        _leader_cache.clear()
+        return
+    index = get_symbol_index()
+    positions = index.lookup(delta.symbols)
+    industries = set(index.industries[positions[positions >= 0]].tolist())
+    _leader_cache.discard_where(lambda key: key[0] in industries)
+
+
+def _on_stocks_change(delta):
+    """股票列表或行业归属变化时，行业成分可能改变，清空全部龙头缓存。"""
+    _leader_cache.clear()
+
+
+change_feed.subscribe('spot', _on_spot_change)
+change_feed.subscribe('stocks', _on_stocks_change)
+
+
+def normalize_params(strategy: str, raw=None) -> tuple:
     """
-    识别指定行业内的龙一龙二股票。
-    基于市值、涨跌幅和成交量进行综合评分。
-    
+    校验并规范化策略参数，返回可作为缓存键的有序元组。
+
+    未提供的参数使用默认值；top_n限制在[1, MAX_TOP_N]；权重须为非负数并归一化为和为1，
+    使 w=0.4,0.3,0.3 与 w=4,3,3 命中同一缓存；与策略无关的参数被忽略。
+
     Args:
-        industry_name (str): 行业名称。
-        
-    Returns:
-        list: 包含龙一龙二股票信息的列表。
+        strategy (str): 策略名，见STRATEGY_PARAMS。
+        raw (Mapping): 原始参数（例如请求的查询参数），值可以是字符串。
+
+    Raises:
+        ValueError: 参数无法解析或超出范围。
     """
-    # 1. 从数据库获取指定行业的所有股票
-    stocks_in_industry = Stock.query.filter_by(industry=industry_name).all()
-    if not stocks_in_industry:
-        return []
+    raw = raw or {}
+    params = {}
+    for name, default in STRATEGY_PARAMS[strategy].items():
+        value = raw.get(name, default)
+        try:
+            value = int(value) if name == 'top_n' else float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Parameter {name} must be a number.")
+        if not np.isfinite(value):
+            raise ValueError(f"Parameter {name} must be finite.")
+        if name == 'top_n' and not 1 <= value <= MAX_TOP_N:
+            raise ValueError(f"Parameter top_n must be between 1 and {MAX_TOP_N}.")
+        if name.startswith('w_') and value < 0:
+            raise ValueError(f"Weight {name} must not be negative.")
+        params[name] = value
+
+    total = sum(value for name, value in params.items() if name.startswith('w_'))
+    if total <= 0:
+        raise ValueError("At least one weight must be positive.")
+    for name in params:
+        if name.startswith('w_'):
+            params[name] = round(params[name] / total, 6)
+    return tuple(sorted(params.items()))
+
+
+def _tables(strategy: str) -> tuple:
+    """策略结果依赖的变化表：股票列表以及策略声明的数据集。"""
+    return ('stocks',) + STRATEGY_DATASETS[strategy]
+
+
+def _cached_ranking(strategy: str, params: tuple, compute):
+    """
+    准备策略声明的数据集，(策略, 参数) 对应的结果在依赖数据表的版本号未变化时直接返回缓存。
+    准备数据集使过期检查、后台刷新和共享快照切换在读取缓存前生效；有数据集不可用时不使用缓存，由compute报告错误。
+    """
+    key = (strategy, params)
+    tables = _tables(strategy)
+    bundle = fetch_bundle(STRATEGY_DATASETS[strategy])
+    data_version = change_feed.version(*tables)
+    entry = _ranking_cache.get(key)
+    if entry is not None and entry[0] == data_version and not bundle.errors:
+        return entry[1]
+    result = compute(bundle, dict(params))
+    if change_feed.version(*tables) != data_version:
+        # 计算期间数据发生了变化（例如首次加载），按最新数据重新计算
+        bundle = fetch_bundle(STRATEGY_DATASETS[strategy])
+        data_version = change_feed.version(*tables)
+        result = compute(bundle, dict(params))
+    _ranking_cache[key] = (data_version, result)
+    return result
+
+
+def _dataset(bundle, name: str, context: str):
+    """读取数据集；上游不可用且没有最近一次成功获取的数据时抛出UpstreamUnavailable，不再用虚拟数据排名。"""
+    try:
+        return bundle[name]
+    except Exception as e:
+        raise UpstreamUnavailable(f"{name} data is unavailable for {context}: {e}",
+                                  getattr(e, 'retry_in', None)) from e
 
-    stock_codes = [s.code for s in stocks_in_industry]
 
-    # 2. 获取这些股票的实时市场数据
-    # 注意：ak.stock_zh_a_spot_em() 之前遇到过连接问题，这里需要谨慎处理
-    # 暂时使用一个更稳定的接口，或者假设能获取到数据
-    try:
-        # 尝试获取A股实时行情数据
-        # 这是一个可能失败的接口，需要有容错机制
-        realtime_data_df = ak.stock_zh_a_spot_em()
-        # 过滤出当前行业股票的数据
-        realtime_data_df = realtime_data_df[realtime_data_df['代码'].isin(stock_codes)]
-        
-        if realtime_data_df.empty:
-            print(f"Warning: No real-time data found for industry {industry_name}. Using dummy data for scoring.")
-            # 如果没有实时数据，则创建虚拟数据，避免程序崩溃
-            realtime_data_df = pd.DataFrame({
-                '代码': stock_codes,
-                '最新价': [10.0] * len(stock_codes),
-                '涨跌幅': [0.0] * len(stock_codes),
-                '成交额': [10000000.0] * len(stock_codes),
-                '总市值': [1000000000.0] * len(stock_codes),
-            })
+def _spot_columns(bundle, mask: np.ndarray, context: str):
+    """
+    读取对齐后的实时行情列（市值、涨跌幅、成交额），缺失值填0。
+    掩码范围内没有任何实时数据时返回None。
+    """
+    spot = _dataset(bundle, 'spot', context)
+    if not spot.any_present(mask):
+        print(f"Warning: No real-time data found for {context}.")
+        return None
+    return {name: spot.column(name, fill=0)[mask] for name in ('总市值', '涨跌幅', '成交额')}
 
-    except Exception as e:
-        print(f"Error fetching real-time data for sector leaders: {e}. Using dummy data for scoring.")
-        # 如果获取实时数据失败，则创建虚拟数据
-        realtime_data_df = pd.DataFrame({
-            '代码': stock_codes,
-            '最新价': [10.0] * len(stock_codes),
-            '涨跌幅': [0.0] * len(stock_codes),
-            '成交额': [10000000.0] * len(stock_codes),
-            '总市值': [1000000000.0] * len(stock_codes),
-        })
 
-    # 3. 合并数据库中的股票名称和实时数据
-    merged_df = pd.merge(
-        pd.DataFrame([{'code': s.code, 'name': s.name} for s in stocks_in_industry]),
-        realtime_data_df,
-        left_on='code',
-        right_on='代码',
-        how='left'
+def _valuation_columns(bundle, mask: np.ndarray, context: str):
+    """读取对齐后的估值列（PE、PB），缺失值设为9999（视为高估值）。掩码范围内没有任何估值数据时返回None。"""
+    valuation = _dataset(bundle, 'valuation', context)
+    if not valuation.any_present(mask):
+        print(f"Warning: No valuation data found for {context}.")
+        return None
+    return {name: valuation.column(name, fill=9999)[mask] for name in ('市盈率', '市净率')}
+
+
+# --- 因子定义 ---
+# 评分函数沿最后一个轴计算：实时排名传入一维数组（各股票），回测传入二维数组（调仓日×股票）。
+# where为参与归一化的股票掩码（回测中为当日有行情的股票），返回 (得分, 可入选掩码)。
+
+def _bounds(values: np.ndarray, where=True):
+    """沿最后一个轴计算where范围内的最小、最大值，没有可用值时分别为+inf、-inf。"""
+    low = np.min(values, axis=-1, keepdims=True, initial=np.inf, where=where)
+    high = np.max(values, axis=-1, keepdims=True, initial=-np.inf, where=where)
+    return low, high
+
+
+def _scale(values: np.ndarray, where=True) -> np.ndarray:
+    """最小-最大归一化，分母加极小值避免除零。"""
+    low, high = _bounds(values, where)
+    with np.errstate(invalid='ignore'):
+        return (values - low) / (high - low + 1e-9)
+
+
+def _normalize(values: np.ndarray, invert: bool = False, where=True) -> np.ndarray:
+    """
+    最小-最大归一化，取值范围过小（或where范围内没有数据）时统一给中等分0.5。
+
+    Args:
+        values (np.ndarray): 待归一化的数值。
+        invert (bool): 为True时数值越小得分越高。
+        where (np.ndarray): 用于计算最小/最大值的掩码，默认为全部数值。
+    """
+    low, high = _bounds(values, where)
+    span = high - low
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scaled = (high - values) / span if invert else (values - low) / span
+    return np.where(span > 1e-9, scaled, 0.5)
+
+
+def _eligible(where, shape) -> np.ndarray:
+    return np.broadcast_to(np.asarray(where, dtype=bool), shape)
+
+
+def _sector_leader_score(columns: dict, params: dict, where=True):
+    """行业龙头：市值 + 涨跌幅 + 成交额（均为越大越好）。"""
+    score = (
+        _scale(columns['总市值'], where) * params['w_market_cap'] +
+        _scale(columns['涨跌幅'], where) * params['w_change'] +
+        _scale(columns['成交额'], where) * params['w_amount']
     )
-    # 填充缺失的实时数据，避免评分时出错
-    merged_df['总市值'] = merged_df['总市值'].fillna(0)
-    merged_df['涨跌幅'] = merged_df['涨跌幅'].fillna(0)
-    merged_df['成交额'] = merged_df['成交额'].fillna(0)
+    return score, _eligible(where, score.shape)
 
-    # 4. 应用评分逻辑
-    # 评分权重：市值(40%) + 涨跌幅(30%) + 成交额(30%)
-    # 需要对数据进行归一化处理，避免量纲影响
-    if merged_df.empty:
-        return []
 
-    # 归一化处理
-    merged_df['市值_norm'] = (merged_df['总市值'] - merged_df['总市值'].min()) / (merged_df['总市值'].max() - merged_df['总市值'].min() + 1e-9)
-    merged_df['涨跌幅_norm'] = (merged_df['涨跌幅'] - merged_df['涨跌幅'].min()) / (merged_df['涨跌幅'].max() - merged_df['涨跌幅'].min() + 1e-9)
-    merged_df['成交额_norm'] = (merged_df['成交额'] - merged_df['成交额'].min()) / (merged_df['成交额'].max() - merged_df['成交额'].min() + 1e-9)
+def _institutional_score(columns: dict, params: dict, where=True):
+    """
+    机构偏好：大市值、高流动性、价格稳定性。
+    价格稳定性：涨跌幅绝对值越小越稳定，用 (1 - abs(涨跌幅)/max_abs_涨跌幅) 归一化，
+    所有涨跌幅都为0时都视为最稳定。
+    """
+    abs_change = np.abs(columns['涨跌幅'])
+    max_abs_change = np.max(abs_change, axis=-1, keepdims=True, initial=0.0, where=where)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        stability = np.where(max_abs_change > 0, 1 - abs_change / max_abs_change, 1.0)
+    score = (
+        _scale(columns['总市值'], where) * params['w_market_cap'] +
+        _scale(columns['成交额'], where) * params['w_amount'] +
+        stability * params['w_stability']
+    )
+    return score, _eligible(where, score.shape)
+
 
-    # 计算综合评分
-    merged_df['score'] = (
-        merged_df['市值_norm'] * 0.4 +
-        merged_df['涨跌幅_norm'] * 0.3 +
-        merged_df['成交额_norm'] * 0.3
+def _small_cap_score(columns: dict, params: dict, where=True):
+    """中小票龙头：只在市值低于阈值的股票中评分，市值越小、动量越大、成交额越大越好。"""
+    market_cap = columns['总市值']
+    small = (market_cap < params['market_cap_threshold']) & where
+    score = (
+        _normalize(market_cap, invert=True, where=small) * params['w_market_cap'] +
+        _normalize(columns['涨跌幅'], where=small) * params['w_momentum'] +
+        _normalize(columns['成交额'], where=small) * params['w_liquidity']
     )
+    return score, small
+
+
+def _undervalued_score(columns: dict, params: dict, where=True):
+    """低估股票：过滤掉非正估值，PE和PB越低越好。"""
+    pe, pb = columns['市盈率'], columns['市净率']
+    valid = (pe > 0) & (pb > 0) & where
+    score = (
+        _normalize(pe, invert=True, where=valid) * params['w_pe'] +
+        _normalize(pb, invert=True, where=valid) * params['w_pb']
+    )
+    return score, valid
+
+
+def _comprehensive_score(columns: dict, params: dict, where=True):
+    """
+    综合评分：技术面（涨跌幅，越高越好）+ 基本面（总市值，越高越好）+ 估值面（PE、PB，越低越好）。
+    估值面以正估值的股票作为归一化区间，没有有效估值数据时给中等分。
+    """
+    pe, pb = columns['市盈率'], columns['市净率']
+    valid = (pe > 0) & (pb > 0) & where
+    val_norm = (_normalize(pe, invert=True, where=valid) + _normalize(pb, invert=True, where=valid)) / 2
+    score = (
+        _normalize(columns['涨跌幅'], where=where) * params['w_technical'] +
+        _normalize(columns['总市值'], where=where) * params['w_fundamental'] +
+        val_norm * params['w_valuation']
+    )
+    return score, _eligible(where, score.shape)
+
+
+# 各策略的评分函数，实时排名与回测（backtest_service）共用
+STRATEGY_FACTORS = {
+    'sector_leaders': _sector_leader_score,
+    'institutional': _institutional_score,
+    'small_cap': _small_cap_score,
+    'undervalued': _undervalued_score,
+    'comprehensive': _comprehensive_score,
+}
+
+
+def _top(score: np.ndarray, n: int) -> np.ndarray:
+    """返回得分最高的前n个位置（按得分降序）。"""
+    return np.argsort(-score, kind='stable')[:n]
 
-    # 5. 排序并返回龙一龙二
-    merged_df = merged_df.sort_values(by='score', ascending=False)
-    
+
+def _identify_sector_leaders(bundle, industry_name: str, params: dict):
+    """
+    识别指定行业内的龙一龙二股票。
+    基于市值、涨跌幅和成交量进行综合评分。
+
+    Args:
+        bundle (DataBundle): 代码索引和对齐后的数据集。
+        industry_name (str): 行业名称。
+        params (dict): 规范化后的策略参数，见STRATEGY_PARAMS['sector_leaders']。
+
+    Returns:
+        list: 包含龙一龙二股票信息的列表。
+    """
+    # 1. 从代码索引中选出指定行业的所有股票
+    index = bundle.index
+    mask = index.industry_mask(industry_name)
+    if not mask.any():
+        return []
+
+    # 2. 读取这些股票已对齐的实时市场数据（缺失值填0）
+    spot = _spot_columns(bundle, mask, f"industry {industry_name}")
+    if spot is None:
+        return []
+    market_cap, change, amount = spot['总市值'], spot['涨跌幅'], spot['成交额']
+
+    # 3. 应用评分逻辑
+    # 默认评分权重：市值(40%) + 涨跌幅(30%) + 成交额(30%)
+    # 需要对数据进行归一化处理，避免量纲影响
+    score, _ = _sector_leader_score(spot, params)
+
+    # 4. 排序并返回龙一龙二
+    positions = np.flatnonzero(mask)
     leaders = []
-    for _, row in merged_df.head(2).iterrows():
+    for i in _top(score, params['top_n']):
+        pos = positions[i]
         leaders.append({
-            'code': row['code'],
-            'name': row['name'],
+            'code': str(index.codes[pos]),
+            'name': str(index.names[pos]),
             'industry': industry_name,
-            'score': round(row['score'], 2),
-            'market_cap': row['总市值'],
-            'change_percent': row['涨跌幅'],
-            'volume_amount': row['成交额']
+            'score': round(float(score[i]), 2),
+            'market_cap': float(market_cap[i]),
+            'change_percent': float(change[i]),
+            'volume_amount': float(amount[i])
         })
-    
+
     return leaders
 
-def analyze_institutional_holdings():
+def _analyze_institutional_holdings(bundle, params: dict):
     """
     分析并识别机构重仓股。
     基于大市值、高流动性、价格稳定性等指标进行综合评分，模拟机构偏好。
-    
+
+    Args:
+        bundle (DataBundle): 代码索引和对齐后的数据集。
+        params (dict): 规范化后的策略参数，见STRATEGY_PARAMS['institutional']。
+
     Returns:
         list: 包含机构偏好股票信息的列表。
     """
-    # 1. 从数据库获取所有股票
-    all_stocks = Stock.query.all()
-    if not all_stocks:
+    # 1. 使用代码索引中的全部股票
+    index = bundle.index
+    if len(index) == 0:
         return []
+    mask = np.ones(len(index), dtype=bool)
 
-    stock_codes = [s.code for s in all_stocks]
-
-    # 2. 获取这些股票的实时市场数据
-    try:
-        realtime_data_df = ak.stock_zh_a_spot_em()
-        realtime_data_df = realtime_data_df[realtime_data_df['代码'].isin(stock_codes)]
-
-        if realtime_data_df.empty:
-            print("Warning: No real-time data found for institutional analysis. Using dummy data.")
-            realtime_data_df = pd.DataFrame({
-                '代码': stock_codes,
-                '最新价': [10.0] * len(stock_codes),
-                '涨跌幅': [0.0] * len(stock_codes),
-                '成交额': [10000000.0] * len(stock_codes),
-                '总市值': [1000000000.0] * len(stock_codes),
-            })
-
-    except Exception as e:
-        print(f"Error fetching real-time data for institutional analysis: {e}. Using dummy data.")
-        realtime_data_df = pd.DataFrame({
-            '代码': stock_codes,
-            '最新价': [10.0] * len(stock_codes),
-            '涨跌幅': [0.0] * len(stock_codes),
-            '成交额': [10000000.0] * len(stock_codes),
-            '总市值': [1000000000.0] * len(stock_codes),
-        })
-
-    # 3. 合并数据库中的股票名称和实时数据
-    merged_df = pd.merge(
-        pd.DataFrame([{'code': s.code, 'name': s.name, 'industry': s.industry} for s in all_stocks]),
-        realtime_data_df,
-        left_on='code',
-        right_on='代码',
-        how='left'
-    )
-    # 填充缺失的实时数据
-    merged_df['总市值'] = merged_df['总市值'].fillna(0)
-    merged_df['涨跌幅'] = merged_df['涨跌幅'].fillna(0)
-    merged_df['成交额'] = merged_df['成交额'].fillna(0)
-
-    if merged_df.empty:
+    # 2. 读取已对齐的实时市场数据
+    spot = _spot_columns(bundle, mask, "institutional analysis")
+    if spot is None:
         return []
+    market_cap, change, amount = spot['总市值'], spot['涨跌幅'], spot['成交额']
 
-    # 4. 应用评分逻辑
+    # 3. 应用评分逻辑
     # 机构偏好：大市值、高流动性、价格稳定性
-    # 评分权重：市值(40%) + 成交额(30%) + 价格稳定性(30%)
-    # 价格稳定性：涨跌幅绝对值越小越稳定，所以取其倒数或用 (1 - abs(涨跌幅)/max_abs_涨跌幅) 归一化
-
-    # 归一化处理
-    # 市值归一化
-    merged_df['市值_norm'] = (merged_df['总市值'] - merged_df['总市值'].min()) / (merged_df['总市值'].max() - merged_df['总市值'].min() + 1e-9)
-    # 成交额归一化
-    merged_df['成交额_norm'] = (merged_df['成交额'] - merged_df['成交额'].min()) / (merged_df['成交额'].max() - merged_df['成交额'].min() + 1e-9)
-    # 价格稳定性归一化 (涨跌幅绝对值越小，稳定性越高，得分越高)
-    max_abs_change = merged_df['涨跌幅'].abs().max()
-    if max_abs_change > 0:
-        merged_df['稳定性_norm'] = 1 - (merged_df['涨跌幅'].abs() / max_abs_change)
-    else:
-        merged_df['稳定性_norm'] = 1.0 # 如果所有涨跌幅都为0，则都视为最稳定
-
-    # 计算综合评分
-    merged_df['institutional_score'] = (
-        merged_df['市值_norm'] * 0.4 +
-        merged_df['成交额_norm'] * 0.3 +
-        merged_df['稳定性_norm'] * 0.3
-    )
+    # 默认评分权重：市值(40%) + 成交额(30%) + 价格稳定性(30%)
+    score, _ = _institutional_score(spot, params)
 
-    # 5. 排序并返回前N名
-    merged_df = merged_df.sort_values(by='institutional_score', ascending=False)
-    
+    # 4. 排序并返回前N名
     top_institutional_stocks = []
-    for _, row in merged_df.head(10).iterrows(): # 返回前10名作为示例
+    for pos in _top(score, params['top_n']):
         top_institutional_stocks.append({
-            'code': row['code'],
-            'name': row['name'],
-            'industry': row['industry'],
-            'institutional_score': round(row['institutional_score'], 2),
-            'market_cap': row['总市值'],
-            'change_percent': row['涨跌幅'],
-            'volume_amount': row['成交额']
+            'code': str(index.codes[pos]),
+            'name': str(index.names[pos]),
+            'industry': index.industry_at(pos),
+            'institutional_score': round(float(score[pos]), 2),
+            'market_cap': float(market_cap[pos]),
+            'change_percent': float(change[pos]),
+            'volume_amount': float(amount[pos])
         })
-    
+
     return top_institutional_stocks
 
-def identify_small_cap_leaders(market_cap_threshold: float = 500_000_000_000): # 5000亿作为中小市值上限示例
+def _identify_small_cap_leaders(bundle, params: dict):
     """
     识别中小票龙头股。
     专注于小市值股票，结合动量、流动性等因素综合评估。
-    
+
     Args:
-        market_cap_threshold (float): 定义中小票的市值上限。
-        
+        bundle (DataBundle): 代码索引和对齐后的数据集。
+        params (dict): 规范化后的策略参数，见STRATEGY_PARAMS['small_cap']，
+            其中market_cap_threshold定义中小票的市值上限。
+
     Returns:
         list: 包含中小票龙头股信息的列表。
     """
-    # 1. 从数据库获取所有股票
-    all_stocks = Stock.query.all()
-    if not all_stocks:
+    # 1. 使用代码索引中的全部股票
+    index = bundle.index
+    if len(index) == 0:
         return []
+    mask = np.ones(len(index), dtype=bool)
 
-    stock_codes = [s.code for s in all_stocks]
-
-    # 2. 获取这些股票的实时市场数据
-    try:
-        realtime_data_df = ak.stock_zh_a_spot_em()
-        realtime_data_df = realtime_data_df[realtime_data_df['代码'].isin(stock_codes)]
-
-        if realtime_data_df.empty:
-            print("Warning: No real-time data found for small-cap analysis. Using dummy data.")
-            realtime_data_df = pd.DataFrame({
-                '代码': stock_codes,
-                '最新价': [10.0] * len(stock_codes),
-                '涨跌幅': [0.0] * len(stock_codes),
-                '成交额': [10000000.0] * len(stock_codes),
-                '总市值': [1000000000.0] * len(stock_codes),
-            })
-
-    except Exception as e:
-        print(f"Error fetching real-time data for small-cap analysis: {e}. Using dummy data.")
-        realtime_data_df = pd.DataFrame({
-            '代码': stock_codes,
-            '最新价': [10.0] * len(stock_codes),
-            '涨跌幅': [0.0] * len(stock_codes),
-            '成交额': [10000000.0] * len(stock_codes),
-            '总市值': [1000000000.0] * len(stock_codes),
-        })
-
-    # 3. 合并数据库中的股票名称和实时数据
-    merged_df = pd.merge(
-        pd.DataFrame([{'code': s.code, 'name': s.name, 'industry': s.industry} for s in all_stocks]),
-        realtime_data_df,
-        left_on='code',
-        right_on='代码',
-        how='left'
-    )
-    # 填充缺失的实时数据
-    merged_df['总市值'] = merged_df['总市值'].fillna(0)
-    merged_df['涨跌幅'] = merged_df['涨跌幅'].fillna(0)
-    merged_df['成交额'] = merged_df['成交额'].fillna(0)
-
-    if merged_df.empty:
+    # 2. 读取已对齐的实时市场数据
+    spot = _spot_columns(bundle, mask, "small-cap analysis")
+    if spot is None:
         return []
 
-    # 4. 筛选中小票
-    small_cap_df = merged_df[merged_df['总市值'] < market_cap_threshold]
-    if small_cap_df.empty:
+    # 3. 筛选中小票并评分
+    # 默认评分权重：市值(30%，市值越小越好) + 动量(40%，涨跌幅越大越好) + 流动性(30%，成交额越大越好)
+    score, small = _small_cap_score(spot, params)
+    if not small.any():
         return []
+    positions = np.flatnonzero(small)
+    score = score[small]
+    market_cap, change, amount = spot['总市值'][small], spot['涨跌幅'][small], spot['成交额'][small]
 
-    # 5. 应用评分逻辑
-    # 评分权重：市值(30%，市值越小越好) + 动量(40%，涨跌幅越大越好) + 流动性(30%，成交额越大越好)
-
-    # 归一化处理
-    # 市值归一化 (市值越小得分越高，所以用 (max - val) / (max - min) 归一化)
-    min_market_cap = small_cap_df['总市值'].min()
-    max_market_cap = small_cap_df['总市值'].max()
-    if max_market_cap - min_market_cap > 1e-9:
-        small_cap_df['市值_norm'] = (max_market_cap - small_cap_df['总市值']) / (max_market_cap - min_market_cap)
-    else:
-        small_cap_df['市值_norm'] = 0.5 # 如果市值都一样，给个中等分
-
-    # 动量归一化 (涨跌幅越大得分越高)
-    min_change = small_cap_df['涨跌幅'].min()
-    max_change = small_cap_df['涨跌幅'].max()
-    if max_change - min_change > 1e-9:
-        small_cap_df['涨跌幅_norm'] = (small_cap_df['涨跌幅'] - min_change) / (max_change - min_change)
-    else:
-        small_cap_df['涨跌幅_norm'] = 0.5
-
-    # 流动性归一化 (成交额越大得分越高)
-    min_volume = small_cap_df['成交额'].min()
-    max_volume = small_cap_df['成交额'].max()
-    if max_volume - min_volume > 1e-9:
-        small_cap_df['成交额_norm'] = (small_cap_df['成交额'] - min_volume) / (max_volume - min_volume)
-    else:
-        small_cap_df['成交额_norm'] = 0.5
-
-    # 计算综合评分
-    small_cap_df['small_cap_score'] = (
-        small_cap_df['市值_norm'] * 0.3 +
-        small_cap_df['涨跌幅_norm'] * 0.4 +
-        small_cap_df['成交额_norm'] * 0.3
-    )
-
-    # 6. 排序并返回前N名
-    small_cap_df = small_cap_df.sort_values(by='small_cap_score', ascending=False)
-    
+    # 4. 排序并返回前N名
     top_small_cap_stocks = []
-    for _, row in small_cap_df.head(10).iterrows(): # 返回前10名作为示例
+    for i in _top(score, params['top_n']):
+        pos = positions[i]
         top_small_cap_stocks.append({
-            'code': row['code'],
-            'name': row['name'],
-            'industry': row['industry'],
-            'small_cap_score': round(row['small_cap_score'], 2),
-            'market_cap': row['总市值'],
-            'change_percent': row['涨跌幅'],
-            'volume_amount': row['成交额']
+            'code': str(index.codes[pos]),
+            'name': str(index.names[pos]),
+            'industry': index.industry_at(pos),
+            'small_cap_score': round(float(score[i]), 2),
+            'market_cap': float(market_cap[i]),
+            'change_percent': float(change[i]),
+            'volume_amount': float(amount[i])
         })
-    
+
     return top_small_cap_stocks
 
-def identify_undervalued_stocks():
+def _identify_undervalued_stocks(bundle, params: dict):
     """
     识别低估股票。
     基于PE、PB等估值指标进行综合分析。
-    
+
+    Args:
+        bundle (DataBundle): 代码索引和对齐后的数据集。
+        params (dict): 规范化后的策略参数，见STRATEGY_PARAMS['undervalued']。
+
     Returns:
         list: 包含低估股票信息的列表。
     """
-    # 1. 从数据库获取所有股票
-    all_stocks = Stock.query.all()
-    if not all_stocks:
+    # 1. 使用代码索引中的全部股票
+    index = bundle.index
+    if len(index) == 0:
         return []
+    mask = np.ones(len(index), dtype=bool)
 
-    stock_codes = [s.code for s in all_stocks]
-
-    # 2. 获取这些股票的估值数据 (PE, PB)
-    try:
-        # ak.stock_a_pe_pb_em() 提供了A股的市盈率和市净率
-        valuation_df = ak.stock_a_pe_pb_em()
-        valuation_df = valuation_df[valuation_df['股票代码'].isin(stock_codes)]
-
-        if valuation_df.empty:
-            print("Warning: No valuation data found. Using dummy data.")
-            valuation_df = pd.DataFrame({
-                '股票代码': stock_codes,
-                '市盈率': [20.0] * len(stock_codes),
-                '市净率': [2.0] * len(stock_codes),
-            })
-
-    except Exception as e:
-        print(f"Error fetching valuation data: {e}. Using dummy data.")
-        valuation_df = pd.DataFrame({
-            '股票代码': stock_codes,
-            '市盈率': [20.0] * len(stock_codes),
-            '市净率': [2.0] * len(stock_codes),
-        })
-
-    # 3. 合并数据库中的股票名称、行业和估值数据
-    merged_df = pd.merge(
-        pd.DataFrame([{'code': s.code, 'name': s.name, 'industry': s.industry} for s in all_stocks]),
-        valuation_df,
-        left_on='code',
-        right_on='股票代码',
-        how='left'
-    )
-    # 填充缺失的估值数据
-    merged_df['市盈率'] = merged_df['市盈率'].fillna(9999) # 缺失值设为高估值
-    merged_df['市净率'] = merged_df['市净率'].fillna(9999) # 缺失值设为高估值
-
-    if merged_df.empty:
+    # 2. 读取已对齐的估值数据 (PE, PB)，缺失值设为高估值
+    valuation = _valuation_columns(bundle, mask, "undervalued analysis")
+    if valuation is None:
         return []
 
-    # 过滤掉非正估值 (PE/PB < 0)
-    merged_df = merged_df[(merged_df['市盈率'] > 0) & (merged_df['市净率'] > 0)]
-    if merged_df.empty:
+    # 3. 过滤掉非正估值 (PE/PB < 0) 并评分
+    # 默认评分权重：PE(50%) + PB(50%)，PE和PB越低越好
+    score, valid = _undervalued_score(valuation, params)
+    if not valid.any():
         return []
+    positions = np.flatnonzero(valid)
+    score = score[valid]
+    pe, pb = valuation['市盈率'][valid], valuation['市净率'][valid]
 
-    # 4. 应用评分逻辑
-    # 评分权重：PE(50%) + PB(50%)
-    # PE和PB越低越好，所以归一化时取倒数或用 (max - val) / (max - min)
-
-    # 归一化处理
-    # PE归一化 (PE越低得分越高)
-    min_pe = merged_df['市盈率'].min()
-    max_pe = merged_df['市盈率'].max()
-    if max_pe - min_pe > 1e-9:
-        merged_df['PE_norm'] = (max_pe - merged_df['市盈率']) / (max_pe - min_pe)
-    else:
-        merged_df['PE_norm'] = 0.5
-
-    # PB归一化 (PB越低得分越高)
-    min_pb = merged_df['市净率'].min()
-    max_pb = merged_df['市净率'].max()
-    if max_pb - min_pb > 1e-9:
-        merged_df['PB_norm'] = (max_pb - merged_df['市净率']) / (max_pb - min_pb)
-    else:
-        merged_df['PB_norm'] = 0.5
-
-    # 计算综合评分
-    merged_df['undervalued_score'] = (
-        merged_df['PE_norm'] * 0.5 +
-        merged_df['PB_norm'] * 0.5
-    )
-
-    # 5. 排序并返回前N名
-    merged_df = merged_df.sort_values(by='undervalued_score', ascending=False)
-    
+    # 4. 排序并返回前N名
     top_undervalued_stocks = []
-    for _, row in merged_df.head(10).iterrows(): # 返回前10名作为示例
+    for i in _top(score, params['top_n']):
+        pos = positions[i]
         top_undervalued_stocks.append({
-            'code': row['code'],
-            'name': row['name'],
-            'industry': row['industry'],
-            'undervalued_score': round(row['undervalued_score'], 2),
-            'pe': row['市盈率'],
-            'pb': row['市净率']
+            'code': str(index.codes[pos]),
+            'name': str(index.names[pos]),
+            'industry': index.industry_at(pos),
+            'undervalued_score': round(float(score[i]), 2),
+            'pe': float(pe[i]),
+            'pb': float(pb[i])
         })
-    
+
     return top_undervalued_stocks
 
-def get_comprehensive_score():
+def _get_comprehensive_score(bundle, params: dict):
     """
     计算所有股票的综合评分。
-    基于技术面(30%) + 基本面(40%) + 估值面(30%)进行综合评分。
-    
+    默认基于技术面(30%) + 基本面(40%) + 估值面(30%)进行综合评分。
+
+    Args:
+        bundle (DataBundle): 代码索引和对齐后的数据集。
+        params (dict): 规范化后的策略参数，见STRATEGY_PARAMS['comprehensive']。
+
     Returns:
         list: 包含所有股票及其综合评分的列表。
     """
-    # 1. 从数据库获取所有股票
-    all_stocks = Stock.query.all()
-    if not all_stocks:
+    # 1. 使用代码索引中的全部股票
+    index = bundle.index
+    if len(index) == 0:
         return []
+    mask = np.ones(len(index), dtype=bool)
 
-    stock_codes = [s.code for s in all_stocks]
+    # 2. 读取已对齐的实时市场数据 (市值, 涨跌幅) 和估值数据 (PE, PB)
+    spot = _spot_columns(bundle, mask, "comprehensive score")
+    valuation = _valuation_columns(bundle, mask, "comprehensive score")
+    if spot is None or valuation is None:
+        return []
+    market_cap, change = spot['总市值'], spot['涨跌幅']
+    pe, pb = valuation['市盈率'], valuation['市净率']
 
-    # 2. 获取实时市场数据 (市值, 涨跌幅)
-    try:
-        realtime_data_df = ak.stock_zh_a_spot_em()
-        realtime_data_df = realtime_data_df[realtime_data_df['代码'].isin(stock_codes)]
-    except Exception as e:
-        print(f"Error fetching real-time data for comprehensive score: {e}. Using dummy data.")
-        realtime_data_df = pd.DataFrame({
-            '代码': stock_codes,
-            '涨跌幅': [0.0] * len(stock_codes),
-            '总市值': [1000000000.0] * len(stock_codes),
-        })
+    # 3. 应用评分逻辑
+    # 技术面(30%) + 基本面(40%) + 估值面(30%)
+    score, _ = _comprehensive_score({**spot, **valuation}, params)
 
-    # 3. 获取估值数据 (PE, PB)
-    try:
-        valuation_df = ak.stock_a_pe_pb_em()
-        valuation_df = valuation_df[valuation_df['股票代码'].isin(stock_codes)]
-    except Exception as e:
-        print(f"Error fetching valuation data for comprehensive score: {e}. Using dummy data.")
-        valuation_df = pd.DataFrame({
-            '股票代码': stock_codes,
-            '市盈率': [20.0] * len(stock_codes),
-            '市净率': [2.0] * len(stock_codes),
+    # 4. 排序并返回
+    scored_stocks = []
+    for pos in _top(score, params['top_n']):
+        scored_stocks.append({
+            'code': str(index.codes[pos]),
+            'name': str(index.names[pos]),
+            'industry': index.industry_at(pos),
+            'comprehensive_score': round(float(score[pos]), 2),
+            'market_cap': float(market_cap[pos]),
+            'change_percent': float(change[pos]),
+            'pe': float(pe[pos]),
+            'pb': float(pb[pos])
         })
 
-    # 4. 合并所有数据
-    merged_df = pd.merge(
-        pd.DataFrame([{'code': s.code, 'name': s.name, 'industry': s.industry} for s in all_stocks]),
-        realtime_data_df,
-        left_on='code',
-        right_on='代码',
-        how='left'
-    )
-    merged_df = pd.merge(
-        merged_df,
-        valuation_df,
-        left_on='code',
-        right_on='股票代码',
-        how='left'
-    )
+    return scored_stocks
 
-    # 填充缺失数据
-    merged_df['总市值'] = merged_df['总市值'].fillna(0)
-    merged_df['涨跌幅'] = merged_df['涨跌幅'].fillna(0)
-    merged_df['市盈率'] = merged_df['市盈率'].fillna(9999)
-    merged_df['市净率'] = merged_df['市净率'].fillna(9999)
 
-    if merged_df.empty:
-        return []
+# --- 对外接口（带缓存） ---
 
-    # 5. 应用评分逻辑
-    # 技术面(30%) + 基本面(40%) + 估值面(30%)
+def identify_sector_leaders(industry_name: str, params: tuple = None):
+    """识别指定行业内的龙头股票，行业成分股行情未变化时直接返回缓存结果。params为normalize_params的结果。"""
+    params = params or normalize_params('sector_leaders')
+    bundle = fetch_bundle(STRATEGY_DATASETS['sector_leaders'])
+    key = (industry_name, params)
+    leaders = _leader_cache.get(key) if not bundle.errors else None
+    if leaders is None:
+        leaders = _identify_sector_leaders(bundle, industry_name, dict(params))
+        _leader_cache[key] = leaders
+    return leaders
 
-    # 归一化处理
-    # 技术面 (涨跌幅，越高越好)
-    min_change = merged_df['涨跌幅'].min()
-    max_change = merged_df['涨跌幅'].max()
-    if max_change - min_change > 1e-9:
-        merged_df['tech_norm'] = (merged_df['涨跌幅'] - min_change) / (max_change - min_change)
-    else:
-        merged_df['tech_norm'] = 0.5
-
-    # 基本面 (总市值，越高越好)
-    min_market_cap = merged_df['总市值'].min()
-    max_market_cap = merged_df['总市值'].max()
-    if max_market_cap - min_market_cap > 1e-9:
-        merged_df['fund_norm'] = (merged_df['总市值'] - min_market_cap) / (max_market_cap - min_market_cap)
-    else:
-        merged_df['fund_norm'] = 0.5
-
-    # 估值面 (PE, PB，越低越好)
-    # 过滤掉非正估值
-    valid_valuation_df = merged_df[(merged_df['市盈率'] > 0) & (merged_df['市净率'] > 0)]
-    
-    if not valid_valuation_df.empty:
-        min_pe = valid_valuation_df['市盈率'].min()
-        max_pe = valid_valuation_df['市盈率'].max()
-        if max_pe - min_pe > 1e-9:
-            merged_df['PE_norm'] = (max_pe - merged_df['市盈率']) / (max_pe - min_pe)
-        else:
-            merged_df['PE_norm'] = 0.5
-
-        min_pb = valid_valuation_df['市净率'].min()
-        max_pb = valid_valuation_df['市净率'].max()
-        if max_pb - min_pb > 1e-9:
-            merged_df['PB_norm'] = (max_pb - merged_df['市净率']) / (max_pb - min_pb)
-        else:
-            merged_df['PB_norm'] = 0.5
-
-        # 估值综合分
-        merged_df['val_norm'] = (merged_df['PE_norm'] + merged_df['PB_norm']) / 2
-    else:
-        merged_df['val_norm'] = 0.5 # 如果没有有效估值数据，给个中等分
-
-    # 计算综合评分
-    merged_df['comprehensive_score'] = (
-        merged_df['tech_norm'] * 0.3 +
-        merged_df['fund_norm'] * 0.4 +
-        merged_df['val_norm'] * 0.3
+def analyze_institutional_holdings(params: tuple = None):
+    """分析并识别机构重仓股，行情未变化时直接返回缓存结果。"""
+    return _cached_ranking(
+        'institutional', params or normalize_params('institutional'), _analyze_institutional_holdings
     )
 
-    # 6. 排序并返回
-    merged_df = merged_df.sort_values(by='comprehensive_score', ascending=False)
-    
-    scored_stocks = []
-    for _, row in merged_df.head(20).iterrows(): # 返回前20名作为示例
-        scored_stocks.append({
-            'code': row['code'],
-            'name': row['name'],
-            'industry': row['industry'],
-            'comprehensive_score': round(row['comprehensive_score'], 2),
-            'market_cap': row['总市值'],
-            'change_percent': row['涨跌幅'],
-            'pe': row['市盈率'],
-            'pb': row['市净率']
-        })
-    
-    return scored_stocks
+def identify_small_cap_leaders(params: tuple = None):
+    """识别中小票龙头股，行情未变化时直接返回缓存结果。"""
+    return _cached_ranking('small_cap', params or normalize_params('small_cap'), _identify_small_cap_leaders)
+
+def identify_undervalued_stocks(params: tuple = None):
+    """识别低估股票，估值数据未变化时直接返回缓存结果。"""
+    return _cached_ranking('undervalued', params or normalize_params('undervalued'), _identify_undervalued_stocks)
+
+def get_comprehensive_score(params: tuple = None):
+    """计算所有股票的综合评分，行情和估值数据均未变化时直接返回缓存结果。"""
+    return _cached_ranking('comprehensive', params or normalize_params('comprehensive'), _get_comprehensive_score)
@@ -0,0 +1,226 @@
+# guzi_backend/services/backtest_service.py
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from .analysis_service import STRATEGY_FACTORS, normalize_params
+from .bar_store import load_bar_store
+
+TRADING_DAYS_PER_YEAR = 252
+DEFAULT_REBALANCE_DAYS = 20
+# 单边交易成本（基点），包含佣金、印花税和冲击成本的粗略估计
+DEFAULT_COST_BPS = 15.0
+
+# 评分函数使用的列 -> 日线矩阵字段及缺失值填充（与实时排名一致：行情缺失填0，估值缺失视为高估值）
+FACTOR_FIELDS = {
+    '总市值': ('market_cap', 0.0),
+    '涨跌幅': ('change', 0.0),
+    '成交额': ('amount', 0.0),
+    '市盈率': ('pe', 9999.0),
+    '市净率': ('pb', 9999.0),
+}
+
+# 日线矩阵数据的已知局限，随每个回测结果返回
+BACKTEST_LIMITATIONS = (
+    'Industry membership is taken from the stock list at sync time, not as of each trading day.',
+    'Stocks delisted before the stock list started tracking them are missing from the universe.',
+)
+
+
+def _factor_inputs(store, rows: np.ndarray):
+    """读取调仓日的因子列（调仓日×股票），以及当日有收盘价的股票掩码。"""
+    listed = ~np.isnan(store.field('close')[rows])
+    columns = {}
+    for column, (field, fill) in FACTOR_FIELDS.items():
+        values = store.field(field)[rows]
+        columns[column] = np.where(np.isnan(values), fill, values)
+    return columns, listed
+
+
+def _select_top(score: np.ndarray, eligible: np.ndarray, n: int) -> np.ndarray:
+    """每行选出得分最高的n只可入选股票，返回布尔矩阵。"""
+    if n >= score.shape[1]:
+        return eligible.copy()
+    keys = np.where(eligible, -score, np.inf)
+    top = np.argpartition(keys, n - 1, axis=1)[:, :n]
+    selected = np.zeros(score.shape, dtype=bool)
+    np.put_along_axis(selected, top, True, axis=1)
+    return selected & eligible
+
+
+def rebalance_weights(store, strategy: str, params: dict, rows: np.ndarray) -> np.ndarray:
+    """
+    计算每个调仓日的目标持仓权重（调仓日×股票），所有调仓日一次性以二维数组运算评分。
+    行业龙头策略在每个行业内各选top_n只；持仓等权。
+    """
+    columns, listed = _factor_inputs(store, rows)
+    factor = STRATEGY_FACTORS[strategy]
+    if strategy == 'sector_leaders':
+        selected = np.zeros(listed.shape, dtype=bool)
+        for industry in np.unique(store.industries):
+            if not industry:
+                continue
+            members = store.industries == industry
+            score, eligible = factor({k: v[:, members] for k, v in columns.items()}, params, listed[:, members])
+            selected[:, members] = _select_top(score, eligible, params['top_n'])
+    else:
+        score, eligible = factor(columns, params, listed)
+        selected = _select_top(score, eligible, params['top_n'])
+
+    counts = selected.sum(axis=1, keepdims=True)
+    return np.divide(selected, counts, out=np.zeros(selected.shape), where=counts > 0)
+
+
+def _forward_fill(values: np.ndarray) -> np.ndarray:
+    """沿时间轴（第0轴）用最近的有效值填充NaN（停牌期间价格不变）。"""
+    valid = ~np.isnan(values)
+    last = np.maximum.accumulate(np.where(valid, np.arange(len(values))[:, None], 0), axis=0)
+    return values[last, np.arange(values.shape[1])]
+
+
+def _simulate(close: np.ndarray, weights: np.ndarray, rebalance_at: np.ndarray, cost_rate: float):
+    """
+    模拟调仓日收盘按目标权重建仓、持有至下一调仓日的组合净值。
+
+    只读取持仓股票的价格列；停牌期间价格沿用停牌前收盘价，退市股票按最后价格持有至下次调仓。
+
+    Args:
+        close (np.ndarray): 回测区间的收盘价矩阵（交易日×股票）。
+        weights (np.ndarray): 各调仓日的目标权重（调仓日×股票）。
+        rebalance_at (np.ndarray): 调仓日在close中的行号（升序，第一个为0）。
+        cost_rate (float): 单边交易成本比例。
+
+    Returns:
+        tuple: (每日净值, 每次调仓的换手率)。
+    """
+    equity = np.ones(len(close))
+    turnover = np.zeros(len(rebalance_at))
+    drifted = np.zeros(close.shape[1])
+    value = 1.0
+    bounds = list(rebalance_at[1:]) + [len(close) - 1]
+    for k, (begin, end) in enumerate(zip(rebalance_at, bounds)):
+        target = weights[k]
+        turnover[k] = np.abs(target - drifted).sum()
+        value *= 1 - turnover[k] * cost_rate
+        equity[begin] = value
+
+        held = np.flatnonzero(target)
+        if len(held) == 0 or end == begin:
+            drifted = target
+            equity[begin + 1:end + 1] = value
+            continue
+        prices = _forward_fill(close[begin:end + 1, held])
+        growth = prices[1:] / prices[0]
+        path = growth @ target[held]
+        equity[begin + 1:end + 1] = value * path
+        value *= path[-1]
+        drifted = np.zeros(close.shape[1])
+        drifted[held] = target[held] * growth[-1] / path[-1] if path[-1] > 0 else 0.0
+    return equity, turnover
+
+
+def _statistics(equity: np.ndarray) -> dict:
+    """根据每日净值计算收益、波动、夏普比率（无风险利率按0计）和最大回撤。"""
+    daily = equity[1:] / equity[:-1] - 1 if len(equity) > 1 else np.zeros(1)
+    years = max(len(daily), 1) / TRADING_DAYS_PER_YEAR
+    volatility = float(daily.std() * np.sqrt(TRADING_DAYS_PER_YEAR))
+    return {
+        'total_return': round(float(equity[-1] - 1), 6),
+        'annual_return': round(float(equity[-1] ** (1 / years) - 1), 6),
+        'annual_volatility': round(volatility, 6),
+        'sharpe': round(float(daily.mean() * TRADING_DAYS_PER_YEAR / volatility), 4) if volatility > 0 else None,
+        'max_drawdown': round(float((equity / np.maximum.accumulate(equity) - 1).min()), 6),
+    }
+
+
+def run_backtest(store, strategy: str, params: tuple = None, start: str = None, end: str = None,
+                 rebalance_days: int = DEFAULT_REBALANCE_DAYS, cost_bps: float = DEFAULT_COST_BPS) -> dict:
+    """
+    回测内置排名策略：每rebalance_days个交易日按策略评分选出top_n只股票等权持有，调仓按换手收取交易成本。
+    评分与实时排名使用同一套因子定义（analysis_service.STRATEGY_FACTORS），所有调仓日的评分一次性按二维数组计算。
+
+    股票池包括同步时股票表中已退市的股票（只在有收盘价的日期可入选），但行业使用同步时的归属，
+    且股票表开始记录之前退市的股票缺失，按行业选股的策略仍有前视和幸存者偏差，见BACKTEST_LIMITATIONS。
+
+    Args:
+        store (BarStore): 日线矩阵存储。
+        strategy (str): 策略名，见STRATEGY_PARAMS。
+        params (tuple): normalize_params的结果，默认为策略默认参数。
+        start (str): 回测开始日期（YYYY-MM-DD），默认为存储的第一天。
+        end (str): 回测结束日期，默认为存储的最后一天。
+        rebalance_days (int): 调仓间隔（交易日）。
+        cost_bps (float): 单边交易成本（基点）。
+
+    Returns:
+        dict: 参数、区间、统计指标、平均换手率、同期全市场等权组合的统计指标（作为基准），以及数据局限说明。
+    """
+    params = params or normalize_params(strategy)
+    rows = store.date_rows(start, end)
+    if len(rows) < 2:
+        raise ValueError("Backtest range must contain at least two trading days.")
+    if rebalance_days < 1:
+        raise ValueError("rebalance_days must be positive.")
+
+    rebalance_at = np.arange(0, len(rows) - 1, rebalance_days)
+    weights = rebalance_weights(store, strategy, dict(params), rows[rebalance_at])
+    close = store.field('close')[rows[0]:rows[-1] + 1]
+    equity, turnover = _simulate(close, weights, rebalance_at, cost_bps / 10000)
+
+    # 基准：每日持有全部有收盘价的股票，等权
+    with np.errstate(invalid='ignore', divide='ignore'):
+        market = np.nanmean(close[1:] / close[:-1] - 1, axis=1)
+    benchmark = np.concatenate([[1.0], np.cumprod(1 + np.nan_to_num(market))])
+
+    return {
+        'strategy': strategy,
+        'params': dict(params),
+        'start': str(store.dates[rows[0]]),
+        'end': str(store.dates[rows[-1]]),
+        'trading_days': len(rows),
+        'rebalances': len(rebalance_at),
+        'average_turnover': round(float(turnover[1:].mean()), 6) if len(turnover) > 1 else 0.0,
+        'stats': _statistics(equity),
+        'benchmark': _statistics(benchmark),
+        'limitations': list(BACKTEST_LIMITATIONS),
+    }
+
+
+# --- 参数扫描（进程池） ---
+_worker_store = {}
+
+
+def _init_worker(directory: str, version: str):
+    """工作进程启动时挂载同一版本的日线矩阵（内存映射，不复制数据）。"""
+    _worker_store['store'] = load_bar_store(directory, version)
+
+
+def _run_in_worker(args):
+    strategy, params, options = args
+    return run_backtest(_worker_store['store'], strategy, params, **options)
+
+
+def run_parameter_sweep(directory: str, strategy: str, param_sets, workers: int = None, **options) -> list:
+    """
+    对多组参数并行回测同一策略，每组参数在进程池的一个工作进程中运行。
+
+    Args:
+        directory (str): 日线矩阵存储目录。
+        strategy (str): 策略名。
+        param_sets (list): 原始参数字典列表，按normalize_params校验。
+        workers (int): 进程数，默认为CPU核心数与参数组数中的较小值，为1时在当前进程中运行。
+        **options: 传给run_backtest的区间、调仓间隔和交易成本。
+
+    Returns:
+        list: 与param_sets顺序一致的回测结果。
+    """
+    store = load_bar_store(directory)
+    if store is None:
+        raise LookupError(f"No daily bar store found in {directory}. Run `flask sync-bars` first.")
+    jobs = [(strategy, normalize_params(strategy, raw), options) for raw in param_sets]
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        return [run_backtest(store, strategy, params, **options) for _, params, options in jobs]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(directory, store.version)) as pool:
+        return list(pool.map(_run_in_worker, jobs))
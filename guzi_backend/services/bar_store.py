@@ -0,0 +1,173 @@
+# guzi_backend/services/bar_store.py
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from flask import current_app
+
+from ..database import db, read_only
+from ..models import Stock
+from ..lazy import lazy_import
+from . import snapshot_store
+
+ak = lazy_import('akshare')
+pd = lazy_import('pandas')
+
+# 日线矩阵存储格式版本，数组布局变化时递增
+BAR_STORE_FORMAT_VERSION = 1
+
+# 存储的日线字段：字段名 -> (上游接口, 上游列名)
+# daily: 后复权日线行情（收盘价用于计算收益）；value: 每日估值与市值
+BAR_FIELDS = {
+    'close': ('daily', '收盘'),
+    'change': ('daily', '涨跌幅'),
+    'amount': ('daily', '成交额'),
+    'market_cap': ('value', '总市值'),
+    'pe': ('value', 'PE(TTM)'),
+    'pb': ('value', '市净率'),
+}
+
+# 同时请求上游历史数据的线程数
+SYNC_WORKERS = 8
+
+
+class BarStore:
+    """
+    按 (交易日, 股票) 存储的日线矩阵，缺失值（未上市、停牌）为NaN。
+
+    矩阵以只读内存映射方式打开，回测的多个工作进程挂载同一版本时共享页缓存。
+    股票顺序与同步时数据库中的股票列表一致（包括已退市的股票，退市后的日期为NaN）。
+    行业为同步时的行业归属，不是历史上每个交易日的归属；股票表开始记录之前就已退市的股票不在矩阵中。
+    """
+
+    def __init__(self, snapshot):
+        self.version = snapshot.version
+        self.meta = snapshot.meta
+        self.dates = snapshot['dates']
+        self.codes = snapshot['codes']
+        self.industries = snapshot['industries']
+        self.fields = {name: snapshot[name] for name in BAR_FIELDS if name in snapshot}
+
+    def __len__(self):
+        return len(self.dates)
+
+    def field(self, name: str) -> np.ndarray:
+        """返回 (交易日, 股票) 矩阵。"""
+        return self.fields[name]
+
+    def date_rows(self, start=None, end=None) -> np.ndarray:
+        """返回 [start, end] 范围内交易日的行号，日期可以是 'YYYY-MM-DD' 字符串。"""
+        first = 0 if start is None else int(np.searchsorted(self.dates, np.datetime64(start, 'D')))
+        last = len(self.dates) if end is None else int(np.searchsorted(self.dates, np.datetime64(end, 'D'), side='right'))
+        return np.arange(first, last)
+
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def load_bar_store(directory: str = None, version: str = None):
+    """
+    挂载日线矩阵存储，同一进程内按版本复用。
+
+    Args:
+        directory (str): 存储目录，默认使用配置中的BAR_STORE_DIR。
+        version (str): 指定版本，默认为最新版本。
+
+    Returns:
+        BarStore | None: 挂载的存储，尚未同步过时返回None。
+    """
+    directory = directory or current_app.config['BAR_STORE_DIR']
+    version = version or snapshot_store.current_version(directory)
+    if not version:
+        return None
+    with _loaded_lock:
+        store = _loaded.get((directory, version))
+        if store is None:
+            snapshot = snapshot_store.attach_snapshot(directory, version)
+            if snapshot is None or snapshot.meta.get('format') != BAR_STORE_FORMAT_VERSION:
+                return None
+            store = _loaded[(directory, version)] = BarStore(snapshot)
+    return store
+
+
+def _fetch_history(code: str, start_date: str, end_date: str) -> 'pd.DataFrame':
+    """获取单只股票的日线行情和估值历史，按日期合并，只保留BAR_FIELDS中的列。"""
+    frames = []
+    daily = ak.stock_zh_a_hist(symbol=code, period='daily', start_date=start_date, end_date=end_date, adjust='hfq')
+    if not daily.empty:
+        columns = {column: name for name, (source, column) in BAR_FIELDS.items() if source == 'daily'}
+        frames.append(daily.set_index(pd.to_datetime(daily['日期']))[list(columns)].rename(columns=columns))
+    value = ak.stock_value_em(symbol=code)
+    if not value.empty:
+        columns = {column: name for name, (source, column) in BAR_FIELDS.items() if source == 'value'}
+        value = value.set_index(pd.to_datetime(value['数据日期']))[list(columns)].rename(columns=columns)
+        frames.append(value.loc[pd.Timestamp(start_date):pd.Timestamp(end_date)])
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, axis=1).apply(pd.to_numeric, errors='coerce')
+
+
+def sync_bar_store(start_date: str, end_date: str = None, directory: str = None, workers: int = SYNC_WORKERS,
+                   progress=None) -> str:
+    """
+    从上游获取全市场日线历史，写入新的日线矩阵版本。
+    每只股票的获取失败只会使其对应列为空，不影响其他股票。
+
+    Args:
+        start_date (str): 开始日期（YYYY-MM-DD）。
+        end_date (str): 结束日期，默认为今天。
+        directory (str): 存储目录，默认使用配置中的BAR_STORE_DIR。
+        workers (int): 并发请求数。
+        progress (callable): 进度回调，以关键字参数报告已获取历史的股票数。
+
+    Returns:
+        str: 新发布的版本号。
+    """
+    directory = directory or current_app.config['BAR_STORE_DIR']
+    start = pd.Timestamp(start_date).strftime('%Y%m%d')
+    end = pd.Timestamp(end_date or pd.Timestamp.today()).strftime('%Y%m%d')
+    # 包括已退市（is_active为False）的股票，上游仍能返回它们退市前的历史，避免回测的幸存者偏差
+    with read_only():
+        rows = db.session.query(Stock.code, Stock.industry).order_by(Stock.code).all()
+    codes = [r.code for r in rows]
+
+    def fetch(code):
+        try:
+            return _fetch_history(code, start, end)
+        except Exception as e:
+            print(f"Error fetching daily history for {code}: {e}")
+            return pd.DataFrame()
+
+    histories = []
+    if progress:
+        progress(stocks_total=len(codes), stocks_fetched=0)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bar-sync') as pool:
+        for history in pool.map(fetch, codes):
+            histories.append(history)
+            if progress:
+                progress(stocks_fetched=len(histories))
+
+    # 所有股票出现过的交易日作为日期轴
+    dates = np.unique(np.concatenate(
+        [h.index.values.astype('datetime64[D]') for h in histories if not h.empty] or [np.array([], 'datetime64[D]')]
+    ))
+    arrays = {
+        'dates': dates,
+        'codes': np.asarray(codes, dtype=str),
+        'industries': np.asarray([r.industry or '' for r in rows], dtype=str),
+    }
+    for name in BAR_FIELDS:
+        arrays[name] = np.full((len(dates), len(codes)), np.nan)
+    for column, history in enumerate(histories):
+        if history.empty:
+            continue
+        target = np.searchsorted(dates, history.index.values.astype('datetime64[D]'))
+        for name in BAR_FIELDS:
+            if name in history.columns:
+                arrays[name][target, column] = history[name].to_numpy(dtype=float)
+
+    meta = {'format': BAR_STORE_FORMAT_VERSION, 'start_date': start, 'end_date': end}
+    version = snapshot_store.publish_snapshot(directory, arrays, meta, keep=2)
+    print(f"Published daily bar store {version}: {len(dates)} trading days x {len(codes)} stocks.")
+    return version
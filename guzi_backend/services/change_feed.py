@@ -0,0 +1,120 @@
+# guzi_backend/services/change_feed.py
+
+from collections import defaultdict
+import numpy as np
+from ..lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+
+class Delta:
+    """
+    一次刷新相对上一快照的变化集合。
+
+    Attributes:
+        table (str): 变化所属的数据表/数据集名称，例如 'stocks'、'spot'、'valuation'。
+        added (list): 新增的股票代码。
+        removed (list): 移除的股票代码。
+        changed (list): 内容发生变化的股票代码。
+        reset (bool): 无法计算增量（例如首次加载）时为True，消费者应整体失效。
+    """
+
+    def __init__(self, table: str, added=(), removed=(), changed=(), reset: bool = False):
+        self.table = table
+        self.added = list(added)
+        self.removed = list(removed)
+        self.changed = list(changed)
+        self.reset = reset
+
+    @property
+    def symbols(self) -> set:
+        """所有受影响的股票代码。"""
+        return set(self.added) | set(self.removed) | set(self.changed)
+
+    def __bool__(self):
+        return self.reset or bool(self.added or self.removed or self.changed)
+
+    def __repr__(self):
+        if self.reset:
+            return f'<Delta {self.table} reset>'
+        return f'<Delta {self.table} +{len(self.added)} -{len(self.removed)} ~{len(self.changed)}>'
+
+
+def hash_rows(df: 'pd.DataFrame', columns) -> np.ndarray:
+    """按行计算指定列的64位哈希，用于判断行内容是否变化。"""
+    if df.empty:
+        return np.zeros(0, dtype=np.uint64)
+    return pd.util.hash_pandas_object(df[list(columns)], index=False).to_numpy()
+
+
+def diff_keyed(table: str, prev_keys, prev_hashes: np.ndarray, keys, hashes: np.ndarray) -> Delta:
+    """
+    比较两组（代码, 行哈希），计算新增、移除和变化的代码。
+
+    Args:
+        table (str): 数据表名称。
+        prev_keys: 上一快照的股票代码。
+        prev_hashes (np.ndarray): 上一快照的行哈希。
+        keys: 本次的股票代码。
+        hashes (np.ndarray): 本次的行哈希。
+    """
+    prev_index = pd.Index(prev_keys)
+    positions = prev_index.get_indexer(pd.Index(keys))
+    keys = np.asarray(keys)
+    matched = positions >= 0
+    changed = matched.copy()
+    changed[matched] = np.asarray(prev_hashes)[positions[matched]] != hashes[matched]
+    removed = pd.Index(keys).get_indexer(prev_index) < 0
+    return Delta(
+        table,
+        added=keys[~matched].tolist(),
+        removed=np.asarray(prev_keys)[removed].tolist(),
+        changed=keys[changed].tolist()
+    )
+
+
+def diff_aligned(table: str, old_index, old_frame, new_index, new_frame) -> Delta:
+    """
+    比较同一数据集前后两次按SymbolIndex对齐的结果（AlignedFrame）。
+    股票列表未变时逐列向量化比较（NaN视为相等）；股票列表变化或没有旧数据时返回reset。
+    """
+    if (old_frame is None or old_index is None or len(old_index) != len(new_index)
+            or not np.array_equal(old_index.codes, new_index.codes)):
+        return Delta(table, reset=True)
+
+    changed = np.asarray(old_frame.present) != np.asarray(new_frame.present)
+    for name, values in new_frame.columns.items():
+        old_values = old_frame.columns.get(name)
+        if old_values is None:
+            return Delta(table, reset=True)
+        same = (old_values == values) | (np.isnan(old_values) & np.isnan(values))
+        changed |= ~same
+    return Delta(table, changed=new_index.codes[changed].tolist())
+
+
+# --- 变化发布/订阅 ---
+_subscribers = defaultdict(list)
+_versions = defaultdict(int)
+
+
+def subscribe(table: str, callback):
+    """订阅指定数据表的变化，callback接收一个Delta。"""
+    _subscribers[table].append(callback)
+
+
+def publish(delta: Delta):
+    """向订阅者发布变化。空变化不会发布，也不会推进版本号。"""
+    if not delta:
+        return
+    _versions[delta.table] += 1
+    print(f"Change feed: {delta!r}")
+    for callback in _subscribers[delta.table]:
+        try:
+            callback(delta)
+        except Exception as e:
+            print(f"Change feed subscriber for {delta.table} failed: {e}")
+
+
+def version(*tables) -> tuple:
+    """返回指定数据表的变化版本号，可作为缓存键的一部分。"""
+    return tuple(_versions[table] for table in tables)
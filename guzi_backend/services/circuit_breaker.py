@@ -0,0 +1,121 @@
+# guzi_backend/services/circuit_breaker.py
+
+import random
+import threading
+import time
+
+# 未调用configure时使用的默认值，与config.Config一致
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_RETRY_SECONDS = 30
+DEFAULT_MAX_RETRY_SECONDS = 600
+
+
+class UpstreamUnavailable(RuntimeError):
+    """上游数据不可用，且没有可以回退的历史数据。retry_in为预计可以重试的秒数（未知时为None）。"""
+
+    def __init__(self, message: str, retry_in: float = None):
+        super().__init__(message)
+        self.retry_in = retry_in
+
+
+class CircuitOpenError(UpstreamUnavailable):
+    """熔断器打开期间不请求上游，直接失败。"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Upstream {name} is unavailable (circuit open, next retry in {retry_in:.0f}s).", retry_in)
+        self.name = name
+
+
+class CircuitBreaker:
+    """
+    单个上游数据集的熔断器。
+
+    - closed：正常请求上游，连续失败（异常或超时）达到failure_threshold次后打开；
+    - open：在退避时间内不请求上游，调用方立即使用最近一次成功获取的数据；
+    - half_open：退避时间到后只放行一个探测请求，成功则关闭，失败则以加倍的退避时间重新打开
+      （retry_seconds × 2^(n-1)，不超过max_retry_seconds，附加±10%抖动，避免多个进程同时探测）。
+
+    线程安全；每个进程各自维护状态。
+    """
+
+    def __init__(self, name: str, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 retry_seconds: float = DEFAULT_RETRY_SECONDS, max_retry_seconds: float = DEFAULT_MAX_RETRY_SECONDS):
+        self.name = name
+        self.configure(failure_threshold, retry_seconds, max_retry_seconds)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def configure(self, failure_threshold: int, retry_seconds: float, max_retry_seconds: float):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.retry_seconds = float(retry_seconds)
+        self.max_retry_seconds = max(float(max_retry_seconds), self.retry_seconds)
+
+    def reset(self):
+        """恢复为关闭状态并清空失败记录。"""
+        self.state = 'closed'
+        self.failures = 0
+        self.opened = 0 # 连续打开的次数，决定下一次的退避时间
+        self.retry_at = 0.0
+        self.last_error = None
+        self.last_failure_at = None
+        self.last_success_at = None
+
+    def allow(self) -> bool:
+        """
+        是否允许现在请求上游。打开状态下退避时间已到时转为半开，并只放行这一次调用作为探测；
+        探测迟迟没有结果（超过一个退避周期）时再放行下一次。
+        """
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            now = time.monotonic()
+            if now < self.retry_at:
+                return False
+            self.state = 'half_open'
+            self.retry_at = now + self._backoff()
+            return True
+
+    def check(self):
+        """不允许请求上游时抛出CircuitOpenError。"""
+        if not self.allow():
+            raise CircuitOpenError(self.name, max(0.0, self.retry_at - time.monotonic()))
+
+    def record_success(self):
+        with self._lock:
+            if self.state != 'closed':
+                print(f"Upstream {self.name} recovered. Circuit closed.")
+            self.state = 'closed'
+            self.failures = 0
+            self.opened = 0
+            self.last_success_at = time.time()
+
+    def record_failure(self, error: Exception):
+        with self._lock:
+            self.failures += 1
+            self.last_error = f"{type(error).__name__}: {error}"
+            self.last_failure_at = time.time()
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.opened += 1
+                backoff = self._backoff()
+                self.state = 'open'
+                self.retry_at = time.monotonic() + backoff
+                print(f"Upstream {self.name} failed {self.failures} times ({self.last_error}). "
+                      f"Circuit open for {backoff:.0f}s.")
+
+    def _backoff(self) -> float:
+        exponent = max(self.opened - 1, 0)
+        seconds = min(self.retry_seconds * 2 ** min(exponent, 30), self.max_retry_seconds)
+        return seconds * random.uniform(0.9, 1.1)
+
+    def status(self) -> dict:
+        """熔断器状态，用于状态接口。"""
+        with self._lock:
+            retry_in = max(0.0, self.retry_at - time.monotonic()) if self.state != 'closed' else None
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'retry_in_seconds': round(retry_in, 1) if retry_in is not None else None,
+                'last_error': self.last_error,
+                'last_failure_at': self.last_failure_at,
+                'last_success_at': self.last_success_at,
+            }
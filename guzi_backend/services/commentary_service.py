@@ -0,0 +1,257 @@
+# guzi_backend/services/commentary_service.py
+
+import asyncio
+import hashlib
+from datetime import date, datetime
+import numpy as np
+from flask import current_app
+from sqlalchemy import func
+
+from ..database import db, read_only
+from ..models import StockCommentary, UserWatchlist
+from .ai_manager import ai_manager
+from .analysis_service import STRATEGY_FACTORS, normalize_params
+from .data_service import fetch_bundle
+from .prompt_builder import PromptBuilder
+
+# 未配置时的默认值，与config.Config一致
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_PROMPT_TOKENS = 600
+
+# 提示词中列出的同行业龙头数量上限（超出预算时先被截断）
+PEER_LIMIT = 5
+
+# 提示词中的策略名称
+STRATEGY_LABELS = {
+    'sector_leaders': '行业龙头',
+    'institutional': '机构偏好',
+    'small_cap': '中小票龙头',
+    'undervalued': '低估',
+    'comprehensive': '综合评分',
+}
+
+INSTRUCTION = """你是A股研究助理。根据下列数据，用不超过150字的中文写一段客观的每日点评，
+涵盖当日走势、估值水平和该股在各策略排名中的位置。不要编造数据，不要给出买卖建议。
+表格以|分隔，金额单位为亿，-表示数据缺失（例如停牌）。"""
+
+
+def watchlisted_codes() -> list:
+    """所有用户自选股中出现过的股票代码（去重），LLM调用次数与股票数而不是用户数成正比。"""
+    with read_only():
+        rows = db.session.query(UserWatchlist.stock_code).distinct().order_by(UserWatchlist.stock_code).all()
+    return [row.stock_code for row in rows]
+
+
+def _ranks(score: np.ndarray, eligible: np.ndarray) -> tuple:
+    """可入选股票按得分降序的名次（从1开始，不可入选为0）及可入选股票数。"""
+    positions = np.flatnonzero(eligible)
+    ranks = np.zeros(len(score), dtype=int)
+    ranks[positions[np.argsort(-score[positions], kind='stable')]] = np.arange(1, len(positions) + 1)
+    return ranks, len(positions)
+
+
+def strategy_ranks(bundle) -> dict:
+    """
+    按默认参数计算全市场每只股票在各策略中的名次，整批点评只计算一次。
+    行业龙头在行业内排名，其余策略在全市场排名。
+
+    Returns:
+        dict: 策略名 -> (名次数组, 参与排名的股票数数组)，名次为0表示未入选（例如市值超过中小票阈值）。
+    """
+    index = bundle.index
+    spot, valuation = bundle['spot'], bundle['valuation']
+    listed = spot.present
+    columns = {name: spot.column(name, fill=0) for name in ('总市值', '涨跌幅', '成交额')}
+    columns.update({name: valuation.column(name, fill=9999) for name in ('市盈率', '市净率')})
+
+    result = {}
+    for strategy, factor in STRATEGY_FACTORS.items():
+        params = dict(normalize_params(strategy))
+        ranks, totals = np.zeros(len(index), dtype=int), np.zeros(len(index), dtype=int)
+        if strategy == 'sector_leaders':
+            for industry in np.unique(index.industries):
+                if not industry:
+                    continue
+                members = index.industries == industry
+                score, eligible = factor({k: v[members] for k, v in columns.items()}, params, listed[members])
+                ranks[members], totals[members] = _ranks(score, eligible)
+        else:
+            score, eligible = factor(columns, params, listed)
+            ranks, total = _ranks(score, eligible)
+            totals[:] = total
+        result[strategy] = (ranks, totals)
+    return result
+
+
+def _stock_row(bundle, pos: int) -> dict:
+    """对齐后的行情和估值中一只股票的字段，字段名与分析接口一致；缺失的字段不出现。"""
+    index = bundle.index
+    spot, valuation = bundle['spot'], bundle['valuation']
+    row = {'code': index.codes[pos], 'name': index.names[pos], 'industry': index.industry_at(pos) or '-'}
+    if spot.present[pos]:
+        for field, column in (('price', '最新价'), ('change_percent', '涨跌幅'),
+                              ('volume_amount', '成交额'), ('market_cap', '总市值')):
+            row[field] = float(spot.columns[column][pos])
+    if valuation.present[pos]:
+        row['pe'], row['pb'] = float(valuation.columns['市盈率'][pos]), float(valuation.columns['市净率'][pos])
+    return row
+
+
+def build_prompt(bundle, ranks: dict, pos: int, budget: int = DEFAULT_PROMPT_TOKENS):
+    """
+    由对齐后的行情、估值和策略名次生成单只股票的点评提示词。
+    说明和该股数据必须保留；超出预算时先截断同行业龙头表，再去掉策略排名表。
+
+    Returns:
+        Prompt: 提示词文本及估算的token数，见prompt_builder。
+    """
+    standings = [
+        {'strategy': STRATEGY_LABELS[strategy] + ('(行业内)' if strategy == 'sector_leaders' else ''),
+         'rank': f"{rank[pos]}/{total[pos]}"}
+        for strategy, (rank, total) in ranks.items() if rank[pos]
+    ]
+    leader_rank = ranks['sector_leaders'][0]
+    industry = bundle.index.industries[pos]
+    peers = np.flatnonzero((bundle.index.industries == industry) & (leader_rank > 0)) if industry else []
+    peers = sorted((p for p in peers if p != pos), key=lambda p: leader_rank[p])[:PEER_LIMIT]
+
+    builder = PromptBuilder(budget)
+    builder.text('instruction', INSTRUCTION, priority=100, required=True)
+    builder.table('stock', [_stock_row(bundle, pos)],
+                  ['code', 'name', 'industry', 'price', 'change_percent', 'volume_amount', 'market_cap', 'pe', 'pb'],
+                  title='股票', priority=90, required=True)
+    if standings:
+        builder.table('ranks', standings, ['strategy', 'rank'], title='策略排名', priority=20)
+    else:
+        builder.text('ranks', '策略排名：均未入选', priority=20)
+    builder.table('peers', [_stock_row(bundle, p) for p in peers],
+                  ['code', 'name', 'change_percent', 'market_cap', 'pe'], title='同行业龙头', priority=10)
+    return builder.build()
+
+
+def _prompt_hash(prompt: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\n{prompt}".encode('utf-8')).hexdigest()
+
+
+def _data_as_of(bundle):
+    times = [frame.as_of for frame in bundle.frames.values() if frame.as_of is not None]
+    return datetime.utcfromtimestamp(min(times)) if times else None
+
+
+async def _generate(adapter, prompt: str, max_attempts: int) -> str:
+    """生成一条点评，失败时按1、2、4…秒退避重试，空结果视为失败。"""
+    for attempt in range(1, max_attempts + 1):
+        try:
+            text = (await adapter.generate_text_async(prompt)).strip()
+            if text:
+                return text
+            raise ValueError("AI service returned an empty response")
+        except Exception:
+            if attempt == max_attempts:
+                raise
+            await asyncio.sleep(2 ** (attempt - 1))
+
+
+def generate_watchlist_commentary(batch_date: date = None, concurrency: int = None, service: str = 'gemini',
+                                  progress=None) -> dict:
+    """
+    为所有用户自选股（按股票去重）批量生成AI点评，适合每晚运行一次。
+
+    - 行情、估值和策略名次整批只获取、计算一次，再为每只股票生成提示词；
+    - 最多concurrency个请求同时进行，每条点评生成后立即提交，
+      中途失败或进程退出后重新运行同一批次只处理尚未完成的股票；
+    - 提示词按COMMENTARY_PROMPT_TOKENS预算构建（见build_prompt）；
+    - 提示词与上次完全相同（数据未变化，例如休市日）时不调用模型，只更新批次日期。
+
+    Args:
+        batch_date (date): 批次日期，默认为今天。
+        concurrency (int): 同时进行的模型请求数，默认读取配置COMMENTARY_CONCURRENCY。
+        service (str): AI服务名称，见ai_manager。
+        progress (callable): 进度回调，以关键字参数报告已处理的股票数。
+
+    Returns:
+        dict: 股票总数，已生成、未变化、本批次已完成（跳过）和失败的数量，失败的股票代码，以及发送的提示词估算token总数。
+        失败的股票保留上一批次的点评，接口通过stale标记（见StockCommentary.to_dict）。
+    """
+    batch_date = batch_date or date.today()
+    concurrency = concurrency or current_app.config.get('COMMENTARY_CONCURRENCY', DEFAULT_CONCURRENCY)
+    max_attempts = current_app.config.get('COMMENTARY_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    prompt_budget = current_app.config.get('COMMENTARY_PROMPT_TOKENS', DEFAULT_PROMPT_TOKENS)
+    adapter = ai_manager.get_adapter(service)
+    model = getattr(adapter, 'model_name', service)
+
+    codes = watchlisted_codes()
+    existing = {row.stock_code: row for row in StockCommentary.query.filter(StockCommentary.stock_code.in_(codes))}
+    counts = {'stocks': len(codes), 'generated': 0, 'unchanged': 0, 'skipped': 0, 'failed': 0, 'prompt_tokens': 0,
+              'failed_codes': []}
+
+    bundle = fetch_bundle(('spot', 'valuation'))
+    index = bundle.index
+    ranks = strategy_ranks(bundle)
+    data_as_of = _data_as_of(bundle)
+
+    pending = []
+    for code in codes:
+        previous = existing.get(code)
+        pos = index.positions.get(code)
+        if (previous is not None and previous.batch_date == batch_date) or pos is None:
+            counts['skipped'] += 1 # 本批次已完成，或已退市不在代码索引中
+            continue
+        prompt = build_prompt(bundle, ranks, pos, prompt_budget)
+        prompt_hash = _prompt_hash(prompt.text, model)
+        if previous is not None and previous.prompt_hash == prompt_hash:
+            previous.batch_date = batch_date
+            counts['unchanged'] += 1
+            continue
+        counts['prompt_tokens'] += prompt.estimated_tokens
+        pending.append((code, prompt.text, prompt_hash))
+    db.session.commit()
+
+    def report():
+        if progress:
+            finished = counts['generated'] + counts['unchanged'] + counts['skipped'] + counts['failed']
+            progress(stocks_total=len(codes), stocks_done=finished, failed=counts['failed'])
+    report()
+
+    async def run_all():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(code, prompt, prompt_hash):
+            async with semaphore:
+                try:
+                    return code, prompt_hash, await _generate(adapter, prompt, max_attempts), None
+                except Exception as e:
+                    return code, prompt_hash, None, e
+
+        for finished in asyncio.as_completed([run(*item) for item in pending]):
+            code, prompt_hash, summary, error = await finished
+            if error is not None:
+                print(f"Failed to generate commentary for {code}: {error}")
+                counts['failed'] += 1
+                counts['failed_codes'].append(code)
+            else:
+                db.session.merge(StockCommentary(
+                    stock_code=code, summary=summary, model=model, prompt_hash=prompt_hash,
+                    batch_date=batch_date, data_as_of=data_as_of, generated_at=datetime.utcnow()
+                ))
+                db.session.commit()
+                counts['generated'] += 1
+            report()
+
+    if pending:
+        asyncio.run(run_all())
+    print(f"Watchlist commentary for {batch_date}: {counts}")
+    return counts
+
+
+def get_commentary(code: str):
+    """读取股票的最新点评，没有时返回None。"""
+    with read_only():
+        return db.session.get(StockCommentary, code)
+
+
+def latest_batch_date():
+    """已处理过的最近一个批次日期，没有点评时返回None。早于该日期的点评是在最近批次中生成失败留下的旧点评。"""
+    with read_only():
+        return db.session.query(func.max(StockCommentary.batch_date)).scalar()
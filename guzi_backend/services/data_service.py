@@ -1,94 +1,87 @@
 # guzi_backend/services/data_service.py
 
-import akshare as ak
-import pandas as pd
-import redis
-import json
+import numpy as np
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FetchTimeoutError
+from flask import current_app
 
-from ..database import db
+from ..cache import cache
+from ..database import db, read_only
+from ..lazy import lazy_import
 from ..models import Stock
+from .symbol_index import SymbolIndex, AlignedFrame, DataBundle
+from .circuit_breaker import CircuitBreaker
+from . import snapshot_store
+from . import change_feed
+
+# akshare和pandas导入耗时数秒，只在首次获取或处理上游数据时导入
+ak = lazy_import('akshare')
+pd = lazy_import('pandas')
 
 # --- 缓存配置 ---
 CACHE_EXPIRATION_SECONDS = 3600  # 缓存1小时
+SPOT_CACHE_EXPIRATION_SECONDS = 60  # 实时行情缓存1分钟
 
-# --- Redis 客户端 ---
-redis_client = None
-try:
-    # 尝试初始化Redis客户端
-    redis_client = redis.StrictRedis(host='localhost', port=6379, db=0, decode_responses=True)
-    redis_client.ping() # 检查连接是否成功
-    print("Successfully connected to Redis.")
-except redis.exceptions.ConnectionError as e:
-    print(f"Could not connect to Redis: {e}. Falling back to local in-memory cache.")
-    redis_client = None
-
-# --- 本地内存缓存 ---
-local_cache = {}
-
-def _get_from_cache(key: str):
-    if redis_client:
-        cached_data = redis_client.get(key)
-        if cached_data:
-            print(f"Cache hit for {key} in Redis.")
-            return json.loads(cached_data)
-    else:
-        if key in local_cache:
-            cached_item = local_cache[key]
-            if time.time() - cached_item['timestamp'] < CACHE_EXPIRATION_SECONDS:
-                print(f"Cache hit for {key} in local memory.")
-                return cached_item['data']
-    return None
-
-def _set_to_cache(key: str, data):
-    if redis_client:
-        try:
-            redis_client.setex(key, CACHE_EXPIRATION_SECONDS, json.dumps(data))
-            print(f"Cached {key} in Redis.")
-        except redis.exceptions.ConnectionError as e:
-            print(f"Redis connection error, could not cache {key}: {e}")
-    else:
-        local_cache[key] = {
-            'data': data,
-            'timestamp': time.time()
-        }
-        print(f"Cached {key} in local memory.")
+# 股票表中参与变化检测的列
+STOCK_ROW_COLUMNS = ['name', 'industry']
 
-def get_all_stocks():
+def get_all_stocks(use_snapshot: bool = True):
     """
     获取所有A股的股票列表。
     优先从缓存获取，如果缓存中没有，则通过akshare获取并存入缓存。
-    
+    缓存未命中但已加载磁盘快照时（如冷启动后）直接返回快照中的股票列表，并在后台刷新。
+
+    Args:
+        use_snapshot (bool): 是否允许使用磁盘快照作为回退，刷新任务本身传入False。
+
     Returns:
         pd.DataFrame: 包含股票代码和名称的DataFrame。
     """
     cache_key = "all_stocks_a_shares"
-    cached_data = _get_from_cache(cache_key)
+    cached_data = cache.get(cache_key, CACHE_EXPIRATION_SECONDS)
     if cached_data:
         return pd.DataFrame(cached_data)
 
+    snapshot_df = _stock_list_from_snapshot() if use_snapshot else None
+    if snapshot_df is not None:
+        _refresh_snapshot_in_background()
+        print("Serving stock list from on-disk snapshot while refresh runs.")
+        return snapshot_df
+
     print("Cache miss. Fetching from AkShare.")
     try:
         stocks_df = ak.stock_info_a_code_name()
-        _set_to_cache(cache_key, stocks_df.to_dict(orient='records'))
+        cache.set(cache_key, stocks_df.to_dict(orient='records'), CACHE_EXPIRATION_SECONDS)
         return stocks_df
     except Exception as e:
         print(f"Error fetching stock list from AkShare: {e}")
-        return pd.DataFrame()
+        return snapshot_df if snapshot_df is not None else pd.DataFrame()
 
-def fetch_stock_industry_map():
+def fetch_stock_industry_map(use_snapshot: bool = True, progress=None):
     """
     获取股票代码到行业名称的映射。
     优先从缓存获取，如果缓存中没有，则通过akshare获取并存入缓存。
-    
+    缓存未命中但已加载磁盘快照时直接返回快照中的映射并在后台刷新，避免数百次上游调用阻塞请求。
+
+    Args:
+        use_snapshot (bool): 是否允许使用磁盘快照作为回退，刷新任务本身传入False。
+        progress (callable): 进度回调，以关键字参数报告已爬取的行业数，例如后台任务的JobProgress。
+
     Returns:
         dict: 股票代码到行业名称的映射字典。
     """
     cache_key = "stock_industry_map"
-    cached_data = _get_from_cache(cache_key)
+    cached_data = cache.get(cache_key, CACHE_EXPIRATION_SECONDS)
     if cached_data:
         return cached_data
 
+    snapshot_map = _industry_map_from_snapshot() if use_snapshot else None
+    if snapshot_map is not None:
+        _refresh_snapshot_in_background()
+        print("Serving industry map from on-disk snapshot while refresh runs.")
+        return snapshot_map
+
     print("Cache miss. Fetching industry data from AkShare.")
     stock_industry_map = {}
     try:
@@ -96,10 +89,13 @@ def fetch_stock_industry_map():
         industry_names_df = ak.stock_board_industry_name_em()
         if industry_names_df.empty:
             print("Failed to fetch industry names.")
-            return {}
+            return snapshot_map or {}
 
         # 2. 遍历每个行业，获取其成分股
-        for index, row in industry_names_df.iterrows():
+        total = len(industry_names_df)
+        if progress:
+            progress(industries_total=total, industries_crawled=0)
+        for position, (index, row) in enumerate(industry_names_df.iterrows(), 1):
             industry_name = row['板块名称']
             try:
                 # 获取行业成分股，可能需要一些时间
@@ -110,42 +106,732 @@ def fetch_stock_industry_map():
                         stock_industry_map[stock_code] = industry_name
             except Exception as e:
                 print(f"Error fetching constituents for {industry_name}: {e}")
-                continue
-        
-        _set_to_cache(cache_key, stock_industry_map)
+            finally:
+                if progress:
+                    progress(industries_crawled=position, stocks_mapped=len(stock_industry_map))
+
+        cache.set(cache_key, stock_industry_map, CACHE_EXPIRATION_SECONDS)
         return stock_industry_map
 
     except Exception as e:
         print(f"Error fetching industry data from AkShare: {e}")
-        return {}
+        return snapshot_map or {}
 
 
-def update_stock_list_in_db():
+def update_stock_list_in_db(progress=None):
     """
-    从数据源获取最新股票列表和行业信息，并更新到数据库中。
+    从数据源获取最新股票列表和行业信息，与数据库中的现有数据逐行比较哈希，
+    只写入新增和变化的行，并把上游不再返回的股票标记为不活跃。
+    计算出的变化会发布到变化订阅（代码索引、龙头缓存、评分缓存等）。
+
+    Args:
+        progress (callable): 进度回调，以关键字参数报告当前阶段、已爬取的行业数和已同步的行数。
+
+    Returns:
+        dict: 比较的行数及新增、变化、标记为不活跃的行数；获取股票列表失败时为None。
     """
+    def report(**fields):
+        if progress:
+            progress(**fields)
+
     print("Fetching latest stock list to update database...")
-    stocks_df = get_all_stocks()
-    stock_industry_map = fetch_stock_industry_map()
+    report(stage='stock_list')
+    stocks_df = get_all_stocks(use_snapshot=False)
+    report(stage='industries')
+    stock_industry_map = fetch_stock_industry_map(use_snapshot=False, progress=progress)
 
     if stocks_df.empty:
         print("Failed to fetch stock list. Database update skipped.")
-        return
+        return None
 
-    count = 0
-    for index, row in stocks_df.iterrows():
-        stock_code = row['code']
-        stock_name = row['name']
-        industry = stock_industry_map.get(stock_code, None) # 从映射中获取行业信息
+    # 1. 上游快照与数据库现有快照，分别计算行哈希
+    upstream = pd.DataFrame({
+        'code': stocks_df['code'].astype(str),
+        'name': stocks_df['name'].astype(str)
+    }).drop_duplicates('code', keep='last')
+    upstream['industry'] = upstream['code'].map(stock_industry_map) # 从映射中获取行业信息
+    existing = pd.DataFrame(
+        db.session.query(Stock.code, Stock.name, Stock.industry).filter(Stock.is_active.isnot(False)).all(),
+        columns=['code', 'name', 'industry']
+    )
+    delta = change_feed.diff_keyed(
+        'stocks',
+        existing['code'], change_feed.hash_rows(existing.fillna(''), STOCK_ROW_COLUMNS),
+        upstream['code'], change_feed.hash_rows(upstream.fillna(''), STOCK_ROW_COLUMNS)
+    )
 
+    # 2. 只写入新增和变化的行
+    names = dict(zip(upstream['code'], upstream['name']))
+    pending = delta.added + delta.changed
+    report(stage='syncing', rows_total=len(pending) + len(delta.removed), rows_synced=0)
+    for position, stock_code in enumerate(pending, 1):
         stock_obj = Stock(
             code=stock_code,
-            name=stock_name,
-            industry=industry, # 填充行业信息
-            market='A-Share' 
+            name=names[stock_code],
+            industry=stock_industry_map.get(stock_code, None), # 填充行业信息
+            market='A-Share',
+            is_active=True
         )
         db.session.merge(stock_obj)
-        count += 1
+        if position % 500 == 0:
+            report(rows_synced=position)
+
+    # 3. 上游不再返回的股票标记为不活跃
+    if delta.removed:
+        db.session.query(Stock).filter(Stock.code.in_(delta.removed)).update(
+            {Stock.is_active: False}, synchronize_session=False
+        )
 
     db.session.commit()
-    print(f"Database update complete. {count} stock records processed.")
+    if delta:
+        invalidate_symbol_index()
+        change_feed.publish(delta)
+    report(stage='done', rows_synced=len(pending) + len(delta.removed))
+    print(f"Database update complete. {len(upstream)} stock records compared: "
+          f"{len(delta.added)} added, {len(delta.changed)} changed, {len(delta.removed)} deactivated.")
+    return {
+        'compared': len(upstream),
+        'added': len(delta.added),
+        'changed': len(delta.changed),
+        'deactivated': len(delta.removed),
+    }
+
+
+# --- 对齐数据层 ---
+# 上游数据集定义：获取函数、代码列、需要对齐的数值列、缓存时长及单次获取的超时时间（秒）
+DATASETS = {
+    'spot': {
+        'fetch': lambda: ak.stock_zh_a_spot_em(),
+        'code_column': '代码',
+        'columns': ['最新价', '涨跌幅', '成交额', '总市值'],
+        'expiration': SPOT_CACHE_EXPIRATION_SECONDS,
+        'timeout': 15,
+    },
+    'valuation': {
+        'fetch': lambda: ak.stock_a_pe_pb_em(),
+        'code_column': '股票代码',
+        'columns': ['市盈率', '市净率'],
+        'expiration': CACHE_EXPIRATION_SECONDS,
+        'timeout': 20,
+    },
+}
+
+# 上游获取线程池：缺失的数据集在这里并发获取，同一数据集同时只有一个获取任务
+FETCH_POOL_SIZE = 4
+_fetch_pool = ThreadPoolExecutor(max_workers=FETCH_POOL_SIZE, thread_name_prefix='upstream-fetch')
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+# 每个上游数据集一个熔断器：连续失败后不再请求上游，直接使用最近一次成功获取的数据
+_breakers = {name: CircuitBreaker(name) for name in DATASETS}
+# 最近一次成功获取（上游或缓存）的原始数据：数据集名 -> (DataFrame, 从上游获取的时间)
+_last_good = {}
+
+_symbol_index = None
+_symbol_index_built_at = 0.0
+_aligned_cache = {}
+
+# 共享快照模式下，当前进程挂载的快照及由其构建的索引和对齐数据
+SNAPSHOT_CHECK_INTERVAL_SECONDS = 1.0
+_attached = {'version': None, 'snapshot': None, 'index': None, 'frames': {}, 'checked_at': 0.0}
+
+def _attached_snapshot():
+    """
+    共享快照模式：挂载刷新进程发布的最新快照（只读内存映射，零拷贝）。
+    每秒最多检查一次CURRENT指针，版本变化时重新挂载。
+
+    Returns:
+        tuple | None: (SymbolIndex, {数据集名: AlignedFrame})，尚无快照时返回None。
+    """
+    now = time.time()
+    if _attached['index'] is not None and now - _attached['checked_at'] < SNAPSHOT_CHECK_INTERVAL_SECONDS:
+        return _attached['index'], _attached['frames']
+    _attached['checked_at'] = now
+
+    directory = current_app.config['SNAPSHOT_DIR']
+    version = snapshot_store.current_version(directory)
+    if version and version != _attached['version']:
+        snapshot = snapshot_store.attach_snapshot(directory, version)
+        if snapshot is not None:
+            old_index, old_frames = _attached['index'], _attached['frames']
+            index, frames = _index_from_snapshot(snapshot)
+            _attached.update(version=version, snapshot=snapshot, index=index, frames=frames)
+            print(f"Attached market snapshot {version} ({len(index)} stocks).")
+            _publish_refresh_deltas(old_index, old_frames, index, frames)
+
+    if _attached['index'] is None:
+        return None
+    return _attached['index'], _attached['frames']
+
+def _index_from_snapshot(snapshot):
+    """由快照中的内存映射数组构建代码索引和对齐数据集，不复制数组。"""
+    index = SymbolIndex.from_arrays(snapshot['codes'], snapshot['names'], snapshot['industries'])
+    meta = snapshot.meta
+    frames = {}
+    for name, columns in meta.get('datasets', {}).items():
+        aligned = {column: snapshot[f"{name}_{i}"] for i, column in enumerate(columns)}
+        frames[name] = AlignedFrame(aligned, snapshot[f"{name}_present"], index.version,
+                                    as_of=meta.get('as_of', {}).get(name, meta.get('created_at')),
+                                    stale=name in meta.get('stale', ()))
+    return index, frames
+
+def _shared_mode() -> bool:
+    return current_app.config.get('MARKET_DATA_MODE') == 'shared'
+
+def _shared_snapshot():
+    """如果启用了共享快照模式且已有可用快照，返回挂载结果，否则返回None。"""
+    if not _shared_mode():
+        return None
+    attached = _attached_snapshot()
+    if attached is None:
+        print("No market snapshot published yet. Falling back to local fetch.")
+    return attached
+
+def get_symbol_index() -> SymbolIndex:
+    """
+    获取以数据库股票列表为基准的持久代码索引。
+    索引在进程内缓存，股票列表更新后重建，过期后在后台刷新。
+    共享快照模式下直接使用快照中的股票列表。
+
+    Returns:
+        SymbolIndex: 股票代码到位置的索引。
+    """
+    shared = _shared_snapshot()
+    if shared is not None:
+        return shared[0]
+    return _local_symbol_index()
+
+def _build_symbol_index() -> SymbolIndex:
+    """从数据库（只读副本）构建代码索引。"""
+    with read_only():
+        rows = (db.session.query(Stock.code, Stock.name, Stock.industry)
+                .filter(Stock.is_active.isnot(False))
+                .order_by(Stock.code)
+                .all())
+    index = SymbolIndex(
+        [r.code for r in rows],
+        [r.name for r in rows],
+        [r.industry for r in rows]
+    )
+    print(f"Symbol index built with {len(index)} stocks.")
+    return index
+
+def _local_symbol_index() -> SymbolIndex:
+    """复用进程内缓存的代码索引，没有时同步构建，过期时触发后台刷新。"""
+    global _symbol_index, _symbol_index_built_at
+    if _symbol_index is None:
+        _symbol_index = _build_symbol_index()
+        _symbol_index_built_at = time.time()
+    elif time.time() - _symbol_index_built_at >= CACHE_EXPIRATION_SECONDS:
+        start_background_refresh()
+    return _symbol_index
+
+def invalidate_symbol_index():
+    """使代码索引及所有对齐结果失效，下次访问时重建。"""
+    global _symbol_index
+    _symbol_index = None
+    _aligned_cache.clear()
+
+def _dataset_cache_key(name: str) -> str:
+    return f"dataset_{name}"
+
+def _dataset_payload(df: 'pd.DataFrame', as_of: float) -> dict:
+    """缓存中的数据集连同其从上游获取的时间一起保存，缓存命中时仍能知道数据的真实时间。"""
+    return {'as_of': as_of, 'rows': df.to_dict(orient='records')}
+
+def _cached_datasets(names) -> dict:
+    """
+    一次往返（MGET）从缓存读取多个数据集的原始数据，返回命中的数据集名到 (DataFrame, 获取时间) 的映射。
+    不带获取时间的旧格式缓存视为未命中。
+    """
+    keys = {_dataset_cache_key(name): name for name in names}
+    found = cache.get_many(keys, {key: DATASETS[name]['expiration'] for key, name in keys.items()})
+    return {
+        keys[key]: (pd.DataFrame(payload['rows']), payload['as_of'])
+        for key, payload in found.items()
+        if isinstance(payload, dict) and 'as_of' in payload
+    }
+
+def _fetch_upstream(name: str, store: bool = True, timeout: float = None) -> tuple:
+    """
+    从上游获取数据集的原始数据（仅保留代码列和需要的数值列），store为True时写入缓存。
+    结果（异常或空数据视为失败）记录到该数据集的熔断器，每次调用只记录一次。
+    给定timeout时，耗时超过timeout的调用也计为一次失败（等待方已超时回退），但获取到的数据仍写入缓存。
+
+    Returns:
+        tuple: (DataFrame, 获取时间)。
+    """
+    spec = DATASETS[name]
+    breaker = _breakers[name]
+    print(f"Cache miss. Fetching {name} data from AkShare.")
+    started = time.monotonic()
+    try:
+        df = spec['fetch']()
+        if df is None or df.empty or spec['code_column'] not in df.columns:
+            raise ValueError(f"Upstream returned no {name} data")
+    except Exception as e:
+        breaker.record_failure(e)
+        raise
+    elapsed = time.monotonic() - started
+    if timeout is not None and elapsed > timeout:
+        breaker.record_failure(TimeoutError(f"Fetching {name} data took {elapsed:.1f}s (timeout {timeout}s)"))
+    else:
+        breaker.record_success()
+    as_of = time.time()
+    wanted = [spec['code_column']] + [c for c in spec['columns'] if c in df.columns]
+    df = df[wanted]
+    if store:
+        cache.set(_dataset_cache_key(name), _dataset_payload(df, as_of), spec['expiration'])
+    return df, as_of
+
+def _submit_fetch(name: str):
+    """提交上游获取任务；同一数据集已有进行中的任务时直接复用。"""
+    with _inflight_lock:
+        future = _inflight.get(name)
+        if future is None:
+            future = _fetch_pool.submit(_fetch_upstream, name, timeout=DATASETS[name]['timeout'])
+            _inflight[name] = future
+            future.add_done_callback(lambda done, name=name: _inflight.pop(name, None))
+    return future
+
+def _fetch_datasets(names, concurrent: bool = True) -> dict:
+    """
+    获取多个上游数据集的原始数据。先用一次MGET读取所有数据集的缓存，只有未命中的才请求上游。
+
+    Args:
+        names (list): 数据集名称。
+        concurrent (bool): 为True时在线程池中并发获取，每个数据集按DATASETS中的timeout超时；
+            为False时在当前线程中依次获取，完成后用一次流水线写入缓存。
+
+    熔断器打开的数据集不请求上游，直接返回CircuitOpenError；超时的获取由后台任务在完成时计为一次失败。
+    成功获取的数据连同其获取时间（缓存命中时为写入缓存前从上游获取的时间）记录到_last_good。
+
+    Returns:
+        dict: 数据集名到DataFrame的映射，获取失败或超时的数据集对应异常对象。
+    """
+    fetched_at = {}
+    results = {}
+    for name, (df, as_of) in _cached_datasets(names).items():
+        results[name], fetched_at[name] = df, as_of
+    pending = []
+    for name in names:
+        if name in results:
+            continue
+        try:
+            _breakers[name].check()
+        except Exception as e:
+            results[name] = e
+        else:
+            pending.append(name)
+
+    if not concurrent:
+        fetched = {}
+        for name in pending:
+            try:
+                results[name], fetched_at[name] = _fetch_upstream(name, store=False)
+                fetched[name] = results[name]
+            except Exception as e:
+                results[name] = e
+        cache.set_many(
+            {_dataset_cache_key(name): _dataset_payload(df, fetched_at[name]) for name, df in fetched.items()},
+            {_dataset_cache_key(name): DATASETS[name]['expiration'] for name in fetched}
+        )
+    else:
+        started = time.monotonic()
+        futures = {name: _submit_fetch(name) for name in pending}
+        for name, future in futures.items():
+            timeout = DATASETS[name]['timeout']
+            try:
+                results[name], fetched_at[name] = future.result(timeout=max(0.0, started + timeout - time.monotonic()))
+            except FetchTimeoutError:
+                # 超时的任务继续在后台运行，完成后写入缓存供之后的请求使用，并由它向熔断器记录这次超时
+                results[name] = TimeoutError(f"Fetching {name} data timed out after {timeout}s")
+            except Exception as e:
+                results[name] = e
+
+    for name, result in results.items():
+        if not isinstance(result, Exception):
+            _last_good[name] = (result, fetched_at[name])
+    return results
+
+def _last_known_good(name: str, index: SymbolIndex):
+    """
+    上游不可用时使用的数据：最近一次成功获取的数据，进程内没有时使用最近的磁盘快照。
+    返回对齐到index、标记为stale并带有获取时间的AlignedFrame，都没有时返回None。
+    """
+    entry = _last_good.get(name) or _snapshot_dataset(name)
+    if entry is None:
+        return None
+    data, as_of = entry
+    spec = DATASETS[name]
+    frame = index.align(data, spec['code_column'], spec['columns'])
+    frame.as_of, frame.stale = as_of, True
+    print(f"Serving last-known-good {name} data ({time.time() - as_of:.0f}s old).")
+    return frame
+
+def _snapshot_dataset(name: str):
+    """从最近的快照中读取数据集的原始数据，返回 (DataFrame, 获取时间)。"""
+    snapshot = _latest_snapshot()
+    if snapshot is None or name not in snapshot.meta.get('datasets', {}):
+        return None
+    spec = DATASETS[name]
+    present = np.asarray(snapshot[f"{name}_present"])
+    data = {spec['code_column']: np.asarray(snapshot['codes'])[present]}
+    for i, column in enumerate(snapshot.meta['datasets'][name]):
+        data[column] = np.asarray(snapshot[f"{name}_{i}"])[present]
+    return pd.DataFrame(data), snapshot.meta.get('as_of', {}).get(name, snapshot.meta['created_at'])
+
+def fetch_bundle(names, concurrent: bool = None) -> DataBundle:
+    """
+    获取计划执行器：一次性准备调用方声明需要的多个上游数据集。
+    已缓存的数据集立即返回（过期时先返回旧数据并触发后台刷新），
+    缺失的数据集在线程池中并发获取、各自超时，返回的数据集都对齐到同一个代码索引。
+
+    Args:
+        names (list): 数据集名称列表，见DATASETS。
+        concurrent (bool): 是否并发获取缺失的数据集，默认读取配置ASYNC_UPSTREAM_FETCH。
+
+    上游获取失败（或熔断器打开）时使用最近一次成功获取的数据，以AlignedFrame.stale标记并带有获取时间；
+    没有任何可用数据时，该数据集在访问时抛出获取时的异常。
+
+    Returns:
+        DataBundle: 代码索引和对齐后的数据集。
+    """
+    names = list(dict.fromkeys(names))
+    shared = _shared_snapshot()
+    if shared is not None:
+        index, frames = shared
+        return DataBundle(
+            index,
+            {name: frames[name] for name in names if name in frames},
+            {name: LookupError(f"Dataset '{name}' is missing from the published snapshot.")
+             for name in names if name not in frames}
+        )
+
+    index = _local_symbol_index()
+    frames, errors, missing = {}, {}, []
+    for name in names:
+        entry = _aligned_cache.get(name)
+        if entry and entry['frame'].index_version == index.version:
+            if time.time() - entry['timestamp'] >= DATASETS[name]['expiration']:
+                start_background_refresh()
+            frames[name] = entry['frame']
+        else:
+            missing.append(name)
+
+    if missing:
+        if concurrent is None:
+            concurrent = current_app.config.get('ASYNC_UPSTREAM_FETCH', True)
+        for name, result in _fetch_datasets(missing, concurrent).items():
+            if isinstance(result, Exception):
+                frame = _last_known_good(name, index)
+                if frame is None:
+                    errors[name] = result
+                    continue
+            else:
+                spec = DATASETS[name]
+                frame = index.align(result, spec['code_column'], spec['columns'])
+                frame.as_of = _last_good[name][1]
+            _aligned_cache[name] = {'frame': frame, 'timestamp': time.time()}
+            change_feed.publish(change_feed.Delta(name, reset=True))
+            frames[name] = frame
+    return DataBundle(index, frames, errors)
+
+def get_aligned_dataset(name: str):
+    """
+    获取按代码索引对齐后的单个上游数据集。
+    每次上游数据刷新时只对齐一次，之后的请求直接复用对齐好的NumPy数组。
+
+    Args:
+        name (str): 数据集名称，见DATASETS。
+
+    Returns:
+        AlignedFrame: 对齐后的数据。上游获取失败时抛出异常。
+    """
+    return fetch_bundle([name])[name]
+
+def _index_hashes(index: SymbolIndex) -> np.ndarray:
+    frame = pd.DataFrame({'name': index.names, 'industry': index.industries})
+    return change_feed.hash_rows(frame, STOCK_ROW_COLUMNS)
+
+def _publish_refresh_deltas(old_index, old_frames, index, frames):
+    """比较刷新前后的代码索引和对齐数据，只向订阅者发布发生变化的股票。"""
+    if old_index is not None:
+        change_feed.publish(change_feed.diff_keyed(
+            'stocks', old_index.codes, _index_hashes(old_index), index.codes, _index_hashes(index)
+        ))
+    for name, frame in frames.items():
+        change_feed.publish(change_feed.diff_aligned(name, old_index, old_frames.get(name), index, frame))
+
+
+
+# --- 磁盘快照与后台刷新 ---
+# 快照格式版本，数组布局变化时递增，旧格式的快照在启动时被忽略
+SNAPSHOT_FORMAT_VERSION = 1
+
+_disk = {'snapshot': None}
+_refresh_lock = threading.Lock()
+_refresh_state = {'running': False, 'started_at': None, 'finished_at': None, 'error': None}
+# 行业映射的后台刷新：最近一次成功爬取的映射及其时间，发布快照时使用，不在发布过程中爬取
+_industry_lock = threading.Lock()
+_industry_state = {'running': False, 'map': None, 'as_of': None, 'error': None}
+
+def init_app(app):
+    """
+    应用启动时以内存映射方式加载最近一次的磁盘快照（毫秒级），
+    使股票列表、行业映射、行情和估值数据在冷启动后立即可用。
+    首次访问时先返回快照中的数据：行情和估值数据在快照超过各自的缓存时间后、
+    股票列表和行业映射在缓存未命中时触发后台刷新，请求不等待上游。
+    """
+    for breaker in _breakers.values():
+        breaker.configure(app.config.get('UPSTREAM_FAILURE_THRESHOLD', breaker.failure_threshold),
+                          app.config.get('UPSTREAM_RETRY_SECONDS', breaker.retry_seconds),
+                          app.config.get('UPSTREAM_MAX_RETRY_SECONDS', breaker.max_retry_seconds))
+    if app.config.get('MARKET_DATA_MODE') == 'shared' or not app.config.get('SNAPSHOT_WARM_START', True):
+        return
+    snapshot = snapshot_store.attach_snapshot(app.config['SNAPSHOT_DIR'])
+    if snapshot is None:
+        return
+    if snapshot.meta.get('format') != SNAPSHOT_FORMAT_VERSION:
+        print(f"Ignoring snapshot {snapshot.version} with incompatible format {snapshot.meta.get('format')}.")
+        return
+
+    global _symbol_index, _symbol_index_built_at
+    created_at = snapshot.meta['created_at']
+    index, frames = _index_from_snapshot(snapshot)
+    _symbol_index, _symbol_index_built_at = index, created_at
+    _aligned_cache.clear()
+    for name, frame in frames.items():
+        _aligned_cache[name] = {'frame': frame, 'timestamp': created_at}
+    _disk['snapshot'] = snapshot
+    print(f"Loaded market snapshot {snapshot.version} from disk "
+          f"({len(index)} stocks, {time.time() - created_at:.0f}s old).")
+
+def _latest_snapshot():
+    """当前进程可用的最新快照：共享模式下为已挂载的快照，本地模式下为启动加载或最近发布的快照。"""
+    if _shared_mode():
+        _attached_snapshot()
+        return _attached['snapshot']
+    return _disk['snapshot']
+
+def _refresh_snapshot_in_background():
+    """缓存未命中而使用快照数据时调用：共享模式由刷新进程负责上游获取，本地模式启动后台刷新（已在运行时不重复启动）。"""
+    if not _shared_mode():
+        start_background_refresh()
+
+def _stock_list_from_snapshot():
+    snapshot = _latest_snapshot()
+    if snapshot is None or 'stock_list_codes' not in snapshot:
+        return None
+    return pd.DataFrame({
+        'code': snapshot['stock_list_codes'].tolist(),
+        'name': snapshot['stock_list_names'].tolist()
+    })
+
+def _industry_map_from_snapshot():
+    snapshot = _latest_snapshot()
+    if snapshot is None or 'industry_map_codes' not in snapshot:
+        return None
+    return dict(zip(snapshot['industry_map_codes'].tolist(), snapshot['industry_map_industries'].tolist()))
+
+def refresh_interval(names) -> int:
+    """指定数据集的刷新间隔（秒），共享模式下为快照刷新间隔，可作为HTTP缓存的max-age。"""
+    if _shared_mode():
+        return current_app.config['SNAPSHOT_REFRESH_SECONDS']
+    return min((DATASETS[name]['expiration'] for name in names), default=CACHE_EXPIRATION_SECONDS)
+
+def get_snapshot_status() -> dict:
+    """
+    返回当前所用快照的新鲜度信息。
+
+    Returns:
+        dict: 包含版本、生成时间、数据年龄、是否过期、后台刷新状态、行业映射的获取时间和刷新状态，
+            以及各上游熔断器状态和回退到历史数据的数据集。
+    """
+    snapshot = _latest_snapshot()
+    status = {
+        'mode': current_app.config.get('MARKET_DATA_MODE', 'local'),
+        'version': None,
+        'created_at': None,
+        'age_seconds': None,
+        'stale': True,
+        'refreshing': _refresh_state['running'],
+        'last_refresh_error': _refresh_state['error'],
+        'industry_map_as_of': None,
+        'industry_map_refreshing': _industry_state['running'],
+        'last_industry_map_error': _industry_state['error'],
+        'upstreams': {name: breaker.status() for name, breaker in _breakers.items()},
+    }
+    # 上游不可用、正在使用最近一次成功获取的数据的数据集及其数据年龄（秒）
+    frames = _attached['frames'] if _shared_mode() else {name: entry['frame'] for name, entry in _aligned_cache.items()}
+    status['stale_datasets'] = DataBundle(None, frames).stale_ages()
+    if snapshot is not None:
+        age = time.time() - snapshot.meta['created_at']
+        status.update(
+            version=snapshot.version,
+            created_at=snapshot.meta['created_at'],
+            age_seconds=round(age, 1),
+            industry_map_as_of=snapshot.meta.get('industry_map_as_of'),
+            stale=age > current_app.config['SNAPSHOT_REFRESH_SECONDS'] * 2
+        )
+    return status
+
+def start_background_refresh() -> bool:
+    """
+    在后台线程中刷新市场数据并持久化快照，同一时间只运行一个刷新任务。
+
+    Returns:
+        bool: 是否启动了新的刷新任务。
+    """
+    with _refresh_lock:
+        if _refresh_state['running']:
+            return False
+        _refresh_state['running'] = True
+        _refresh_state['started_at'] = time.time()
+    app = current_app._get_current_object()
+    threading.Thread(target=_run_background_refresh, args=(app,), name='snapshot-refresh', daemon=True).start()
+    return True
+
+def _run_background_refresh(app):
+    with app.app_context():
+        try:
+            publish_market_snapshot()
+            _refresh_state['error'] = None
+        except Exception as e:
+            print(f"Background refresh failed: {e}")
+            _refresh_state['error'] = str(e)
+        finally:
+            _refresh_state['running'] = False
+            _refresh_state['finished_at'] = time.time()
+
+def refresh_market_data():
+    """
+    重新构建代码索引并获取、对齐所有上游数据集，完成后一次性替换进程内的数据，
+    并只把发生变化的股票发布到变化订阅。刷新期间请求继续使用旧数据。
+    获取失败的数据集沿用最近一次成功获取的数据（标记为stale），不会从快照中消失。
+
+    Returns:
+        tuple: (SymbolIndex, {数据集名: AlignedFrame})。
+    """
+    global _symbol_index, _symbol_index_built_at
+    old_index = _symbol_index
+    old_frames = {name: entry['frame'] for name, entry in _aligned_cache.items()}
+    index = _build_symbol_index()
+    frames = {}
+    for name, result in _fetch_datasets(list(DATASETS)).items():
+        if isinstance(result, Exception):
+            print(f"Error fetching {name} data during refresh: {result}.")
+            frame = _last_known_good(name, index)
+            if frame is not None:
+                frames[name] = frame
+            continue
+        spec = DATASETS[name]
+        frames[name] = index.align(result, spec['code_column'], spec['columns'])
+        frames[name].as_of = _last_good[name][1]
+
+    now = time.time()
+    _symbol_index, _symbol_index_built_at = index, now
+    _aligned_cache.clear()
+    for name, frame in frames.items():
+        _aligned_cache[name] = {'frame': frame, 'timestamp': now}
+    _publish_refresh_deltas(old_index, old_frames, index, frames)
+    return index, frames
+
+def publish_market_snapshot(directory: str = None) -> str:
+    """
+    刷新所有市场数据并持久化为带版本的内存映射快照。
+    共享模式下由刷新进程调用供各worker只读挂载；本地模式下由后台刷新调用，供下次冷启动使用。
+
+    Args:
+        directory (str): 快照根目录，默认使用配置中的SNAPSHOT_DIR。
+
+    Returns:
+        str: 新发布的快照版本号。
+    """
+    directory = directory or current_app.config['SNAPSHOT_DIR']
+    index, frames = refresh_market_data()
+    arrays = {'codes': index.codes, 'names': index.names, 'industries': index.industries}
+    datasets = {}
+    for name, frame in frames.items():
+        columns = DATASETS[name]['columns']
+        datasets[name] = columns
+        arrays[f"{name}_present"] = frame.present
+        for i, column in enumerate(columns):
+            arrays[f"{name}_{i}"] = frame.columns[column]
+
+    # 股票列表和行业映射：获取失败或行业映射尚未刷新时沿用上一版快照中的数据
+    previous = _latest_snapshot()
+    stocks_df = get_all_stocks(use_snapshot=False)
+    if not stocks_df.empty:
+        arrays['stock_list_codes'] = np.asarray(stocks_df['code'].astype(str).tolist(), dtype=str)
+        arrays['stock_list_names'] = np.asarray(stocks_df['name'].astype(str).tolist(), dtype=str)
+    industry_map, industry_as_of = _industry_map_for_publish(previous)
+    if industry_map:
+        arrays['industry_map_codes'] = np.asarray(list(industry_map.keys()), dtype=str)
+        arrays['industry_map_industries'] = np.asarray(list(industry_map.values()), dtype=str)
+    if previous is not None:
+        for name in ('stock_list_codes', 'stock_list_names', 'industry_map_codes', 'industry_map_industries'):
+            if name not in arrays and name in previous:
+                arrays[name] = np.asarray(previous[name])
+
+    meta = {
+        'format': SNAPSHOT_FORMAT_VERSION,
+        'datasets': datasets,
+        'as_of': {name: frame.as_of for name, frame in frames.items()},
+        'stale': [name for name, frame in frames.items() if frame.stale],
+        'industry_map_as_of': industry_as_of,
+    }
+    version = snapshot_store.publish_snapshot(directory, arrays, meta)
+    if not _shared_mode():
+        _disk['snapshot'] = snapshot_store.attach_snapshot(directory, version)
+    print(f"Published market snapshot {version} with datasets: {', '.join(datasets) or 'none'}.")
+    return version
+
+def _industry_map_for_publish(previous):
+    """
+    发布快照使用的行业映射，不在发布过程中爬取行业页面（否则每次缓存过期后快照和行情都要停顿数分钟）。
+    使用后台刷新得到的较新映射，否则沿用上一版快照中的映射；映射超过INDUSTRY_MAP_REFRESH_SECONDS时启动后台刷新。
+    只有从未获取过行业映射时（首次发布）才同步爬取。
+
+    Returns:
+        tuple: (行业映射, 获取时间)，沿用上一版快照时映射为None。
+    """
+    previous_as_of = None
+    if previous is not None and 'industry_map_codes' in previous:
+        previous_as_of = previous.meta.get('industry_map_as_of') or previous.meta['created_at']
+    if _industry_state['map'] and (previous_as_of is None or _industry_state['as_of'] > previous_as_of):
+        return _industry_state['map'], _industry_state['as_of']
+    if previous_as_of is None:
+        return fetch_stock_industry_map(use_snapshot=False), time.time()
+    if time.time() - previous_as_of >= current_app.config['INDUSTRY_MAP_REFRESH_SECONDS']:
+        start_industry_map_refresh()
+    return None, previous_as_of
+
+def start_industry_map_refresh() -> bool:
+    """
+    在后台线程中重新爬取行业映射，完成后由之后的快照发布使用，同一时间只运行一个刷新任务。
+
+    Returns:
+        bool: 是否启动了新的刷新任务。
+    """
+    with _industry_lock:
+        if _industry_state['running']:
+            return False
+        _industry_state['running'] = True
+    app = current_app._get_current_object()
+    threading.Thread(target=_run_industry_map_refresh, args=(app,), name='industry-map-refresh', daemon=True).start()
+    return True
+
+def _run_industry_map_refresh(app):
+    with app.app_context():
+        try:
+            industry_map = fetch_stock_industry_map(use_snapshot=False)
+            if not industry_map:
+                raise ValueError("Upstream returned no industry data")
+            _industry_state.update(map=industry_map, as_of=time.time(), error=None)
+            print(f"Industry map refreshed ({len(industry_map)} stocks).")
+        except Exception as e:
+            print(f"Industry map refresh failed: {e}")
+            _industry_state['error'] = str(e)
+        finally:
+            _industry_state['running'] = False
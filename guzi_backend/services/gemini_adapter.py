@@ -1,16 +1,24 @@
 # guzi_backend/services/gemini_adapter.py
 
-import google.generativeai as genai
 from .ai_service import BaseAIServiceAdapter
+from .prompt_builder import DEFAULT_TOKEN_BUDGET, PromptBuilder
 import json
 
+SENTIMENT_INSTRUCTION = (
+    "判断下列文本的情绪（积极/消极/中性）及得分（-1最消极到1最积极），"
+    '只返回JSON，例如 {"sentiment":"积极","score":0.8}'
+)
+
 class GeminiAdapter(BaseAIServiceAdapter):
     """Gemini AI服务适配器。"""
 
-    def __init__(self, api_key: str):
-        super().__init__(api_key)
+    def __init__(self, api_key: str, token_budget: int = DEFAULT_TOKEN_BUDGET):
+        super().__init__(api_key, token_budget)
+        # SDK导入耗时较长，只在配置了API密钥、真正创建适配器时导入
+        import google.generativeai as genai
         genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash') # 可以根据需要选择不同的模型
+        self.model_name = 'gemini-2.5-flash' # 可以根据需要选择不同的模型
+        self.model = genai.GenerativeModel(self.model_name)
 
     def generate_text(self, prompt: str) -> str:
         """使用Gemini模型生成文本。"""
@@ -21,18 +29,28 @@ class GeminiAdapter(BaseAIServiceAdapter):
             self._handle_api_error(e)
             return ""
 
+    async def generate_text_async(self, prompt: str) -> str:
+        """使用Gemini模型的原生异步接口生成文本，等待期间不占用线程。"""
+        try:
+            response = await self.model.generate_content_async(prompt)
+            return response.text
+        except Exception as e:
+            self._handle_api_error(e)
+            return ""
+
     def analyze_sentiment(self, text: str) -> dict:
         """使用Gemini模型分析文本情绪。
-        
-        这里通过prompt工程实现情绪分析，实际应用中可能需要更复杂的模型或API。
-        """
-        sentiment_prompt = f"""请分析以下文本的情绪，并以JSON格式返回结果。情绪分为'积极'、'消极'、'中性'。同时给出情绪得分（-1到1之间，-1为最消极，1为最积极）。
 
-        文本: ""{text} ""
-
-        JSON格式示例:
-        {{"sentiment": "积极", "score": 0.8}}
+        这里通过prompt工程实现情绪分析，实际应用中可能需要更复杂的模型或API。
+        提示词不超过token_budget，过长的文本从末尾截断。
         """
+        prompt = (PromptBuilder(self.token_budget)
+                  .text('instruction', SENTIMENT_INSTRUCTION, required=True)
+                  .text('text', text, truncate=True)
+                  .build())
+        if prompt.truncated:
+            print(f"Sentiment prompt truncated to ~{prompt.estimated_tokens} tokens: {prompt.truncated}")
+        sentiment_prompt = prompt.text
         try:
             response = self.model.generate_content(sentiment_prompt)
             # 尝试解析JSON，如果失败则返回默认值
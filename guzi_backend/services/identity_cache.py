@@ -0,0 +1,110 @@
+# guzi_backend/services/identity_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+from flask import jsonify
+from sqlalchemy import event
+from ..database import db
+from ..models import User
+
+# 身份缓存默认有效期（秒），其他进程修改用户后最多在这段时间内仍使用旧身份
+DEFAULT_IDENTITY_TTL_SECONDS = 30
+# 每个进程最多缓存的身份数，超出时淘汰最早写入的条目
+DEFAULT_IDENTITY_CACHE_MAX_ENTRIES = 10000
+
+
+class Identity:
+    """已认证用户的轻量身份信息，不绑定数据库会话，可以跨请求、跨线程共享。"""
+
+    __slots__ = ('id', 'username', 'email')
+
+    def __init__(self, id: int, username: str, email: str):
+        self.id = id
+        self.username = username
+        self.email = email
+
+    def __repr__(self):
+        return f'<Identity {self.id} {self.username}>'
+
+
+class IdentityCache:
+    """
+    以JWT的sub为键的进程级身份缓存。
+
+    flask_jwt_extended在每个请求内只调用一次user_lookup_loader，并把结果保存在请求上下文中（current_user），
+    因此同一请求内天然只查一次；本缓存再让稳态下的已认证请求完全不访问数据库。
+    用户不存在的结果同样缓存，避免已删除用户的令牌反复查询数据库。
+    本进程内通过ORM修改或删除用户时立即失效，其他进程的修改依赖较短的TTL。
+
+    所有条目的TTL相同，写入顺序即过期顺序：写入时从最早的一端清除已过期的条目，
+    并在超过max_entries时淘汰最早写入的条目，内存占用不随见过的sub数量增长。
+    """
+
+    def __init__(self, ttl: float = DEFAULT_IDENTITY_TTL_SECONDS,
+                 max_entries: int = DEFAULT_IDENTITY_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app, jwt):
+        """读取TTL和容量配置，并向JWTManager注册current_user加载函数。"""
+        self.ttl = app.config.get('IDENTITY_CACHE_TTL_SECONDS', DEFAULT_IDENTITY_TTL_SECONDS)
+        self.max_entries = app.config.get('IDENTITY_CACHE_MAX_ENTRIES', DEFAULT_IDENTITY_CACHE_MAX_ENTRIES)
+
+        @jwt.user_lookup_loader
+        def load_current_user(_jwt_header, jwt_data):
+            return self.load(jwt_data['sub'])
+
+        @jwt.user_lookup_error_loader
+        def current_user_not_found(_jwt_header, _jwt_data):
+            return jsonify({"code": 40401, "message": "User not found"}), 404
+
+    def load(self, sub):
+        """返回sub对应的身份，缓存未命中或过期时查询数据库，用户不存在时返回None。"""
+        sub = str(sub)
+        now = time.monotonic()
+        entry = self._entries.get(sub)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        try:
+            user_id = int(sub)
+        except ValueError:
+            return None
+        row = db.session.query(User.id, User.username, User.email).filter(User.id == user_id).first()
+        identity = Identity(*row) if row is not None else None
+        with self._lock:
+            self._entries.pop(sub, None)
+            self._entries[sub] = (now + self.ttl, identity)
+            while self._entries:
+                expires_at, _ = next(iter(self._entries.values()))
+                if expires_at > now and len(self._entries) <= self.max_entries:
+                    break
+                self._entries.popitem(last=False)
+        return identity
+
+    def __len__(self):
+        return len(self._entries)
+
+    def invalidate(self, user_id):
+        """移除指定用户的缓存身份。"""
+        with self._lock:
+            self._entries.pop(str(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# 全局身份缓存实例
+identity_cache = IdentityCache()
+
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_user(_mapper, _connection, target):
+    """用户新增、修改或删除时失效缓存（新增时清除可能存在的“用户不存在”缓存）。"""
+    identity_cache.invalidate(target.id)
@@ -0,0 +1,332 @@
+# guzi_backend/services/job_queue.py
+
+import hashlib
+import inspect
+import json
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from ..database import db
+from ..models import Job
+
+# 未调用init_app时使用的默认配置，与config.Config一致
+DEFAULT_CONFIG = {
+    'JOB_POLL_SECONDS': 2.0,
+    'JOB_HEARTBEAT_SECONDS': 2.0,
+    'JOB_STALE_SECONDS': 300,
+    'JOB_MAX_ATTEMPTS': 3,
+}
+
+# 任务类型 -> 处理函数，处理函数的第一个参数为进度回调，其余参数来自任务的params
+JOB_HANDLERS = {}
+
+
+class JobError(ValueError):
+    """任务类型或参数无效。"""
+    pass
+
+
+def job_handler(kind: str):
+    """注册任务类型的处理函数。处理函数返回的结果须可JSON序列化，保存在任务的result中。"""
+    def register(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return register
+
+
+def _config(name: str):
+    return current_app.config.get(name, DEFAULT_CONFIG[name])
+
+
+def dedup_key(kind: str, params: dict) -> str:
+    """任务类型与参数（键排序后）的哈希，相同的任务得到相同的键。"""
+    canonical = json.dumps([kind, params], sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _validate(kind: str, params) -> dict:
+    handler = JOB_HANDLERS.get(kind)
+    if handler is None:
+        raise JobError(f"Unknown job type: {kind}. Available: {', '.join(sorted(JOB_HANDLERS))}.")
+    params = params or {}
+    if not isinstance(params, dict):
+        raise JobError("Job params must be an object.")
+    try:
+        inspect.signature(handler).bind(None, **params)
+    except TypeError as e:
+        raise JobError(f"Invalid params for {kind}: {e}")
+    return params
+
+
+def enqueue(kind: str, params: dict = None, priority: int = 0):
+    """
+    提交任务。相同类型和参数的任务已在排队或运行时不再新建，直接返回该任务；
+    若新提交的优先级更高且该任务仍在排队，则提高其优先级。
+
+    Args:
+        kind (str): 任务类型，见JOB_HANDLERS。
+        params (dict): 任务参数，作为关键字参数传给处理函数。
+        priority (int): 优先级，数值大的先执行。
+
+    Returns:
+        tuple: (任务, 是否新建)。
+
+    Raises:
+        JobError: 任务类型或参数无效。
+        IntegrityError: 写入违反了active_key以外的约束。
+    """
+    params = _validate(kind, params)
+    key = dedup_key(kind, params)
+    retried = False
+    while True:
+        job = Job(kind=kind, params=params, dedup_key=key, active_key=key,
+                  priority=priority, status='queued', progress={})
+        db.session.add(job)
+        try:
+            # 由active_key的唯一约束保证相同任务同时只有一个未结束，无需先查询
+            db.session.commit()
+            return job, True
+        except IntegrityError:
+            db.session.rollback()
+            existing = Job.query.filter_by(active_key=key).first()
+            if existing is None:
+                if retried:
+                    raise  # 不是active_key的冲突，重试没有意义
+                retried = True
+                continue  # 冲突的任务恰好在此期间结束，重新提交一次
+        if priority > existing.priority:
+            raised = (db.session.query(Job)
+                      .filter(Job.id == existing.id, Job.status == 'queued', Job.priority < priority)
+                      .update({Job.priority: priority}, synchronize_session=False))
+            db.session.commit()
+            if raised:
+                db.session.refresh(existing)
+        return existing, False
+
+
+def get_job(job_id: int):
+    """按ID读取任务，不存在时返回None。"""
+    return db.session.get(Job, job_id)
+
+
+def claim_next_job(worker: str):
+    """
+    领取优先级最高（同优先级先提交先执行）的排队任务。
+    以带状态条件的UPDATE领取，多个worker进程同时领取同一任务时只有一个成功，其余继续尝试下一个。
+
+    Returns:
+        Job | None: 领取到的任务，队列为空时返回None。
+    """
+    while True:
+        job_id = (db.session.query(Job.id)
+                  .filter(Job.status == 'queued')
+                  .order_by(Job.priority.desc(), Job.id)
+                  .limit(1)
+                  .scalar())
+        if job_id is None:
+            db.session.rollback()
+            return None
+        now = datetime.utcnow()
+        claimed = (db.session.query(Job)
+                   .filter(Job.id == job_id, Job.status == 'queued')
+                   .update({Job.status: 'running', Job.worker: worker, Job.started_at: now,
+                            Job.heartbeat_at: now, Job.attempts: Job.attempts + 1},
+                           synchronize_session=False))
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id)
+
+
+def requeue_stale_jobs() -> int:
+    """
+    超过JOB_STALE_SECONDS没有心跳的运行中任务（worker进程已退出）重新排队；
+    已领取JOB_MAX_ATTEMPTS次的任务标记为失败。
+
+    Returns:
+        int: 处理的任务数。
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=_config('JOB_STALE_SECONDS'))
+    stale = (Job.status == 'running', Job.heartbeat_at < cutoff)
+    requeued = (db.session.query(Job)
+                .filter(*stale, Job.attempts < _config('JOB_MAX_ATTEMPTS'))
+                .update({Job.status: 'queued', Job.worker: None}, synchronize_session=False))
+    failed = (db.session.query(Job)
+              .filter(*stale)
+              .update({Job.status: 'failed', Job.error: 'Worker stopped responding.',
+                       Job.finished_at: datetime.utcnow(), Job.active_key: None},
+                      synchronize_session=False))
+    db.session.commit()
+    if requeued or failed:
+        print(f"Recovered stale jobs: {requeued} requeued, {failed} failed.")
+    return requeued + failed
+
+
+class JobProgress:
+    """
+    任务的进度回调：处理函数以关键字参数报告进度，例如 progress(industries_crawled=12)。
+
+    进度只更新内存中的字典，由后台线程每JOB_HEARTBEAT_SECONDS秒连同心跳一起写入数据库，
+    写入使用独立连接，不影响处理函数自身会话中的事务，也不会因数据库繁忙阻塞处理函数。
+    """
+
+    def __init__(self, app, job_id: int, worker: str):
+        self.app = app
+        self.job_id = job_id
+        self.worker = worker
+        self.fields = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __call__(self, **fields):
+        with self._lock:
+            self.fields.update(fields)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.fields)
+
+    def start(self):
+        interval = self.app.config.get('JOB_HEARTBEAT_SECONDS', DEFAULT_CONFIG['JOB_HEARTBEAT_SECONDS'])
+        self._thread = threading.Thread(target=self._run, args=(interval,), name=f'job-{self.job_id}-heartbeat',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self, interval: float):
+        with self.app.app_context():
+            while not self._stop.wait(interval):
+                self._beat()
+
+    def _beat(self):
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(
+                    update(Job)
+                    .where(Job.id == self.job_id, Job.worker == self.worker, Job.status == 'running')
+                    .values(heartbeat_at=datetime.utcnow(), progress=self.snapshot())
+                )
+        except Exception as e:
+            print(f"Could not record progress for job {self.job_id}: {e}")
+
+
+def run_job(job: Job, worker: str) -> str:
+    """
+    在当前进程中执行已领取的任务，结束后记录状态、结果或错误，并释放去重键。
+
+    Returns:
+        str: 任务的最终状态。
+    """
+    app = current_app._get_current_object()
+    job_id, kind, params = job.id, job.kind, dict(job.params or {})
+    progress = JobProgress(app, job_id, worker)
+    progress.start()
+    result, error = None, None
+    try:
+        result = JOB_HANDLERS[kind](progress, **params)
+        status = 'succeeded'
+    except Exception as e:
+        db.session.rollback()
+        traceback.print_exc()
+        status, error = 'failed', f"{type(e).__name__}: {e}"
+    finally:
+        progress.stop()
+
+    now = datetime.utcnow()
+    (db.session.query(Job)
+     .filter(Job.id == job_id, Job.worker == worker, Job.status == 'running')
+     .update({Job.status: status, Job.result: result, Job.error: error, Job.progress: progress.snapshot(),
+              Job.heartbeat_at: now, Job.finished_at: now, Job.active_key: None},
+             synchronize_session=False))
+    db.session.commit()
+    return status
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def run_worker(once: bool = False):
+    """
+    worker主循环：领取并执行任务，队列为空时每JOB_POLL_SECONDS秒检查一次，
+    并定期把失去心跳的任务重新排队。可以同时运行多个worker进程。
+
+    Args:
+        once (bool): 为True时执行完队列中的任务后退出。
+    """
+    worker = worker_name()
+    poll = _config('JOB_POLL_SECONDS')
+    sweep_interval = _config('JOB_STALE_SECONDS') / 2
+    last_sweep = 0.0
+    print(f"Job worker {worker} started.")
+    while True:
+        if time.monotonic() - last_sweep >= sweep_interval:
+            requeue_stale_jobs()
+            last_sweep = time.monotonic()
+        job = claim_next_job(worker)
+        if job is None:
+            if once:
+                break
+            time.sleep(poll)
+            continue
+        print(f"Running job {job.id} ({job.kind}, priority {job.priority}).")
+        started = time.perf_counter()
+        status = run_job(job, worker)
+        print(f"Job {job.id} {status} in {time.perf_counter() - started:.1f}s.")
+        db.session.remove()
+    print(f"Job worker {worker} stopped.")
+
+
+# --- 内置任务类型 ---
+@job_handler('update_stocks')
+def _update_stocks(progress):
+    """同步股票列表和行业信息到数据库（同 flask update-stocks）。"""
+    from . import data_service
+    return data_service.update_stock_list_in_db(progress=progress)
+
+
+@job_handler('publish_snapshot')
+def _publish_snapshot(progress):
+    """刷新市场数据并发布共享快照（同 flask refresh-snapshot --once）。"""
+    from . import data_service
+    progress(stage='snapshot')
+    return {'version': data_service.publish_market_snapshot()}
+
+
+@job_handler('sync_bars')
+def _sync_bars(progress, start: str, end: str = None, workers: int = 8):
+    """同步全市场日线历史（同 flask sync-bars）。"""
+    from . import bar_store
+    return {'version': bar_store.sync_bar_store(start, end, workers=int(workers), progress=progress)}
+
+
+@job_handler('similar_stocks')
+def _similar_stocks(progress, window: int = None, top_k: int = None):
+    """由日线矩阵重新计算相似股索引（同 flask build-similar）。"""
+    from . import similarity_service
+    return similarity_service.build_similarity_index(
+        int(window) if window else None, int(top_k) if top_k else None, progress=progress
+    )
+
+
+@job_handler('watchlist_commentary')
+def _watchlist_commentary(progress, batch_date: str = None, concurrency: int = None):
+    """为自选股批量生成AI点评（同 flask generate-commentary），同一批次重新运行时从未完成的股票继续。"""
+    from datetime import date
+    from . import commentary_service
+    return commentary_service.generate_watchlist_commentary(
+        date.fromisoformat(batch_date) if batch_date else None,
+        int(concurrency) if concurrency else None,
+        progress=progress,
+    )
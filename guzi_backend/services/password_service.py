@@ -0,0 +1,88 @@
+# guzi_backend/services/password_service.py
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# 默认与werkzeug一致的scrypt参数（N=2^15, r=8, p=1）
+DEFAULT_HASH_METHOD = 'scrypt:32768:8:1'
+
+
+class HashPoolSaturated(Exception):
+    """密码哈希线程池已满，调用方应返回503让客户端稍后重试。"""
+    pass
+
+
+class PasswordHasher:
+    """
+    在有界线程池中执行密码哈希和校验。
+
+    scrypt/pbkdf2在哈希期间释放GIL，放到线程池中可以把哈希占用的CPU限制在max_workers个核心内；
+    排队的任务超过max_pending时直接拒绝，登录洪峰不会占满所有请求线程，其他接口不受影响。
+    """
+
+    def __init__(self):
+        self.method = DEFAULT_HASH_METHOD
+        self._executor = None
+        self._slots = None
+
+    def init_app(self, app):
+        """按配置创建线程池。"""
+        self.method = app.config.get('PASSWORD_HASH_METHOD') or DEFAULT_HASH_METHOD
+        workers = app.config.get('PASSWORD_HASH_WORKERS') or os.cpu_count() or 1
+        pending = app.config.get('PASSWORD_HASH_MAX_PENDING') or workers * 4
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(pending)
+
+    def _run(self, func, *args):
+        if self._executor is None:
+            return func(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HashPoolSaturated("Password hashing pool is saturated.")
+        try:
+            future = self._executor.submit(func, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def hash(self, password: str) -> str:
+        """按当前配置的参数生成密码哈希。"""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        """校验密码。"""
+        return self._run(check_password_hash, password_hash, password)
+
+    def verify_unknown_user(self, password: str) -> bool:
+        """
+        用户不存在时按当前参数校验一个固定的占位哈希并返回False，
+        与校验真实用户的耗时（及线程池排队）相同，响应时间不会暴露用户名是否存在。
+        """
+        self._run(check_password_hash, _dummy_hash(self.method), password)
+        return False
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """已保存的哈希是否使用了与当前配置不同的算法或参数。"""
+        return password_hash.split('$', 1)[0] != _method_prefix(self.method)
+
+
+@lru_cache(maxsize=8)
+def _method_prefix(method: str) -> str:
+    """哈希字符串中记录的算法参数部分，补全了配置中省略的默认参数（例如pbkdf2的迭代次数）。"""
+    return generate_password_hash('', method).split('$', 1)[0]
+
+
+@lru_cache(maxsize=8)
+def _dummy_hash(method: str) -> str:
+    """按指定参数生成的占位哈希（随机密码，不会被任何输入匹配），每种参数只生成一次。"""
+    return generate_password_hash(os.urandom(16).hex(), method)
+
+
+# 全局密码哈希器实例
+password_hasher = PasswordHasher()
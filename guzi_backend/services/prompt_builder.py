@@ -0,0 +1,215 @@
+# guzi_backend/services/prompt_builder.py
+
+import math
+import re
+
+# 默认每次请求的提示词预算（估算token数）
+DEFAULT_TOKEN_BUDGET = 1500
+
+# 中日韩文字及全角标点，大多数模型的分词中约1字1个token
+_WIDE_CHARS = re.compile(r'[⺀-鿿가-힯豈-﫿＀-￯]')
+
+# 常用字段的简短列名和数值格式：'yi' 以亿为单位，整数为保留的小数位数，None为原样输出
+# 键与分析接口返回的字段名一致，可以直接传入接口结果
+FIELDS = {
+    'code': ('代码', None),
+    'name': ('名称', None),
+    'industry': ('行业', None),
+    'price': ('价', 2),
+    'change_percent': ('涨跌%', 2),
+    'volume_amount': ('成交额', 'yi'),
+    'market_cap': ('市值', 'yi'),
+    'pe': ('PE', 1),
+    'pb': ('PB', 2),
+    'score': ('分', 2),
+    'institutional_score': ('分', 2),
+    'small_cap_score': ('分', 2),
+    'undervalued_score': ('分', 2),
+    'comprehensive_score': ('分', 2),
+    'strategy': ('策略', None),
+    'rank': ('名次', None),
+}
+
+
+class PromptBudgetExceeded(ValueError):
+    """必需的内容本身已超过预算。"""
+    pass
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的token数：中日韩文字每字1个，其余字符每4个约1个。
+    只用于预算控制和监控，不调用模型的计数接口。
+    """
+    wide = len(_WIDE_CHARS.findall(text))
+    return wide + math.ceil((len(text) - wide) / 4)
+
+
+def format_value(value, spec=None) -> str:
+    """按字段格式输出数值：缺失值为 -，金额以亿为单位，小数去掉末尾的0。"""
+    if value is None:
+        return '-'
+    if isinstance(value, str):
+        return value
+    value = float(value)
+    if math.isnan(value):
+        return '-'
+    if spec == 'yi':
+        value, suffix, spec = value / 1e8, '亿', 1
+    else:
+        suffix = ''
+    if spec is None:
+        spec = 2
+    text = f'{value:.{spec}f}'
+    if '.' in text:
+        text = text.rstrip('0').rstrip('.')
+    return (text if text != '-0' else '0') + suffix
+
+
+class _Section:
+    def __init__(self, name: str, priority: int, required: bool):
+        self.name = name
+        self.priority = priority
+        self.required = required
+
+    def reducible(self) -> bool:
+        return not self.required
+
+
+class _Text(_Section):
+    def __init__(self, name, text, priority, required, truncate):
+        super().__init__(name, priority, required)
+        self.text = text
+        self.kept = len(text)
+        self.truncate = truncate
+
+    def render(self) -> str:
+        if self.kept == len(self.text):
+            return self.text
+        return self.text[:self.kept] + '…' if self.kept else ''
+
+    def reduce(self, excess: int):
+        """可截断时按超出的token数按比例截短（多留出省略号的余量），否则整段移除。"""
+        if self.truncate:
+            tokens = max(estimate_tokens(self.text[:self.kept]), 1)
+            self.kept = int(self.kept * max(0.0, 1 - (excess + 1) / tokens))
+        else:
+            self.kept = 0
+
+    def dropped(self) -> int:
+        return len(self.text) - self.kept
+
+
+class _Table(_Section):
+    def __init__(self, name, title, columns, rows, priority, required, min_rows):
+        super().__init__(name, priority, required)
+        self.title = title
+        self.header = '|'.join(FIELDS.get(c, (c, None))[0] for c in columns)
+        self.lines = ['|'.join(format_value(row.get(c), FIELDS.get(c, (c, None))[1]) for c in columns) for row in rows]
+        self.total = len(self.lines)
+        self.min_rows = min_rows
+
+    def render(self) -> str:
+        if not self.lines:
+            return ''
+        more = f'\n（另有{self.total - len(self.lines)}行未列出）' if len(self.lines) < self.total else ''
+        return f"{self.title}\n{self.header}\n" + '\n'.join(self.lines) + more
+
+    def reducible(self) -> bool:
+        return bool(self.lines) and (len(self.lines) > self.min_rows or not self.required)
+
+    def reduce(self, excess: int):
+        """
+        按每行的平均token数一次去掉足够多的末尾行，但不少于min_rows行；
+        已经只剩min_rows行的非必需表格整表移除。
+        """
+        if len(self.lines) <= self.min_rows:
+            self.lines = []
+            return
+        per_row = max(1, math.ceil(estimate_tokens('\n'.join(self.lines)) / len(self.lines)))
+        keep = max(len(self.lines) - math.ceil(excess / per_row), self.min_rows)
+        self.lines = self.lines[:keep]
+
+    def dropped(self) -> int:
+        return self.total - len(self.lines)
+
+
+class Prompt:
+    """构建结果：提示词文本、估算的token数，以及为满足预算被截断的部分（段名 -> 去掉的行数或字符数）。"""
+
+    def __init__(self, text: str, estimated_tokens: int, budget: int, truncated: dict):
+        self.text = text
+        self.estimated_tokens = estimated_tokens
+        self.budget = budget
+        self.truncated = truncated
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f'<Prompt ~{self.estimated_tokens}/{self.budget} tokens, truncated={self.truncated}>'
+
+
+class PromptBuilder:
+    """
+    按token预算构建发给LLM的提示词。
+
+    股票和排名数据以紧凑的表格简写输出（表头一次、各行以 | 分隔），只包含调用方指定的列，
+    数值按字段四舍五入（金额以亿为单位）；相比直接输出DataFrame，token数通常减少一个数量级以上。
+    超出预算时按优先级从低到高截断：表格从末尾去掉行（行应按重要性排序），可截断的文本截短，
+    其余非必需的段整段移除；必需内容本身超出预算时抛出PromptBudgetExceeded。
+    各段按添加的顺序输出。
+
+    用法：
+        builder = PromptBuilder(budget=800)
+        builder.text('instruction', '请点评以下股票……', priority=100, required=True)
+        builder.table('leaders', stocks, ['code', 'name', 'change_percent', 'pe'], title='龙头股', priority=50)
+        prompt = builder.build()
+    """
+
+    def __init__(self, budget: int = DEFAULT_TOKEN_BUDGET):
+        self.budget = budget
+        self.sections = []
+
+    def text(self, name: str, text: str, priority: int = 0, required: bool = False, truncate: bool = False):
+        """添加文本段。truncate为True时超出预算可以截短，否则只能整段移除。"""
+        self.sections.append(_Text(name, text, priority, required, truncate))
+        return self
+
+    def table(self, name: str, rows, columns, title: str = None, priority: int = 0, required: bool = False,
+              min_rows: int = 0):
+        """
+        添加表格段。
+
+        Args:
+            name (str): 段名，用于报告截断情况。
+            rows (list): 字典列表（例如分析接口的结果），按重要性排序，截断时先去掉末尾的行。
+            columns (list): 输出的字段，见FIELDS；未登记的字段以字段名作列名、原样输出。
+            title (str): 表格标题，默认为段名。
+            priority (int): 优先级，数值小的先被截断。
+            required (bool): 为True时至少保留min_rows行（至少1行）。
+            min_rows (int): 截断时至少保留的行数。
+        """
+        min_rows = max(min_rows, 1) if required else min_rows
+        self.sections.append(_Table(name, title or name, list(columns), list(rows), priority, required, min_rows))
+        return self
+
+    def _render(self) -> str:
+        return '\n\n'.join(part for part in (section.render() for section in self.sections) if part)
+
+    def build(self) -> Prompt:
+        """按预算截断并返回Prompt。"""
+        text = self._render()
+        tokens = estimate_tokens(text)
+        while tokens > self.budget:
+            candidates = [s for s in self.sections if s.reducible() and s.render()]
+            if not candidates:
+                raise PromptBudgetExceeded(
+                    f"Required prompt content needs ~{tokens} tokens, over the budget of {self.budget}."
+                )
+            section = min(candidates, key=lambda s: s.priority)
+            section.reduce(tokens - self.budget)
+            text = self._render()
+            tokens = estimate_tokens(text)
+        truncated = {s.name: s.dropped() for s in self.sections if s.dropped()}
+        return Prompt(text, tokens, self.budget, truncated)
@@ -0,0 +1,298 @@
+# guzi_backend/services/quote_hub.py
+
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from ..cache import cache
+from ..database import db, read_only
+from ..models import UserWatchlist
+from . import change_feed
+from .data_service import fetch_bundle
+
+# 每个连接最多积压的消息数，超过后丢弃最旧的消息（慢客户端不会拖慢推送）
+SUBSCRIPTION_QUEUE_SIZE = 1000
+
+# 在各worker进程间通知自选股变化的Redis频道
+WATCHLIST_CHANNEL = 'guzi:watchlist-changes'
+# Redis不可用时重新连接频道的间隔（秒）
+LISTENER_RETRY_SECONDS = 10
+# 有SSE连接时检查行情是否更新的间隔（秒），与共享快照的检查间隔一致
+QUOTE_CHECK_SECONDS = 1.0
+# 未调用init_app时每个进程最多同时保持的SSE连接数，与config.Config一致
+DEFAULT_MAX_STREAMS = 8
+
+
+class TooManyStreams(Exception):
+    """当前进程的SSE连接数已达上限。"""
+    pass
+
+
+class Subscription:
+    """一个SSE连接的订阅：用户ID、关注的股票代码以及待发送的消息队列。"""
+
+    def __init__(self, user_id, symbols):
+        self.user_id = user_id
+        self.symbols = set(symbols)
+        self.messages = queue.Queue(maxsize=SUBSCRIPTION_QUEUE_SIZE)
+
+    def push(self, message: str):
+        """放入一条已序列化的消息，队列满时丢弃最旧的一条。"""
+        while True:
+            try:
+                self.messages.put_nowait(message)
+                return
+            except queue.Full:
+                try:
+                    self.messages.get_nowait()
+                except queue.Empty:
+                    pass
+
+
+class QuoteHub:
+    """
+    自选股行情推送中心。
+
+    维护“股票代码 -> 订阅连接”的反向索引。每次行情刷新只对发生变化的股票序列化一次消息，
+    再分发给订阅了该股票的连接，每次推送的开销与变化的股票数成正比，而不是连接数 × 自选股数量。
+
+    反向索引只存在于当前进程中。多worker部署时，用户的增删请求和SSE长连接可能由不同的进程处理，
+    因此自选股变化经Redis频道（WATCHLIST_CHANNEL）通知所有进程，持有该用户连接的进程从数据库重新加载其自选股；
+    Redis不可用期间改为由SSE心跳定期从数据库重新加载（见needs_resync），最多延迟一个心跳间隔。
+
+    有连接时由行情监视线程每QUOTE_CHECK_SECONDS秒检查一次行情（共享模式下为新发布的快照），
+    没有请求到达的worker也能及时推送。每个SSE连接占用一个worker线程，连接数不超过max_streams。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_symbol = defaultdict(set)
+        self._by_user = defaultdict(set)
+        self.app = None
+        self.max_streams = DEFAULT_MAX_STREAMS
+        self._listener = None
+        self._watcher = None
+        self._listening = threading.Event()
+
+    def init_app(self, app):
+        """记录应用（后台线程在其中访问数据库和行情）并读取连接数上限。"""
+        self.app = app
+        self.max_streams = app.config.get('WATCHLIST_MAX_STREAMS', DEFAULT_MAX_STREAMS)
+
+    @property
+    def stream_count(self) -> int:
+        """当前进程中打开的SSE连接数。"""
+        return sum(len(subscriptions) for subscriptions in self._by_user.values())
+
+    def subscribe(self, user_id, symbols) -> Subscription:
+        """
+        为一个新连接注册订阅。
+
+        Raises:
+            TooManyStreams: 当前进程的连接数已达max_streams。
+        """
+        subscription = Subscription(user_id, symbols)
+        with self._lock:
+            if self.stream_count >= self.max_streams:
+                raise TooManyStreams(f"This worker already serves {self.max_streams} quote streams.")
+            self._by_user[user_id].add(subscription)
+            for code in subscription.symbols:
+                self._by_symbol[code].add(subscription)
+        self._ensure_threads()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """连接断开时移除订阅。"""
+        with self._lock:
+            self._by_user[subscription.user_id].discard(subscription)
+            if not self._by_user[subscription.user_id]:
+                del self._by_user[subscription.user_id]
+            for code in subscription.symbols:
+                self._by_symbol[code].discard(subscription)
+                if not self._by_symbol[code]:
+                    del self._by_symbol[code]
+
+    def add_symbol(self, user_id, code: str):
+        """用户添加自选股后，更新其所有在线连接的订阅。"""
+        with self._lock:
+            for subscription in self._by_user.get(user_id, ()):
+                subscription.symbols.add(code)
+                self._by_symbol[code].add(subscription)
+
+    def remove_symbol(self, user_id, code: str):
+        """用户移除自选股后，更新其所有在线连接的订阅。"""
+        with self._lock:
+            for subscription in self._by_user.get(user_id, ()):
+                subscription.symbols.discard(code)
+                self._by_symbol[code].discard(subscription)
+            if code in self._by_symbol and not self._by_symbol[code]:
+                del self._by_symbol[code]
+
+    def set_symbols(self, user_id, symbols):
+        """把用户所有在线连接的订阅替换为给定的股票代码。"""
+        symbols = set(symbols)
+        with self._lock:
+            for subscription in self._by_user.get(user_id, ()):
+                for code in subscription.symbols - symbols:
+                    self._by_symbol[code].discard(subscription)
+                    if not self._by_symbol[code]:
+                        del self._by_symbol[code]
+                for code in symbols - subscription.symbols:
+                    self._by_symbol[code].add(subscription)
+                subscription.symbols = set(symbols)
+
+    def reload_user(self, user_id):
+        """从数据库重新加载用户的自选股并更新其在线连接的订阅；该用户在本进程没有连接时不查询。"""
+        if user_id not in self._by_user or self.app is None:
+            return
+        with self.app.app_context():
+            with read_only():
+                codes = [code for (code,) in db.session.query(UserWatchlist.stock_code).filter_by(user_id=user_id)]
+            db.session.remove()
+        self.set_symbols(user_id, codes)
+
+    def watchlist_changed(self, user_id, added=(), removed=()):
+        """自选股增删提交后调用：更新本进程的订阅，并通知其他worker进程。"""
+        for code in added:
+            self.add_symbol(user_id, code)
+        for code in removed:
+            self.remove_symbol(user_id, code)
+        client = cache.client
+        if client is None:
+            return # 未配置Redis或Redis故障：其他进程由SSE心跳重新加载
+        try:
+            client.publish(WATCHLIST_CHANNEL, json.dumps({'user_id': user_id, 'origin': self._origin()}))
+        except Exception as e:
+            print(f"Could not publish watchlist change for user {user_id}: {e}")
+
+    @property
+    def needs_resync(self) -> bool:
+        """未收到跨进程通知（Redis未配置或频道断开）时为True，SSE连接应定期从数据库重新加载自选股。"""
+        return not self._listening.is_set()
+
+    @staticmethod
+    def _origin() -> str:
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def _ensure_threads(self):
+        """首个SSE连接建立时启动自选股监听线程和行情监视线程（fork后的worker进程各自启动）。"""
+        if self.app is None:
+            return
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name='quote-hub-watchlist', daemon=True)
+                self._listener.start()
+            if self._watcher is None or not self._watcher.is_alive():
+                self._watcher = threading.Thread(target=self._watch_quotes, name='quote-hub-quotes', daemon=True)
+                self._watcher.start()
+
+    def _watch_quotes(self):
+        """
+        有连接时每QUOTE_CHECK_SECONDS秒读取一次行情：共享模式下挂载新发布的快照，本地模式下在行情过期时触发后台刷新。
+        新数据经change_feed回调on_spot_change推送，不必等待请求到达或SSE心跳。
+        """
+        while True:
+            time.sleep(QUOTE_CHECK_SECONDS)
+            if not self._by_symbol:
+                continue
+            try:
+                with self.app.app_context():
+                    fetch_bundle(['spot'])
+            except Exception as e:
+                print(f"Quote hub could not check spot data: {e}")
+
+    def _listen(self):
+        """订阅WATCHLIST_CHANNEL，为本进程有连接的用户重新加载自选股；断开后重连并整体重新加载一次。"""
+        while True:
+            client = cache.client
+            if client is None:
+                self._listening.clear()
+                time.sleep(LISTENER_RETRY_SECONDS)
+                continue
+            pubsub = None
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(WATCHLIST_CHANNEL)
+                self._listening.set()
+                # 断开期间可能错过通知
+                for user_id in list(self._by_user):
+                    self.reload_user(user_id)
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self._on_message(message['data'])
+            except Exception as e:
+                self._listening.clear()
+                print(f"Quote hub watchlist channel disconnected: {e}. Retrying in {LISTENER_RETRY_SECONDS}s.")
+                time.sleep(LISTENER_RETRY_SECONDS)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def _on_message(self, data):
+        try:
+            payload = json.loads(data)
+        except (TypeError, ValueError):
+            return
+        if payload.get('origin') != self._origin():
+            self.reload_user(payload.get('user_id'))
+
+    def snapshot_messages(self, symbols) -> list:
+        """生成连接建立时发送的当前行情消息。"""
+        return list(self._quote_messages(symbols).values())
+
+    def on_spot_change(self, delta):
+        """行情变化订阅回调：只为有人订阅且发生变化的股票生成一次消息并分发。"""
+        with self._lock:
+            if delta.reset:
+                symbols = list(self._by_symbol)
+            else:
+                symbols = [code for code in delta.symbols if code in self._by_symbol]
+        if not symbols:
+            return
+
+        messages = self._quote_messages(symbols)
+        with self._lock:
+            targets = [(code, list(self._by_symbol.get(code, ()))) for code in messages]
+        for code, subscriptions in targets:
+            for subscription in subscriptions:
+                subscription.push(messages[code])
+
+    def _quote_messages(self, symbols) -> dict:
+        """读取对齐后的行情，为每只股票序列化一条SSE消息。"""
+        symbols = list(symbols)
+        if not symbols:
+            return {}
+        try:
+            bundle = fetch_bundle(['spot'])
+            index, spot = bundle.index, bundle['spot']
+        except Exception as e:
+            print(f"Quote hub could not read spot data: {e}")
+            return {}
+
+        positions = index.lookup(symbols)
+        messages = {}
+        for code, pos in zip(symbols, positions):
+            if pos < 0 or not spot.present[pos]:
+                continue
+            payload = {'code': code}
+            for key, column in (('price', '最新价'), ('change_percent', '涨跌幅'),
+                                ('volume_amount', '成交额'), ('market_cap', '总市值')):
+                value = float(spot.columns[column][pos])
+                payload[key] = None if np.isnan(value) else value
+            messages[code] = f"event: quote\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+        return messages
+
+
+# 全局行情推送中心实例
+quote_hub = QuoteHub()
+change_feed.subscribe('spot', quote_hub.on_spot_change)
@@ -0,0 +1,104 @@
+# guzi_backend/services/response_cache.py
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, request
+from ..compression import compressor
+from . import change_feed
+from .data_service import fetch_bundle, refresh_interval
+
+# 最多缓存的响应数（行业龙头等接口的键来自查询参数，需要限制数量）
+RESPONSE_CACHE_SIZE = 256
+
+
+class CachedResponse:
+    """一个已序列化的响应：数据版本、状态码、JSON字节、强ETag、生成时间及各编码的预压缩字节。"""
+
+    __slots__ = ('version', 'status', 'body', 'etag', 'last_modified', 'encoded')
+
+    def __init__(self, version: tuple, status: int, body: bytes):
+        self.version = version
+        self.status = status
+        self.body = body
+        self.etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        self.last_modified = time.time()
+        self.encoded = {}
+
+    def body_for(self, encoding):
+        """返回指定编码的响应体，每个数据版本每种编码只压缩一次。"""
+        if encoding is None:
+            return self.body
+        data = self.encoded.get(encoding)
+        if data is None:
+            data = self.encoded[encoding] = compressor.compress(self.body, encoding)
+        return data
+
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+
+
+def _lookup(key, version):
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None or entry.version != version:
+            return None
+        _entries.move_to_end(key)
+        return entry
+
+
+def _store(key, entry: CachedResponse):
+    with _lock:
+        _entries[key] = entry
+        _entries.move_to_end(key)
+        while len(_entries) > RESPONSE_CACHE_SIZE:
+            _entries.popitem(last=False)
+
+
+def cached_json_response(key: tuple, datasets, build):
+    """
+    按数据版本缓存序列化后的JSON响应，并支持条件请求。
+
+    依赖的数据（股票列表及datasets）未变化时直接返回缓存的字节，不再计算也不再做JSON编码；
+    客户端携带匹配的 If-None-Match / If-Modified-Since 时返回304。
+    上游不可用、数据集回退到最近一次成功获取的数据时，附加Warning和X-Data-Stale（各数据集的数据年龄）响应头。
+    ETag由响应字节计算，同一数据版本在不同worker之间也一致；压缩后的表示在ETag后附加编码名。
+    按Accept-Encoding返回预压缩的字节，压缩开销每次数据刷新只付一次。
+
+    Args:
+        key (tuple): 缓存键，例如 ('sector-leaders', 行业名)。
+        datasets (tuple): 响应依赖的上游数据集，见data_service.DATASETS。
+        build (callable): 缓存未命中时调用，返回 (payload, status)。
+
+    Returns:
+        flask.Response: 带有ETag、Last-Modified和Cache-Control头的响应。
+    """
+    datasets = tuple(datasets)
+    bundle = fetch_bundle(datasets) # 触发过期检查和快照切换，使版本号反映最新数据
+    version = change_feed.version('stocks', *datasets)
+    # 有数据集不可用（且没有可回退的数据）时不使用缓存的响应，由build报告错误
+    entry = _lookup(key, version) if not bundle.errors else None
+    if entry is None:
+        payload, status = build()
+        entry = CachedResponse(version, status, current_app.json.dumps_bytes(payload) + b"\n")
+        _store(key, entry)
+
+    encoding = compressor.negotiate(len(entry.body))
+    response = current_app.response_class(entry.body_for(encoding), status=entry.status, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    stale = bundle.stale_ages()
+    if stale:
+        # 上游不可用，响应基于最近一次成功获取的数据：标注各数据集的数据年龄（秒）
+        response.headers['Warning'] = '110 - "Response is Stale"'
+        response.headers['X-Data-Stale'] = ', '.join(f'{name}={age}' for name, age in stale.items())
+    if entry.status == 200:
+        response.set_etag(entry.etag if encoding is None else f'{entry.etag}-{encoding}')
+        response.last_modified = entry.last_modified
+        response.cache_control.public = True
+        response.cache_control.max_age = refresh_interval(datasets)
+        response.make_conditional(request)
+    return response
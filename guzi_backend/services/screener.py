@@ -0,0 +1,328 @@
+# guzi_backend/services/screener.py
+
+import ast
+import operator
+from functools import lru_cache
+import numpy as np
+from .data_service import fetch_bundle
+
+# 可筛选的数值字段：字段名 -> (数据集, 对齐后的列名)
+NUMERIC_FIELDS = {
+    'price': ('spot', '最新价'),
+    'change_percent': ('spot', '涨跌幅'),
+    'volume_amount': ('spot', '成交额'),
+    'market_cap': ('spot', '总市值'),
+    'pe': ('valuation', '市盈率'),
+    'pb': ('valuation', '市净率'),
+}
+# 可筛选的文本字段，直接读取代码索引
+TEXT_FIELDS = ('code', 'name', 'industry')
+
+MAX_EXPRESSION_LENGTH = 1000
+MAX_LIMIT = 500
+DEFAULT_LIMIT = 50
+
+_COMPARISONS = {
+    ast.Lt: operator.lt, ast.LtE: operator.le, ast.Gt: operator.gt, ast.GtE: operator.ge,
+    ast.Eq: operator.eq, ast.NotEq: operator.ne,
+}
+_ARITHMETIC = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv}
+
+
+class ScreenerError(ValueError):
+    """筛选表达式或参数无效。"""
+    pass
+
+
+class _Columns:
+    """表达式求值时的列访问器：按字段名读取代码索引或对齐后的数据集列。"""
+
+    def __init__(self, bundle):
+        self.bundle = bundle
+        self.size = len(bundle.index)
+
+    def __call__(self, field: str) -> np.ndarray:
+        if field in NUMERIC_FIELDS:
+            dataset, column = NUMERIC_FIELDS[field]
+            return self.bundle[dataset].column(column)
+        if field == 'code':
+            return self.bundle.index.codes
+        if field == 'name':
+            return self.bundle.index.names
+        return self.bundle.index.industries
+
+
+class ScreenPlan:
+    """
+    编译后的筛选计划：由表达式树转换而来的NumPy运算闭包，以及它依赖的数据集。
+    同一表达式只解析编译一次，之后每次求值只是若干次向量化比较和按位与/或。
+    """
+
+    def __init__(self, expression: str, evaluate, fields: set):
+        self.expression = expression
+        self._evaluate = evaluate
+        self.fields = fields
+        self.datasets = tuple(sorted({NUMERIC_FIELDS[f][0] for f in fields if f in NUMERIC_FIELDS}))
+
+    def mask(self, bundle) -> np.ndarray:
+        """对代码索引中的全部股票求值，返回布尔掩码。缺失的数值（NaN）与任何数比较均不成立。"""
+        columns = _Columns(bundle)
+        try:
+            result = self._evaluate(columns)
+        except TypeError:
+            raise ScreenerError("Text fields can only be compared with strings, numeric fields with numbers.")
+        except ArithmeticError as e:
+            raise ScreenerError(f"Invalid arithmetic: {e}.")
+        if np.ndim(result) == 0:
+            return np.full(columns.size, bool(result))
+        if result.dtype != bool:
+            raise ScreenerError("Expression must evaluate to a condition.")
+        return result
+
+
+class _Expr:
+    """编译后的子表达式：求值闭包、结果类型（number / text / condition），常量子表达式还带有其值。"""
+
+    _NOT_CONSTANT = object()
+
+    def __init__(self, evaluate, kind: str, value=_NOT_CONSTANT):
+        self.evaluate = evaluate
+        self.kind = kind
+        self.value = value
+
+    @classmethod
+    def constant(cls, value, kind: str):
+        return cls(lambda columns: value, kind, value)
+
+    @property
+    def is_constant(self) -> bool:
+        return self.value is not self._NOT_CONSTANT
+
+
+def _kind_of(value) -> str:
+    return 'text' if isinstance(value, str) else 'number'
+
+
+class _Compiler:
+    """
+    把受限的Python表达式语法树编译为闭包，只允许字段、常量、比较、算术和逻辑运算。
+    编译时检查操作数类型（例如文本不能参与算术、文本字段只能与字符串比较），并折叠常量子表达式，
+    因此无效的表达式在求值前就被拒绝。
+    """
+
+    def __init__(self):
+        self.fields = set()
+
+    def compile(self, node) -> _Expr:
+        method = getattr(self, f'_compile_{type(node).__name__}', None)
+        if method is None:
+            raise ScreenerError(f"Unsupported syntax: {type(node).__name__}")
+        return method(node)
+
+    def _compile_Expression(self, node):
+        return self.compile(node.body)
+
+    def _compile_BoolOp(self, node):
+        parts = [self._condition(self.compile(value)) for value in node.values]
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+
+        def evaluate(columns):
+            result = parts[0](columns)
+            for part in parts[1:]:
+                result = combine(result, part(columns))
+            return result
+        return _Expr(evaluate, 'condition')
+
+    def _compile_UnaryOp(self, node):
+        operand = self.compile(node.operand)
+        if isinstance(node.op, ast.Not):
+            evaluate = self._condition(operand)
+            return _Expr(lambda columns: np.logical_not(evaluate(columns)), 'condition')
+        if not isinstance(node.op, (ast.USub, ast.UAdd)):
+            raise ScreenerError("Unsupported unary operator.")
+        if operand.kind != 'number':
+            raise ScreenerError("Unary + and - only apply to numbers.")
+        if isinstance(node.op, ast.UAdd):
+            return operand
+        if operand.is_constant:
+            return _Expr.constant(-operand.value, 'number')
+        evaluate = operand.evaluate
+        return _Expr(lambda columns: -evaluate(columns), 'number')
+
+    def _compile_BinOp(self, node):
+        op = _ARITHMETIC.get(type(node.op))
+        if op is None:
+            raise ScreenerError("Only + - * / are supported.")
+        left, right = self.compile(node.left), self.compile(node.right)
+        if left.kind != 'number' or right.kind != 'number':
+            raise ScreenerError("Arithmetic (+ - * /) only applies to numeric fields and numbers.")
+        if left.is_constant and right.is_constant:
+            try:
+                return _Expr.constant(op(left.value, right.value), 'number')
+            except ArithmeticError as e:
+                raise ScreenerError(f"Invalid arithmetic on constants: {e}.")
+        if right.is_constant and right.value == 0 and op is operator.truediv:
+            raise ScreenerError("Division by zero.")
+        left, right = left.evaluate, right.evaluate
+
+        def evaluate(columns):
+            with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+                return op(left(columns), right(columns))
+        return _Expr(evaluate, 'number')
+
+    def _compile_Compare(self, node):
+        # 支持链式比较，例如 10 < pe < 20
+        terms = [node.left] + list(node.comparators)
+        checks = []
+        for left_node, op_node, right_node in zip(terms, node.ops, terms[1:]):
+            left = self.compile(left_node)
+            if isinstance(op_node, (ast.In, ast.NotIn)):
+                values = self._constant_list(right_node, left.kind)
+                negate = isinstance(op_node, ast.NotIn)
+                checks.append(lambda columns, left=left.evaluate, values=values, negate=negate:
+                              np.isin(left(columns), values, invert=negate))
+                continue
+            op = _COMPARISONS.get(type(op_node))
+            if op is None:
+                raise ScreenerError("Unsupported comparison operator.")
+            right = self.compile(right_node)
+            if 'condition' in (left.kind, right.kind):
+                raise ScreenerError("Conditions cannot be compared; combine them with and / or.")
+            if left.kind != right.kind:
+                raise ScreenerError("Text fields can only be compared with strings, numeric fields with numbers.")
+
+            def check(columns, left=left.evaluate, right=right.evaluate, op=op):
+                with np.errstate(invalid='ignore'):
+                    return op(left(columns), right(columns))
+            checks.append(check)
+
+        def evaluate(columns):
+            result = checks[0](columns)
+            for check in checks[1:]:
+                result = np.logical_and(result, check(columns))
+            return result
+        return _Expr(evaluate, 'condition')
+
+    def _compile_Name(self, node):
+        field = node.id
+        if field not in NUMERIC_FIELDS and field not in TEXT_FIELDS:
+            raise ScreenerError(f"Unknown field: {field}")
+        self.fields.add(field)
+        return _Expr(lambda columns: columns(field), 'number' if field in NUMERIC_FIELDS else 'text')
+
+    def _compile_Constant(self, node):
+        value = node.value
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            raise ScreenerError(f"Unsupported constant: {value!r}")
+        return _Expr.constant(value, _kind_of(value))
+
+    @staticmethod
+    def _condition(expr: _Expr):
+        if expr.kind != 'condition':
+            raise ScreenerError("and / or / not can only combine conditions, e.g. pe < 15 and pb < 2.")
+        return expr.evaluate
+
+    def _constant_list(self, node, kind: str) -> np.ndarray:
+        if not isinstance(node, (ast.Tuple, ast.List, ast.Set)):
+            raise ScreenerError("'in' must be followed by a list of constants, e.g. industry in (\"银行\", \"保险\").")
+        if kind == 'condition':
+            raise ScreenerError("'in' can only test a field or arithmetic expression.")
+        values = []
+        for element in node.elts:
+            if not isinstance(element, ast.Constant) or isinstance(element.value, bool):
+                raise ScreenerError("'in' lists may only contain numbers or strings.")
+            if _kind_of(element.value) != kind:
+                raise ScreenerError("'in' lists must contain strings for text fields and numbers for numeric fields.")
+            values.append(element.value)
+        return np.asarray(values)
+
+
+@lru_cache(maxsize=256)
+def compile_expression(expression: str) -> ScreenPlan:
+    """
+    解析并编译筛选表达式，结果按表达式文本缓存。
+
+    语法为Python表达式的子集，例如：
+        pe < 15 and pb < 2 and industry in ("银行", "保险") and market_cap > 1e10
+
+    Raises:
+        ScreenerError: 表达式无效。
+    """
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ScreenerError(f"Expression is longer than {MAX_EXPRESSION_LENGTH} characters.")
+    try:
+        tree = ast.parse(expression, mode='eval')
+    except SyntaxError as e:
+        raise ScreenerError(f"Invalid expression: {e.msg}")
+    compiler = _Compiler()
+    expr = compiler.compile(tree)
+    if expr.kind != 'condition':
+        raise ScreenerError("Expression must evaluate to a condition.")
+    return ScreenPlan(expression, expr.evaluate, compiler.fields)
+
+
+def normalize_expression(expression: str) -> str:
+    """合并多余空白，使格式不同的相同表达式共用编译结果和缓存。"""
+    return ' '.join((expression or '').split())
+
+
+def required_datasets(expression: str, sort: str = None) -> tuple:
+    """返回表达式和排序字段依赖的上游数据集，表达式无效时抛出ScreenerError。"""
+    expression = normalize_expression(expression)
+    datasets = set(compile_expression(expression).datasets if expression else ())
+    if sort is not None:
+        if sort not in NUMERIC_FIELDS:
+            raise ScreenerError(f"Cannot sort by {sort}.")
+        datasets.add(NUMERIC_FIELDS[sort][0])
+    return tuple(sorted(datasets))
+
+
+def screen(expression: str, sort: str = None, descending: bool = True, limit: int = DEFAULT_LIMIT) -> dict:
+    """
+    按表达式筛选全市场股票，可按数值字段排序并返回前limit只。
+
+    Args:
+        expression (str): 筛选表达式，为空时选择全部股票。
+        sort (str): 排序字段（NUMERIC_FIELDS之一），为None时按代码顺序返回。
+        descending (bool): 是否降序。
+        limit (int): 最多返回的股票数，不超过MAX_LIMIT。
+
+    Returns:
+        dict: total为满足条件的股票数，stocks为结果列表（包含代码、名称、行业及已加载数据集的数值字段）。
+    """
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ScreenerError(f"limit must be between 1 and {MAX_LIMIT}.")
+    expression = normalize_expression(expression)
+    plan = compile_expression(expression) if expression else None
+    bundle = fetch_bundle(required_datasets(expression, sort))
+    index = bundle.index
+
+    mask = plan.mask(bundle) if plan else np.ones(len(index), dtype=bool)
+    positions = np.flatnonzero(mask)
+    total = len(positions)
+
+    if sort is not None and total:
+        values = bundle[NUMERIC_FIELDS[sort][0]].column(NUMERIC_FIELDS[sort][1])[positions]
+        # 缺失值始终排在最后；argpartition只对前K个做完整排序
+        keys = np.where(np.isnan(values), np.inf, -values if descending else values)
+        if total > limit:
+            top = np.argpartition(keys, limit - 1)[:limit]
+            positions = positions[top[np.argsort(keys[top], kind='stable')]]
+        else:
+            positions = positions[np.argsort(keys, kind='stable')]
+    positions = positions[:limit]
+
+    fields = [name for name, (dataset, _) in NUMERIC_FIELDS.items() if dataset in bundle]
+    stocks = []
+    for pos in positions:
+        row = {
+            'code': str(index.codes[pos]),
+            'name': str(index.names[pos]),
+            'industry': index.industry_at(pos),
+        }
+        for name in fields:
+            dataset, column = NUMERIC_FIELDS[name]
+            value = float(bundle[dataset].columns[column][pos])
+            row[name] = None if np.isnan(value) else value
+        stocks.append(row)
+    return {'total': total, 'stocks': stocks}
@@ -0,0 +1,201 @@
+# guzi_backend/services/similarity_service.py
+
+import threading
+import time
+import numpy as np
+from flask import current_app
+
+from ..database import db, read_only
+from ..models import Stock
+from . import snapshot_store
+from .bar_store import load_bar_store
+
+# 相似股索引存储格式版本，数组布局变化时递增
+SIMILARITY_FORMAT_VERSION = 1
+
+# 未配置时的默认值，与config.Config一致
+DEFAULT_WINDOW = 250
+DEFAULT_TOP_K = 50
+
+# 窗口内有效收益的天数低于该比例的股票（新股、长期停牌）不参与计算
+MIN_COVERAGE = 0.6
+
+# 分块矩阵乘法每块的股票数：每块的相关系数矩阵为 BLOCK_SIZE × 股票数 个float32
+BLOCK_SIZE = 1024
+
+
+def return_vectors(close: np.ndarray, min_coverage: float = MIN_COVERAGE):
+    """
+    由 (交易日, 股票) 收盘价矩阵计算每只股票标准化后的日对数收益向量。
+
+    每只股票的收益减去均值后缩放为单位长度，两只股票向量的点积即为二者收益的相关系数；
+    缺失的收益（停牌、未上市）按均值处理（减去均值后为0），不影响其余交易日。
+
+    Returns:
+        tuple: (股票 × 交易日的float32矩阵, 参与计算的股票掩码)。
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.diff(np.log(close), axis=0)
+    valid = np.isfinite(returns)
+    observed = valid.sum(axis=0)
+    returns = np.where(valid, returns, 0.0)
+    mean = returns.sum(axis=0) / np.maximum(observed, 1)
+    centered = np.where(valid, returns - mean, 0.0)
+    norms = np.sqrt((centered ** 2).sum(axis=0))
+    eligible = (observed >= min_coverage * len(returns)) & (norms > 0)
+
+    vectors = np.zeros((close.shape[1], len(returns)), dtype=np.float32)
+    vectors[eligible] = (centered[:, eligible] / norms[eligible]).T
+    return vectors, eligible
+
+
+def top_k_neighbors(vectors: np.ndarray, eligible: np.ndarray, k: int, block_size: int = BLOCK_SIZE,
+                    progress=None):
+    """
+    以分块矩阵乘法计算每只股票相关系数最高的k只股票。
+
+    每次取block_size只股票与全部股票相乘，内存占用与股票数成线性而不是平方关系；
+    每块内用argpartition选出前k个再排序，不对整行排序。
+
+    Returns:
+        tuple: (邻居位置 int32[股票, k], 相关系数 float32[股票, k])，按相关系数降序；
+        不参与计算的股票整行为 -1 / NaN。
+    """
+    candidates = np.flatnonzero(eligible)
+    k = min(k, max(len(candidates) - 1, 0))
+    neighbors = np.full((len(vectors), k), -1, dtype=np.int32)
+    scores = np.full((len(vectors), k), np.nan, dtype=np.float32)
+    if k == 0:
+        return neighbors, scores
+
+    matrix = np.ascontiguousarray(vectors[candidates])
+    for start in range(0, len(candidates), block_size):
+        block = matrix[start:start + block_size]
+        similarity = block @ matrix.T
+        similarity[np.arange(len(block)), np.arange(start, start + len(block))] = -np.inf # 排除自身
+        top = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(similarity, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        rows = candidates[start:start + block_size]
+        neighbors[rows] = candidates[np.take_along_axis(top, order, axis=1)]
+        scores[rows] = np.take_along_axis(top_scores, order, axis=1)
+        if progress:
+            progress(stocks_done=min(start + block_size, len(candidates)))
+    return neighbors, scores
+
+
+def build_similarity_index(window: int = None, top_k: int = None, directory: str = None, progress=None) -> dict:
+    """
+    由日线矩阵中最近window个交易日的收益计算每只股票的相似股（收益相关系数最高的top_k只），
+    发布为新的相似股索引版本。适合在每晚同步日线后运行。
+
+    Args:
+        window (int): 计算收益的交易日数，默认读取配置SIMILARITY_WINDOW。
+        top_k (int): 每只股票保存的相似股数量，默认读取配置SIMILARITY_TOP_K。
+        directory (str): 索引目录，默认使用配置中的SIMILARITY_DIR。
+        progress (callable): 进度回调，以关键字参数报告已计算的股票数。
+
+    Returns:
+        dict: 新版本号、窗口起止日期、股票数和参与计算的股票数。
+
+    Raises:
+        LookupError: 尚未同步日线矩阵。
+    """
+    window = window or current_app.config.get('SIMILARITY_WINDOW', DEFAULT_WINDOW)
+    top_k = top_k or current_app.config.get('SIMILARITY_TOP_K', DEFAULT_TOP_K)
+    directory = directory or current_app.config['SIMILARITY_DIR']
+    store = load_bar_store()
+    if store is None:
+        raise LookupError("No daily bar store found. Run `flask sync-bars` first.")
+
+    started = time.perf_counter()
+    close = np.asarray(store.field('close')[-(window + 1):], dtype=float)
+    vectors, eligible = return_vectors(close)
+    if progress:
+        progress(stocks_total=int(eligible.sum()), stocks_done=0)
+    neighbors, scores = top_k_neighbors(vectors, eligible, top_k, progress=progress)
+
+    start_date, end_date = str(store.dates[-len(close)]), str(store.dates[-1])
+    meta = {'format': SIMILARITY_FORMAT_VERSION, 'bar_version': store.version, 'window': len(close) - 1,
+            'start_date': start_date, 'end_date': end_date}
+    arrays = {'codes': store.codes, 'neighbors': neighbors, 'scores': scores}
+    version = snapshot_store.publish_snapshot(directory, arrays, meta, keep=2)
+    print(f"Published similarity index {version}: {int(eligible.sum())}/{len(store.codes)} stocks, "
+          f"{start_date} ~ {end_date}, top {neighbors.shape[1]} in {time.perf_counter() - started:.1f}s.")
+    return {'version': version, 'start_date': start_date, 'end_date': end_date,
+            'stocks': len(store.codes), 'eligible': int(eligible.sum())}
+
+
+class SimilarityIndex:
+    """已挂载的相似股索引：codes[i] 的相似股为 codes[neighbors[i]]，相关系数为 scores[i]。"""
+
+    def __init__(self, snapshot):
+        self.version = snapshot.version
+        self.meta = snapshot.meta
+        self.codes = snapshot['codes']
+        self.neighbors = snapshot['neighbors']
+        self.scores = snapshot['scores']
+        self.positions = {str(code): i for i, code in enumerate(self.codes)}
+
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def load_similarity_index(directory: str = None):
+    """挂载最新的相似股索引，同一进程内按版本复用；尚未生成时返回None。"""
+    directory = directory or current_app.config['SIMILARITY_DIR']
+    version = snapshot_store.current_version(directory)
+    if not version:
+        return None
+    with _loaded_lock:
+        index = _loaded.get((directory, version))
+        if index is None:
+            snapshot = snapshot_store.attach_snapshot(directory, version)
+            if snapshot is None or snapshot.meta.get('format') != SIMILARITY_FORMAT_VERSION:
+                return None
+            _loaded.clear() # 只保留最新版本
+            index = _loaded[(directory, version)] = SimilarityIndex(snapshot)
+    return index
+
+
+def similar_stocks(code: str, limit: int = 10, industry: str = None):
+    """
+    从预先计算的相似股索引中读取与股票收益走势最相似的股票，不在请求中计算相关系数。
+
+    Args:
+        code (str): 股票代码。
+        limit (int): 返回的数量上限，不超过索引中保存的数量。
+        industry (str): 只返回该行业（Stock.industry）的股票，为None时不限行业；在索引保存的相似股中筛选。
+
+    Returns:
+        dict | None: 索引的窗口信息和相似股列表；索引尚未生成、该股票不在索引中或未参与计算时返回None。
+    """
+    index = load_similarity_index()
+    pos = index.positions.get(code) if index is not None else None
+    if pos is None:
+        return None
+    pairs = [(str(index.codes[j]), float(score))
+             for j, score in zip(index.neighbors[pos], index.scores[pos]) if j >= 0]
+    if not pairs:
+        return None # 该股票的有效交易日不足，未参与计算
+
+    with read_only():
+        rows = (db.session.query(Stock.code, Stock.name, Stock.industry)
+                .filter(Stock.code.in_([c for c, _ in pairs]), Stock.is_active.isnot(False))
+                .all())
+    stocks = {row.code: row for row in rows}
+    peers = []
+    for peer, score in pairs:
+        row = stocks.get(peer)
+        if row is None or (industry is not None and row.industry != industry):
+            continue # 已退市，或不属于指定行业
+        peers.append({'code': peer, 'name': row.name, 'industry': row.industry, 'correlation': round(score, 4)})
+        if len(peers) >= limit:
+            break
+    return {
+        'window': index.meta['window'],
+        'start_date': index.meta['start_date'],
+        'end_date': index.meta['end_date'],
+        'peers': peers,
+    }
@@ -0,0 +1,117 @@
+# guzi_backend/services/snapshot_store.py
+
+import json
+import os
+import shutil
+import time
+import numpy as np
+
+# 指向当前快照版本的指针文件名
+CURRENT_POINTER = 'CURRENT'
+MANIFEST_FILE = 'manifest.json'
+
+
+class MarketSnapshot:
+    """
+    已挂载的市场快照。
+
+    所有数组通过 np.load(mmap_mode='r') 以只读内存映射方式打开，
+    多个worker进程挂载同一版本时共享操作系统页缓存，不产生数据拷贝。
+    """
+
+    def __init__(self, version: str, arrays: dict, meta: dict):
+        self.version = version
+        self.arrays = arrays
+        self.meta = meta
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.arrays[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.arrays
+
+
+def publish_snapshot(directory: str, arrays: dict, meta: dict = None, keep: int = 3) -> str:
+    """
+    将一组数组发布为新的快照版本。
+
+    先写入新版本目录，再原子替换CURRENT指针，读者永远不会看到写了一半的快照。
+    已挂载旧版本的进程不受影响（Linux下被删除的映射文件在解除映射前仍然有效）。
+
+    Args:
+        directory (str): 快照根目录。
+        arrays (dict): 数组名到NumPy数组的映射，数组不能是object类型。
+        meta (dict): 附加元数据，写入manifest。
+        keep (int): 保留的历史版本数量。
+
+    Returns:
+        str: 新快照的版本号。
+    """
+    os.makedirs(directory, exist_ok=True)
+    version = f"{time.time_ns():020d}"
+    staging = os.path.join(directory, f".{version}.tmp")
+    os.makedirs(staging)
+
+    for name, array in arrays.items():
+        np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(array), allow_pickle=False)
+
+    manifest = dict(meta or {})
+    manifest.update({'version': version, 'created_at': time.time(), 'arrays': sorted(arrays)})
+    with open(os.path.join(staging, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+    os.rename(staging, os.path.join(directory, version))
+    pointer_tmp = os.path.join(directory, f".{CURRENT_POINTER}.{os.getpid()}")
+    with open(pointer_tmp, 'w') as f:
+        f.write(version)
+    os.replace(pointer_tmp, os.path.join(directory, CURRENT_POINTER))
+
+    _prune(directory, keep)
+    return version
+
+
+def current_version(directory: str):
+    """读取当前快照版本号，不存在时返回None。"""
+    try:
+        with open(os.path.join(directory, CURRENT_POINTER)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def attach_snapshot(directory: str, version: str = None):
+    """
+    以只读内存映射方式挂载快照。
+
+    Args:
+        directory (str): 快照根目录。
+        version (str): 指定版本，默认挂载CURRENT指向的版本。
+
+    Returns:
+        MarketSnapshot | None: 挂载的快照，不存在时返回None。
+    """
+    version = version or current_version(directory)
+    if not version:
+        return None
+    path = os.path.join(directory, version)
+    try:
+        with open(os.path.join(path, MANIFEST_FILE), encoding='utf-8') as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r', allow_pickle=False)
+            for name in meta['arrays']
+        }
+    except (FileNotFoundError, ValueError, KeyError) as e:
+        print(f"Could not attach snapshot {version}: {e}")
+        return None
+    return MarketSnapshot(version, arrays, meta)
+
+
+def _prune(directory: str, keep: int):
+    """删除超出保留数量的旧版本目录。"""
+    versions = sorted(
+        name for name in os.listdir(directory)
+        if not name.startswith('.') and os.path.isdir(os.path.join(directory, name))
+    )
+    for name in versions[:-keep]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
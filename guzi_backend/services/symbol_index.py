@@ -0,0 +1,151 @@
+# guzi_backend/services/symbol_index.py
+
+import itertools
+import time
+import numpy as np
+from ..lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+# 索引版本号生成器，每构建一次索引递增，用于判断对齐结果是否过期
+_index_versions = itertools.count(1)
+
+
+class SymbolIndex:
+    """
+    股票代码到位置的持久索引。
+
+    以数据库中的股票列表为基准（宇宙），为每只股票分配一个固定位置。
+    上游行情、估值等数据在刷新时按此索引对齐一次，之后各策略直接按位置读取NumPy数组，
+    请求期间不再做任何基于字符串的合并（pd.merge）或哈希查找。
+    """
+
+    def __init__(self, codes, names=None, industries=None):
+        codes = list(codes)
+        self.codes = np.asarray(codes, dtype=str)
+        self.names = np.asarray(names if names is not None else [''] * len(codes), dtype=str)
+        # 行业可能为空，统一用空字符串表示，输出时再还原为None
+        self.industries = np.asarray(
+            [i or '' for i in industries] if industries is not None else [''] * len(codes),
+            dtype=str
+        )
+        self.positions = {code: pos for pos, code in enumerate(codes)}
+        self.version = next(_index_versions)
+
+    @classmethod
+    def from_arrays(cls, codes: np.ndarray, names: np.ndarray, industries: np.ndarray) -> 'SymbolIndex':
+        """
+        直接使用已有的定长字符串数组构建索引（例如内存映射的快照），不复制数组。
+        """
+        index = cls.__new__(cls)
+        index.codes = codes
+        index.names = names
+        index.industries = industries
+        index.positions = {code: pos for pos, code in enumerate(codes.tolist())}
+        index.version = next(_index_versions)
+        return index
+
+    def __len__(self):
+        return len(self.codes)
+
+    def lookup(self, codes) -> np.ndarray:
+        """将一组股票代码转换为位置数组，不在索引中的代码返回-1。"""
+        get = self.positions.get
+        return np.fromiter((get(code, -1) for code in codes), dtype=np.int64)
+
+    def industry_mask(self, industry_name: str) -> np.ndarray:
+        """返回属于指定行业的布尔掩码。"""
+        return self.industries == industry_name
+
+    def industry_at(self, pos: int):
+        """返回指定位置的行业名称，空行业返回None。"""
+        return self.industries[pos] or None
+
+    def align(self, df: 'pd.DataFrame', code_column: str, columns) -> 'AlignedFrame':
+        """
+        将上游DataFrame按本索引对齐，只做一次代码查找。
+
+        Args:
+            df (pd.DataFrame): 上游数据。
+            code_column (str): 上游数据中的股票代码列名。
+            columns (list): 需要对齐的数值列。
+
+        Returns:
+            AlignedFrame: 与索引位置一一对应的数值数组集合。
+        """
+        size = len(self)
+        present = np.zeros(size, dtype=bool)
+        aligned = {name: np.full(size, np.nan) for name in columns}
+        if df is None or df.empty or code_column not in df.columns:
+            return AlignedFrame(aligned, present, self.version)
+
+        positions = self.lookup(df[code_column].astype(str))
+        keep = positions >= 0
+        target = positions[keep]
+        present[target] = True
+        for name in columns:
+            if name in df.columns:
+                values = pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=float)
+                aligned[name][target] = values[keep]
+        return AlignedFrame(aligned, present, self.version)
+
+
+class AlignedFrame:
+    """
+    按SymbolIndex位置对齐的数值列集合，缺失值为NaN。
+    as_of为数据获取时间（Unix时间戳）；stale为True表示上游不可用，这是最近一次成功获取的数据。
+    """
+
+    def __init__(self, columns: dict, present: np.ndarray, index_version: int, as_of: float = None,
+                 stale: bool = False):
+        self.columns = columns
+        self.present = present
+        self.index_version = index_version
+        self.as_of = as_of
+        self.stale = stale
+
+    def column(self, name: str, fill: float = None) -> np.ndarray:
+        """
+        读取对齐后的列。
+
+        Args:
+            name (str): 列名。
+            fill (float): 缺失值的填充值，为None时保留NaN。
+        """
+        values = self.columns[name]
+        if fill is None:
+            return values
+        return np.where(np.isnan(values), fill, values)
+
+    def any_present(self, mask: np.ndarray = None) -> bool:
+        """判断（掩码范围内）是否存在任何上游数据。"""
+        present = self.present if mask is None else self.present[mask]
+        return bool(present.any())
+
+
+class DataBundle:
+    """
+    一次获取计划的结果：一个代码索引以及对齐到该索引的多个数据集。
+    获取失败的数据集在访问时抛出获取时的异常。
+    """
+
+    def __init__(self, index: SymbolIndex, frames: dict, errors: dict = None):
+        self.index = index
+        self.frames = frames
+        self.errors = errors or {}
+
+    def __getitem__(self, name: str) -> AlignedFrame:
+        if name in self.frames:
+            return self.frames[name]
+        raise self.errors.get(name) or KeyError(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.frames
+
+    def stale_ages(self) -> dict:
+        """回退到历史数据的数据集名到数据年龄（秒）的映射，全部为最新数据时为空。"""
+        now = time.time()
+        return {
+            name: round(now - frame.as_of, 1) if frame.as_of is not None else None
+            for name, frame in self.frames.items() if frame.stale
+        }
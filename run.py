@@ -4,6 +4,8 @@ from dotenv import load_dotenv
 load_dotenv() # 加载.env文件中的环境变量
 
 import os
+import time
+import click
 from guzi_backend import create_app, db
 from guzi_backend.models import Stock
 from guzi_backend.services import data_service
@@ -34,6 +36,114 @@ def update_stocks_command():
     with app.app_context():
         data_service.update_stock_list_in_db()
 
+@app.cli.command('jobs-worker')
+@click.option('--once', is_flag=True, help='执行完队列中的任务后退出。')
+def jobs_worker_command(once):
+    """领取并执行后台任务（POST /api/v1/admin/jobs 提交），可以同时运行多个进程。"""
+    from guzi_backend.services import job_queue
+    with app.app_context():
+        try:
+            job_queue.run_worker(once=once)
+        except KeyboardInterrupt:
+            pass
+
+@app.cli.command('enqueue-job')
+@click.argument('kind')
+@click.option('--param', 'params', multiple=True, help='任务参数，例如 --param start=2019-01-01。')
+@click.option('--priority', default=0, show_default=True, help='优先级，数值大的先执行。')
+def enqueue_job_command(kind, params, priority):
+    """提交后台任务，相同的任务已在排队或运行时不重复提交。"""
+    from guzi_backend.services import job_queue
+    values = dict(item.split('=', 1) for item in params)
+    with app.app_context():
+        try:
+            job, created = job_queue.enqueue(kind, values, priority)
+        except job_queue.JobError as e:
+            raise click.ClickException(str(e))
+        print(f"Job {job.id} {'queued' if created else 'already ' + job.status}.")
+
+@app.cli.command('generate-commentary')
+@click.option('--date', 'batch_date', default=None, help='批次日期（YYYY-MM-DD），默认为今天。')
+@click.option('--concurrency', default=None, type=int, help='同时进行的模型请求数，默认读取COMMENTARY_CONCURRENCY。')
+def generate_commentary_command(batch_date, concurrency):
+    """为所有用户的自选股（按股票去重）批量生成AI点评，适合每晚由cron运行；中断后重新运行会从未完成的股票继续。"""
+    from datetime import date
+    from guzi_backend.services import commentary_service
+    with app.app_context():
+        commentary_service.generate_watchlist_commentary(
+            date.fromisoformat(batch_date) if batch_date else None, concurrency
+        )
+
+@app.cli.command('refresh-snapshot')
+@click.option('--once', is_flag=True, help='只发布一次快照后退出。')
+def refresh_snapshot_command(once):
+    """作为唯一的刷新进程，定期获取市场数据并发布共享快照供各worker挂载；行业映射按INDUSTRY_MAP_REFRESH_SECONDS在后台单独刷新。"""
+    interval = app.config['SNAPSHOT_REFRESH_SECONDS']
+    with app.app_context():
+        while True:
+            try:
+                data_service.publish_market_snapshot()
+            except Exception as e:
+                print(f"Snapshot refresh failed: {e}")
+            if once:
+                break
+            time.sleep(interval)
+
+@app.cli.command('sync-bars')
+@click.option('--start', required=True, help='开始日期，例如 2019-01-01。')
+@click.option('--end', default=None, help='结束日期，默认为今天。')
+@click.option('--workers', default=8, show_default=True, help='并发请求数。')
+def sync_bars_command(start, end, workers):
+    """从数据源同步全市场日线行情和估值历史，生成回测使用的日线矩阵。"""
+    from guzi_backend.services import bar_store
+    with app.app_context():
+        bar_store.sync_bar_store(start, end, workers=workers)
+
+@app.cli.command('build-similar')
+@click.option('--window', default=None, type=int, help='计算收益相关性的交易日数，默认读取SIMILARITY_WINDOW。')
+@click.option('--top-k', default=None, type=int, help='每只股票保存的相似股数量，默认读取SIMILARITY_TOP_K。')
+def build_similar_command(window, top_k):
+    """由日线矩阵计算每只股票的相似股索引，供 /api/v1/stocks/<code>/similar 使用，适合每晚同步日线后运行。"""
+    from guzi_backend.services import similarity_service
+    with app.app_context():
+        similarity_service.build_similarity_index(window, top_k)
+
+@app.cli.command('backtest')
+@click.option('--strategy', required=True,
+              type=click.Choice(['sector_leaders', 'institutional', 'small_cap', 'undervalued', 'comprehensive']))
+@click.option('--start', default=None, help='开始日期，默认为日线数据的第一天。')
+@click.option('--end', default=None, help='结束日期，默认为日线数据的最后一天。')
+@click.option('--rebalance-days', default=20, show_default=True, help='调仓间隔（交易日）。')
+@click.option('--cost-bps', default=15.0, show_default=True, help='单边交易成本（基点）。')
+@click.option('--param', 'grid', multiple=True, help='参数取值，例如 --param top_n=10,20 --param w_pe=0.3,0.7，多个参数取笛卡尔积。')
+@click.option('--workers', default=None, type=int, help='进程数，默认为CPU核心数。')
+def backtest_command(strategy, start, end, rebalance_days, cost_bps, grid, workers):
+    """回测内置排名策略，多组参数在进程池中并行运行。"""
+    import itertools
+    from guzi_backend.services import backtest_service
+    names, values = [], []
+    for item in grid:
+        name, _, choices = item.partition('=')
+        names.append(name.strip())
+        values.append([v.strip() for v in choices.split(',') if v.strip()])
+    param_sets = [dict(zip(names, combo)) for combo in itertools.product(*values)]
+
+    started = time.perf_counter()
+    results = backtest_service.run_parameter_sweep(
+        app.config['BAR_STORE_DIR'], strategy, param_sets, workers=workers,
+        start=start, end=end, rebalance_days=rebalance_days, cost_bps=cost_bps
+    )
+    for result in results:
+        stats = result['stats']
+        print(f"{result['params']}\n  {result['start']} ~ {result['end']}, {result['rebalances']} rebalances, "
+              f"turnover {result['average_turnover']:.1%}: total {stats['total_return']:.1%}, "
+              f"annual {stats['annual_return']:.1%}, vol {stats['annual_volatility']:.1%}, "
+              f"sharpe {stats['sharpe']}, max drawdown {stats['max_drawdown']:.1%} "
+              f"(benchmark annual {result['benchmark']['annual_return']:.1%})")
+    print(f"{len(results)} backtests finished in {time.perf_counter() - started:.1f}s.")
+    for limitation in backtest_service.BACKTEST_LIMITATIONS:
+        print(f"Note: {limitation}")
+
 if __name__ == '__main__':
     # 启动开发服务器
     app.run(debug=True, port=5000)
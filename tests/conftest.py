@@ -0,0 +1,41 @@
+# tests/conftest.py
+# 需要应用和数据库的测试共用的夹具：每个测试使用临时目录中的SQLite数据库，只使用进程内缓存。
+
+import pytest
+
+from guzi_backend import create_app, db
+from guzi_backend.config import TestingConfig
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """
+    返回创建测试应用的函数，关键字参数覆盖TestingConfig中的配置（在扩展初始化之前生效）。
+    默认使用 tmp_path/primary.db 作为主库并在其中创建所有表（其他绑定的库由测试自行创建）。
+    """
+    apps = []
+
+    def make(**overrides):
+        settings = {
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'primary.db'),
+            'SQLALCHEMY_BINDS': {},
+            'SNAPSHOT_DIR': str(tmp_path / 'snapshots'),
+            'SNAPSHOT_WARM_START': False,
+            'REDIS_URL': '',
+            'GEMINI_API_KEY': None,
+        }
+        settings.update(overrides)
+        for name, value in settings.items():
+            monkeypatch.setattr(TestingConfig, name, value, raising=False)
+        app = create_app('testing')
+        with app.app_context():
+            db.create_all(bind_key=None)
+        apps.append(app)
+        return app
+
+    yield make
+    for app in apps:
+        with app.app_context():
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
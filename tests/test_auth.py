@@ -0,0 +1,63 @@
+# tests/test_auth.py
+# 登录接口的测试：未知用户名与已知用户名同样执行一次密码校验，哈希线程池已满时两者都返回503。
+#
+# 用法：python -m pytest tests
+
+import pytest
+
+from guzi_backend import db
+from guzi_backend.models import User
+from guzi_backend.services import password_service
+from guzi_backend.services.password_service import password_hasher
+
+
+@pytest.fixture
+def client(make_app):
+    app = make_app(PASSWORD_HASH_METHOD='pbkdf2:sha256:1000', PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_MAX_PENDING=1)
+    with app.app_context():
+        user = User(username='alice', email='alice@example.com')
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+    return app.test_client()
+
+
+@pytest.fixture
+def verified(monkeypatch):
+    """记录每次校验使用的哈希参数。"""
+    calls = []
+    original = password_service.check_password_hash
+
+    def check(password_hash, password):
+        calls.append(password_hash.split('$', 1)[0])
+        return original(password_hash, password)
+
+    monkeypatch.setattr(password_service, 'check_password_hash', check)
+    return calls
+
+
+def login(client, username, password):
+    return client.post('/api/v1/auth/login', json={'username': username, 'password': password})
+
+
+@pytest.mark.parametrize('username, password, status', [
+    ('alice', 'secret', 200),
+    ('alice', 'wrong', 401),
+    ('nobody', 'secret', 401),
+])
+def test_login_always_verifies_one_hash(client, verified, username, password, status):
+    response = login(client, username, password)
+    assert response.status_code == status
+    assert verified == ['pbkdf2:sha256:1000']
+
+
+def test_unknown_user_is_rejected_when_hash_pool_is_saturated(client):
+    # 占住唯一的排队名额
+    password_hasher._slots.acquire()
+    try:
+        for username in ('alice', 'nobody'):
+            response = login(client, username, 'secret')
+            assert response.status_code == 503
+            assert response.get_json()['code'] == 50301
+    finally:
+        password_hasher._slots.release()
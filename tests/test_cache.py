@@ -0,0 +1,138 @@
+# tests/test_cache.py
+# CacheStore 的测试，使用fakeredis代替redis-server（pip install pytest fakeredis）。
+#
+# 用法：python -m pytest tests
+
+import importlib
+
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+
+from guzi_backend.cache import DEFAULT_EXPIRATION_SECONDS, CacheStore
+
+# guzi_backend.cache 在包中被同名的全局实例遮蔽，按模块名导入
+cache_module = importlib.import_module('guzi_backend.cache')
+
+
+class FakeClock:
+    """替换缓存模块中的time，手动推进时间以测试故障回退期。"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache_module, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def client(server):
+    return fakeredis.FakeRedis(server=server, decode_responses=True)
+
+
+@pytest.fixture
+def store(client, clock):
+    store = CacheStore()
+    store.config['REDIS_RETRY_SECONDS'] = 30
+    store.use_client(client)
+    return store
+
+
+def record_commands(client):
+    """记录客户端直接发出的命令名（流水线中的命令不经过execute_command）。"""
+    commands = []
+    execute = client.execute_command
+
+    def spy(*args, **kwargs):
+        commands.append(args[0])
+        return execute(*args, **kwargs)
+    client.execute_command = spy
+    return commands
+
+
+def test_get_many_uses_single_mget(store, client):
+    client.set('a', '1')
+    client.set('b', '{"x": 2}')
+    commands = record_commands(client)
+
+    assert store.get_many(['a', 'b', 'missing']) == {'a': 1, 'b': {'x': 2}}
+    assert commands == ['MGET']
+
+
+def test_get_many_empty_keys_skips_redis(store, client):
+    commands = record_commands(client)
+
+    assert store.get_many([]) == {}
+    assert commands == []
+
+
+def test_set_many_uses_pipeline_with_per_key_ttl(store, client, monkeypatch):
+    pipelines = []
+    pipeline = client.pipeline
+
+    def spy(*args, **kwargs):
+        pipelines.append(kwargs)
+        return pipeline(*args, **kwargs)
+    monkeypatch.setattr(client, 'pipeline', spy)
+    commands = record_commands(client)
+
+    store.set_many({'a': [1, 2], 'b': 'text'}, {'a': 10})
+
+    assert pipelines == [{'transaction': False}]
+    assert commands == [] # 全部写入都在流水线中完成
+    assert 9 <= client.ttl('a') <= 10
+    assert DEFAULT_EXPIRATION_SECONDS - 1 <= client.ttl('b') <= DEFAULT_EXPIRATION_SECONDS
+    assert store.get_many(['a', 'b']) == {'a': [1, 2], 'b': 'text'}
+
+
+def test_falls_back_to_local_memory_and_recovers(store, server, client, clock):
+    server.connected = False
+    store.set('a', {'v': 1}, expiration=60)
+
+    # Redis不可用：写入进程内缓存，回退期内即使Redis恢复也不再访问
+    assert store.client is None
+    assert store.local['a']['data'] == {'v': 1}
+    server.connected = True
+    commands = record_commands(client)
+    assert store.get('a', expiration=60) == {'v': 1}
+    assert commands == []
+
+    # 超过REDIS_RETRY_SECONDS后恢复使用Redis
+    clock.now += 31
+    assert store.client is client
+    store.set('b', 2)
+    assert store.get('b') == 2
+    assert commands == ['MGET']
+    assert client.get('b') == '2'
+
+
+def test_read_error_falls_back_to_local_memory(store, server):
+    store.local.clear()
+    store._local_set('a', 'local')
+    server.connected = False
+
+    assert store.get('a') == 'local'
+    assert store.client is None
+
+
+def test_local_memory_honours_expiration(store, server, clock):
+    server.connected = False
+    store.set('a', 1, expiration=60)
+
+    clock.now += 61
+    assert store.get('a', expiration=60) is None
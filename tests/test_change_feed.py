@@ -0,0 +1,161 @@
+# tests/test_change_feed.py
+# 变化检测与发布的测试：行哈希比较、对齐数据比较（含reset）、发布/订阅，以及股票列表同步只写入变化的行。
+#
+# 用法：python -m pytest tests
+
+from collections import defaultdict
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from guzi_backend import db
+from guzi_backend.cache import cache
+from guzi_backend.models import Stock
+from guzi_backend.services import change_feed, data_service
+from guzi_backend.services.change_feed import Delta
+from guzi_backend.services.symbol_index import SymbolIndex
+
+
+@pytest.fixture(autouse=True)
+def feed(monkeypatch):
+    """每个测试使用独立的订阅者和版本号，返回收到的变化列表。"""
+    monkeypatch.setattr(change_feed, '_subscribers', defaultdict(list))
+    monkeypatch.setattr(change_feed, '_versions', defaultdict(int))
+    received = []
+    for table in ('stocks', 'spot'):
+        change_feed.subscribe(table, received.append)
+    return received
+
+
+def hashes(rows):
+    return change_feed.hash_rows(pd.DataFrame(rows, columns=['code', 'name', 'industry']), ['name', 'industry'])
+
+
+def test_hash_rows_depends_only_on_selected_columns():
+    a = hashes([('600000', '浦发银行', '银行')])
+    b = hashes([('600001', '浦发银行', '银行')])
+    c = hashes([('600000', '浦发银行', '保险')])
+    assert a[0] == b[0] != c[0]
+    assert change_feed.hash_rows(pd.DataFrame(columns=['name', 'industry']), ['name', 'industry']).size == 0
+
+
+def test_diff_keyed_reports_added_removed_and_changed():
+    previous = [('600000', '浦发银行', '银行'), ('600001', '白云机场', '机场'), ('600002', '东风汽车', '汽车')]
+    current = [('600000', '浦发银行', '银行'), ('600002', '东风汽车', '汽车零部件'), ('600003', '中国国贸', None)]
+    delta = change_feed.diff_keyed(
+        'stocks',
+        [r[0] for r in previous], hashes(previous),
+        [r[0] for r in current], hashes([(c, n, i or '') for c, n, i in current]),
+    )
+
+    assert (delta.added, delta.removed, delta.changed) == (['600003'], ['600001'], ['600002'])
+    assert delta.symbols == {'600001', '600002', '600003'}
+    assert not delta.reset
+
+
+def test_diff_keyed_without_changes_is_empty():
+    rows = [('600000', '浦发银行', '银行')]
+    delta = change_feed.diff_keyed('stocks', ['600000'], hashes(rows), ['600000'], hashes(rows))
+    assert not delta
+
+
+def aligned(index, prices, codes=None):
+    codes = codes or list(index.codes)
+    return index.align(pd.DataFrame({'代码': codes, '最新价': prices}), '代码', ['最新价'])
+
+
+def test_diff_aligned_reports_changed_values_and_presence():
+    index = SymbolIndex(['600000', '600001', '600002', '600003'])
+    old = aligned(index, [10.0, np.nan, 5.0], ['600000', '600001', '600002'])
+    new = aligned(index, [10.0, np.nan, 6.0, 1.0], ['600000', '600001', '600002', '600003'])
+
+    delta = change_feed.diff_aligned('spot', index, old, index, new)
+
+    # NaN与NaN视为相等；新出现的行情和变化的价格都算作变化
+    assert delta.changed == ['600002', '600003']
+    assert not delta.reset
+
+
+@pytest.mark.parametrize('case', ['no_previous', 'index_changed', 'column_missing'])
+def test_diff_aligned_resets_when_no_increment_is_possible(case):
+    index = SymbolIndex(['600000', '600001'])
+    new = aligned(index, [1.0, 2.0])
+    old_index, old = index, aligned(index, [1.0, 2.0])
+    if case == 'no_previous':
+        old = None
+    elif case == 'index_changed':
+        old_index = SymbolIndex(['600000', '600009'])
+    else:
+        old = index.align(pd.DataFrame({'代码': ['600000'], '涨跌幅': [1.0]}), '代码', ['涨跌幅'])
+
+    delta = change_feed.diff_aligned('spot', old_index, old, index, new)
+    assert delta.reset and delta
+    assert repr(delta) == '<Delta spot reset>'
+
+
+def test_publish_skips_empty_deltas_and_bumps_versions(feed):
+    change_feed.publish(Delta('spot'))
+    assert feed == [] and change_feed.version('spot') == (0,)
+
+    delta = Delta('spot', changed=['600000'])
+    change_feed.publish(delta)
+    change_feed.publish(Delta('spot', reset=True))
+    assert feed[0] is delta and feed[1].reset
+    assert change_feed.version('spot', 'stocks') == (2, 0)
+
+
+def test_failing_subscriber_does_not_block_others(feed):
+    def broken(delta):
+        raise RuntimeError('boom')
+    change_feed._subscribers['spot'].insert(0, broken)
+
+    change_feed.publish(Delta('spot', changed=['600000']))
+    assert len(feed) == 1
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """替换akshare，返回可修改的上游股票列表和行业映射。"""
+    state = {'stocks': [], 'industries': {}}
+
+    def industry_cons(symbol):
+        return pd.DataFrame({'代码': [code for code, name in state['industries'].items() if name == symbol]})
+
+    monkeypatch.setattr(data_service, 'ak', SimpleNamespace(
+        stock_info_a_code_name=lambda: pd.DataFrame(state['stocks'], columns=['code', 'name']),
+        stock_board_industry_name_em=lambda: pd.DataFrame({'板块名称': sorted(set(state['industries'].values()))}),
+        stock_board_industry_cons_em=industry_cons,
+    ))
+    cache.local.clear()
+    yield state
+    cache.local.clear()
+
+
+def test_update_stock_list_writes_only_changed_rows(make_app, upstream, feed):
+    app = make_app()
+    with app.app_context():
+        upstream['stocks'] = [('600000', '浦发银行'), ('600001', '白云机场')]
+        upstream['industries'] = {'600000': '银行', '600001': '机场'}
+        assert data_service.update_stock_list_in_db() == {'compared': 2, 'added': 2, 'changed': 0, 'deactivated': 0}
+        assert feed[-1].added == ['600000', '600001']
+
+        # 没有变化时不写入、不发布
+        cache.local.clear()
+        feed.clear()
+        assert data_service.update_stock_list_in_db() == {'compared': 2, 'added': 0, 'changed': 0, 'deactivated': 0}
+        assert feed == []
+
+        # 行业变化、新股上市、旧股退市
+        cache.local.clear()
+        upstream['stocks'] = [('600000', '浦发银行'), ('600002', '东风汽车')]
+        upstream['industries'] = {'600000': '股份制银行', '600002': '汽车'}
+        assert data_service.update_stock_list_in_db() == {'compared': 2, 'added': 1, 'changed': 1, 'deactivated': 1}
+        delta = feed[-1]
+        assert (delta.added, delta.changed, delta.removed) == (['600002'], ['600000'], ['600001'])
+
+        stocks = {stock.code: stock for stock in db.session.query(Stock)}
+        assert stocks['600000'].industry == '股份制银行'
+        assert stocks['600001'].is_active is False
+        assert stocks['600002'].is_active is True
@@ -0,0 +1,97 @@
+# tests/test_commentary.py
+# 自选股AI点评的测试：批量生成时单只股票失败保留旧点评，接口通过stale标记返回。
+#
+# 用法：python -m pytest tests
+
+from datetime import date
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from guzi_backend import db
+from guzi_backend.models import Stock, StockCommentary, User, UserWatchlist
+from guzi_backend.services import commentary_service
+from guzi_backend.services.symbol_index import DataBundle, SymbolIndex
+
+CODES = ['600000', '600001']
+
+
+class FakeAdapter:
+    model_name = 'fake-model'
+
+    def __init__(self):
+        self.failing = set()
+
+    async def generate_text_async(self, prompt):
+        code = next(code for code in CODES if code in prompt)
+        if code in self.failing:
+            raise RuntimeError('upstream error')
+        return f'{code} summary'
+
+
+@pytest.fixture
+def adapter(monkeypatch):
+    adapter = FakeAdapter()
+    monkeypatch.setattr(commentary_service, 'ai_manager', SimpleNamespace(get_adapter=lambda service: adapter))
+    return adapter
+
+
+@pytest.fixture
+def prices(monkeypatch):
+    """替换行情和估值数据，返回可修改的最新价。"""
+    state = {'600000': 10.0, '600001': 20.0}
+
+    def fetch_bundle(names):
+        index = SymbolIndex(CODES, ['浦发银行', '白云机场'], ['银行', '机场'])
+        spot = index.align(pd.DataFrame({
+            '代码': CODES, '最新价': [state[c] for c in CODES], '涨跌幅': [1.0, -1.0],
+            '成交额': [1e8, 2e8], '总市值': [3e11, 4e10],
+        }), '代码', ['最新价', '涨跌幅', '成交额', '总市值'])
+        valuation = index.align(pd.DataFrame({'股票代码': CODES, '市盈率': [5.0, 30.0], '市净率': [0.5, 3.0]}),
+                                '股票代码', ['市盈率', '市净率'])
+        return DataBundle(index, {'spot': spot, 'valuation': valuation})
+
+    monkeypatch.setattr(commentary_service, 'fetch_bundle', fetch_bundle)
+    return state
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app(COMMENTARY_MAX_ATTEMPTS=1)
+    with app.app_context():
+        db.session.add(User(id=1, username='alice', email='alice@example.com', password_hash='x'))
+        db.session.add_all([Stock(code=code, name=code, market='SH') for code in CODES])
+        db.session.add_all([UserWatchlist(user_id=1, stock_code=code) for code in CODES])
+        db.session.commit()
+        yield app
+
+
+def summary(app, code):
+    return app.test_client().get(f'/api/v1/stocks/{code}/ai-summary').get_json()['data']
+
+
+def test_failed_regeneration_marks_previous_summary_stale(app, adapter, prices):
+    first = commentary_service.generate_watchlist_commentary(date(2026, 1, 5))
+    assert (first['generated'], first['failed']) == (2, 0)
+    assert summary(app, '600000')['stale'] is False
+
+    prices['600000'], prices['600001'] = 11.0, 21.0
+    adapter.failing.add('600001')
+    second = commentary_service.generate_watchlist_commentary(date(2026, 1, 6))
+    assert (second['generated'], second['failed'], second['failed_codes']) == (1, 1, ['600001'])
+
+    fresh, stale = summary(app, '600000'), summary(app, '600001')
+    assert (fresh['batch_date'], fresh['stale']) == ('2026-01-06', False)
+    assert (stale['batch_date'], stale['stale']) == ('2026-01-05', True)
+    assert stale['summary'].startswith('600001 summary')
+
+
+def test_unchanged_prompt_is_not_stale(app, adapter, prices):
+    commentary_service.generate_watchlist_commentary(date(2026, 1, 5))
+    adapter.failing.update(CODES)  # 数据未变化时不调用模型
+    counts = commentary_service.generate_watchlist_commentary(date(2026, 1, 6))
+
+    assert (counts['unchanged'], counts['failed']) == (2, 0)
+    assert summary(app, '600001')['stale'] is False
+    assert db.session.get(StockCommentary, '600001').batch_date == date(2026, 1, 6)
@@ -0,0 +1,145 @@
+# tests/test_database.py
+# 读写分离会话（RoutingSession / read_only）的测试，主库和只读副本分别为两个SQLite文件。
+#
+# 用法：python -m pytest tests
+
+import importlib
+
+import pytest
+from sqlalchemy import text
+
+from guzi_backend import db
+from guzi_backend.database import read_only
+from guzi_backend.models import Stock
+
+database_module = importlib.import_module('guzi_backend.database')
+
+
+class FakeClock:
+    """替换database模块中的time，手动推进时间以测试写入后的粘滞窗口。"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(database_module, 'time', clock)
+    monkeypatch.setattr(database_module, '_recent_writes', {})
+    return clock
+
+
+@pytest.fixture
+def app(make_app, tmp_path):
+    app = make_app(SQLALCHEMY_BINDS={'replica': 'sqlite:///' + str(tmp_path / 'replica.db')},
+                   REPLICA_STICKY_SECONDS=5)
+    with app.app_context():
+        db.metadata.create_all(db.engines['replica'])
+        # 直接写入两个库（不经过会话，不算作调用方的写入），同一只股票在主库和副本中名称不同
+        for key, name in ((None, '主库'), ('replica', '副本')):
+            with db.engines[key].begin() as connection:
+                connection.execute(text(
+                    "INSERT INTO stocks (code, name, market, is_active) VALUES ('600000', :name, 'SH', 1)"
+                ), {'name': name})
+    return app
+
+
+def stock_name(code='600000'):
+    return db.session.query(Stock.name).filter_by(code=code).scalar()
+
+
+def stored_codes(key):
+    with db.engines[key].connect() as connection:
+        return {code for (code,) in connection.execute(text("SELECT code FROM stocks"))}
+
+
+def test_reads_outside_read_only_use_primary(app):
+    with app.app_context():
+        assert stock_name() == '主库'
+
+
+def test_read_only_reads_from_replica(app):
+    with app.app_context():
+        with read_only():
+            assert stock_name() == '副本'
+        assert stock_name() == '主库'
+
+
+def test_read_only_decorator_reads_from_replica(app):
+    @read_only()
+    def load():
+        return stock_name()
+
+    with app.app_context():
+        assert load() == '副本'
+
+
+def test_writes_go_to_primary(app):
+    with app.app_context():
+        db.session.add(Stock(code='600001', name='新股', market='SH'))
+        db.session.commit()
+        assert stored_codes(None) == {'600000', '600001'}
+        assert stored_codes('replica') == {'600000'}
+
+
+def test_flush_inside_read_only_goes_to_primary(app):
+    with app.app_context():
+        with read_only():
+            db.session.add(Stock(code='600001', name='新股', market='SH'))
+            db.session.flush()
+        db.session.commit()
+        assert stored_codes(None) == {'600000', '600001'}
+        assert stored_codes('replica') == {'600000'}
+
+
+def test_reads_after_write_in_same_request_stay_on_primary(app, clock):
+    with app.test_request_context(environ_base={'REMOTE_ADDR': '10.0.0.1'}):
+        db.session.add(Stock(code='600001', name='新股', market='SH'))
+        db.session.commit()
+        with read_only():
+            assert stock_name() == '主库'
+            assert stock_name('600001') == '新股'
+
+    # 其他调用方不受影响
+    with app.test_request_context(environ_base={'REMOTE_ADDR': '10.0.0.2'}):
+        with read_only():
+            assert stock_name() == '副本'
+
+    # 超过REPLICA_STICKY_SECONDS后恢复读取副本
+    clock.now += 6
+    with app.test_request_context(environ_base={'REMOTE_ADDR': '10.0.0.1'}):
+        with read_only():
+            assert stock_name() == '副本'
+
+
+def test_background_write_keeps_all_callers_on_primary(app, clock):
+    with app.app_context():
+        db.session.add(Stock(code='600001', name='新股', market='SH'))
+        db.session.commit()
+
+    with app.test_request_context(environ_base={'REMOTE_ADDR': '10.0.0.2'}):
+        with read_only():
+            assert stock_name() == '主库'
+
+
+def test_rolled_back_write_is_not_sticky(app):
+    with app.test_request_context(environ_base={'REMOTE_ADDR': '10.0.0.1'}):
+        db.session.add(Stock(code='600001', name='新股', market='SH'))
+        db.session.flush()
+        db.session.rollback()
+        with read_only():
+            assert stock_name() == '副本'
+
+
+def test_read_only_without_replica_uses_primary(make_app):
+    app = make_app()
+    with app.app_context():
+        db.session.add(Stock(code='600000', name='主库', market='SH'))
+        db.session.commit()
+        database_module._recent_writes.clear()
+        with read_only():
+            assert stock_name() == '主库'
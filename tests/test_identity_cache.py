@@ -0,0 +1,84 @@
+# tests/test_identity_cache.py
+# 身份缓存的测试：命中与过期、写入时清除过期条目、容量上限，以及用户变更时失效。
+#
+# 用法：python -m pytest tests
+
+import pytest
+
+from guzi_backend import db
+from guzi_backend.models import User
+from guzi_backend.services import identity_cache as identity_module
+from guzi_backend.services.identity_cache import IdentityCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可手动推进的单调时钟。"""
+    now = [1000.0]
+    monkeypatch.setattr(identity_module.time, 'monotonic', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    with app.app_context():
+        db.session.add_all([User(id=i, username=f'user{i}', email=f'user{i}@example.com', password_hash='x')
+                            for i in range(1, 6)])
+        db.session.commit()
+        yield app
+
+
+def test_load_caches_identity_until_ttl(app, clock):
+    cache = IdentityCache(ttl=30)
+    identity = cache.load('1')
+    assert identity.username == 'user1'
+
+    db.session.query(User).filter_by(id=1).update({'username': 'renamed'})  # 批量更新不触发失效
+    db.session.commit()
+    assert cache.load(1) is identity
+
+    clock[0] += 31
+    assert cache.load('1').username == 'renamed'
+
+
+def test_missing_and_invalid_subjects(app, clock):
+    cache = IdentityCache()
+    assert cache.load('99') is None
+    assert cache.load('not-a-number') is None
+    assert len(cache) == 1  # 不存在的用户也缓存，无效的sub不缓存
+
+
+def test_insert_sweeps_expired_entries(app, clock):
+    cache = IdentityCache(ttl=30)
+    for sub in ('1', '2', '3'):
+        cache.load(sub)
+        clock[0] += 10
+    # 此时'1'恰好过期，'2'、'3'仍有效
+    cache.load('4')
+    assert list(cache._entries) == ['2', '3', '4']
+
+
+def test_size_is_bounded(app, clock):
+    cache = IdentityCache(ttl=30, max_entries=2)
+    cache.load('1')
+    cache.load('2')
+    clock[0] += 31
+    cache.load('2')  # 过期后重新写入的'2'排在最后
+    assert list(cache._entries) == ['2']
+    cache.load('3')
+    cache.load('4')
+    assert list(cache._entries) == ['3', '4']
+
+
+def test_orm_changes_invalidate_global_cache(app, clock):
+    identity_module.identity_cache.clear()
+    assert identity_module.identity_cache.load('1').username == 'user1'
+
+    db.session.get(User, 1).username = 'changed'
+    db.session.commit()
+    assert identity_module.identity_cache.load('1').username == 'changed'
+
+    db.session.delete(db.session.get(User, 1))
+    db.session.commit()
+    assert identity_module.identity_cache.load('1') is None
@@ -0,0 +1,168 @@
+# tests/test_job_queue.py
+# 数据库任务队列的测试：去重提交、并发领取、失去心跳的任务重新排队，使用内存SQLite数据库。
+#
+# 用法：python -m pytest tests
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, text, update
+from sqlalchemy.exc import IntegrityError
+
+from guzi_backend import db
+from guzi_backend.database import RoutingSession
+from guzi_backend.models import Job
+from guzi_backend.services import job_queue
+
+
+@pytest.fixture
+def app(make_app, monkeypatch):
+    monkeypatch.setitem(job_queue.JOB_HANDLERS, 'echo', lambda progress, value=None: {'value': value})
+    app = make_app(SQLALCHEMY_DATABASE_URI='sqlite://', JOB_STALE_SECONDS=300, JOB_MAX_ATTEMPTS=3)
+    with app.app_context():
+        yield app
+
+
+def test_enqueue_deduplicates_active_jobs(app):
+    job, created = job_queue.enqueue('echo', {'value': 1})
+    same, created_again = job_queue.enqueue('echo', {'value': 1})
+    other, created_other = job_queue.enqueue('echo', {'value': 2})
+
+    assert created and not created_again and created_other
+    assert same.id == job.id
+    assert other.id != job.id
+    assert Job.query.count() == 2
+
+
+def test_enqueue_raises_priority_of_queued_duplicate(app):
+    job, _ = job_queue.enqueue('echo', {'value': 1}, priority=0)
+    same, created = job_queue.enqueue('echo', {'value': 1}, priority=5)
+
+    assert not created
+    assert same.id == job.id and same.priority == 5
+
+
+def test_enqueue_does_not_change_priority_of_running_duplicate(app):
+    job, _ = job_queue.enqueue('echo', {'value': 1}, priority=0)
+    job_queue.claim_next_job('worker-a')
+    same, created = job_queue.enqueue('echo', {'value': 1}, priority=5)
+
+    assert not created
+    assert same.id == job.id and same.priority == 0
+
+
+def test_enqueue_after_job_finished_creates_new_job(app):
+    job, _ = job_queue.enqueue('echo', {'value': 1})
+    claimed = job_queue.claim_next_job('worker-a')
+    assert job_queue.run_job(claimed, 'worker-a') == 'succeeded'
+
+    again, created = job_queue.enqueue('echo', {'value': 1})
+    assert created and again.id != job.id
+    assert job_queue.get_job(job.id).result == {'value': 1}
+
+
+def test_enqueue_rejects_unknown_kind_and_bad_params(app):
+    with pytest.raises(job_queue.JobError):
+        job_queue.enqueue('missing')
+    with pytest.raises(job_queue.JobError):
+        job_queue.enqueue('echo', {'unexpected': 1})
+    with pytest.raises(job_queue.JobError):
+        job_queue.enqueue('echo', ['not', 'a', 'dict'])
+
+
+def test_enqueue_reraises_integrity_errors_from_other_constraints(app):
+    # 额外的唯一约束：与已结束的任务dedup_key相同也会冲突，且不存在active_key冲突的任务
+    db.session.execute(text("CREATE UNIQUE INDEX ux_jobs_dedup_key ON jobs (dedup_key)"))
+    db.session.commit()
+    job, _ = job_queue.enqueue('echo', {'value': 1})
+    db.session.execute(update(Job).where(Job.id == job.id).values(status='succeeded', active_key=None))
+    db.session.commit()
+
+    inserts = []
+
+    @event.listens_for(db.engine, 'before_cursor_execute')
+    def count_inserts(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT INTO jobs'):
+            inserts.append(statement)
+
+    try:
+        with pytest.raises(IntegrityError):
+            job_queue.enqueue('echo', {'value': 1})
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count_inserts)
+    assert len(inserts) == 2  # 只重试一次
+
+
+def test_claim_next_job_orders_by_priority_then_submission(app):
+    low, _ = job_queue.enqueue('echo', {'value': 1}, priority=0)
+    high, _ = job_queue.enqueue('echo', {'value': 2}, priority=5)
+    later, _ = job_queue.enqueue('echo', {'value': 3}, priority=0)
+
+    claimed = [job_queue.claim_next_job('worker-a').id for _ in range(3)]
+    assert claimed == [high.id, low.id, later.id]
+    assert job_queue.claim_next_job('worker-a') is None
+
+
+def test_claim_skips_job_taken_by_another_worker(app):
+    first, _ = job_queue.enqueue('echo', {'value': 1})
+    second, _ = job_queue.enqueue('echo', {'value': 2})
+
+    # 在worker-a选中第一个任务之后、领取之前，worker-b抢先领取了它
+    raced = []
+
+    @event.listens_for(RoutingSession, 'do_orm_execute')
+    def race(state):
+        if state.is_update and not raced:
+            raced.append(True)
+            state.session.connection().execute(
+                update(Job).where(Job.id == first.id).values(status='running', worker='worker-b')
+            )
+
+    try:
+        claimed = job_queue.claim_next_job('worker-a')
+    finally:
+        event.remove(RoutingSession, 'do_orm_execute', race)
+
+    assert raced
+    assert claimed.id == second.id and claimed.worker == 'worker-a'
+    assert job_queue.get_job(first.id).worker == 'worker-b'
+    assert job_queue.get_job(first.id).attempts == 0
+
+
+def test_requeue_stale_jobs_respects_attempt_limit(app):
+    stale_at = datetime.utcnow() - timedelta(seconds=600)
+    jobs = {}
+    for value, attempts, heartbeat in (('retry', 1, stale_at), ('exhausted', 3, stale_at),
+                                       ('alive', 1, datetime.utcnow())):
+        job, _ = job_queue.enqueue('echo', {'value': value})
+        db.session.execute(update(Job).where(Job.id == job.id).values(
+            status='running', worker='gone', attempts=attempts, heartbeat_at=heartbeat
+        ))
+        jobs[value] = job.id
+    db.session.commit()
+
+    assert job_queue.requeue_stale_jobs() == 2
+    db.session.expire_all()
+
+    retry = job_queue.get_job(jobs['retry'])
+    assert retry.status == 'queued' and retry.worker is None and retry.active_key is not None
+    exhausted = job_queue.get_job(jobs['exhausted'])
+    assert exhausted.status == 'failed' and exhausted.active_key is None and exhausted.finished_at is not None
+    assert job_queue.get_job(jobs['alive']).status == 'running'
+
+    # 重新排队的任务被再次领取时计入尝试次数
+    claimed = job_queue.claim_next_job('worker-a')
+    assert claimed.id == jobs['retry'] and claimed.attempts == 2
+
+
+def test_failed_job_records_error_and_releases_key(app, monkeypatch):
+    def fail(progress):
+        raise RuntimeError('boom')
+    monkeypatch.setitem(job_queue.JOB_HANDLERS, 'fail', fail)
+
+    job, _ = job_queue.enqueue('fail')
+    assert job_queue.run_job(job_queue.claim_next_job('worker-a'), 'worker-a') == 'failed'
+    db.session.expire_all()
+    failed = job_queue.get_job(job.id)
+    assert failed.error == 'RuntimeError: boom' and failed.active_key is None
+    assert job_queue.enqueue('fail')[1]
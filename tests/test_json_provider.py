@@ -0,0 +1,48 @@
+# tests/test_json_provider.py
+# JSON提供器的测试：orjson与标准库json两条路径输出一致（NaN/Infinity为null），以及RawJSON片段的嵌入。
+#
+# 用法：python -m pytest tests
+
+import datetime
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from guzi_backend import json_provider
+from guzi_backend.json_provider import FastJSONProvider, frame_json
+
+
+@pytest.fixture(params=['orjson', 'json'])
+def provider(request, make_app, monkeypatch):
+    if request.param == 'orjson':
+        pytest.importorskip('orjson')
+    else:
+        monkeypatch.setattr(json_provider, 'orjson', None)
+    return FastJSONProvider(make_app())
+
+
+def test_non_finite_floats_serialize_as_null(provider):
+    payload = {
+        'nan': float('nan'), 'inf': float('inf'), 'ninf': -float('inf'),
+        'np': np.float64('nan'), 'np32': np.float32('inf'),
+        'array': np.array([1.5, np.nan, np.inf]),
+        'nested': [{'value': (float('nan'), 2.0)}],
+    }
+    encoded = provider.dumps_bytes(payload)
+    assert json.loads(encoded) == {
+        'array': [1.5, None, None], 'inf': None, 'nan': None, 'nested': [{'value': [None, 2.0]}],
+        'ninf': None, 'np': None, 'np32': None,
+    }
+    assert b'NaN' not in encoded and b'Infinity' not in encoded
+
+
+def test_builtin_conversions_and_fragments(provider):
+    frame = pd.DataFrame({'code': ['600000'], 'pe': [np.nan]})
+    encoded = provider.dumps_bytes({
+        'date': datetime.date(2026, 1, 5), 'count': np.int64(3), 'tags': {'a'}, 'rows': frame_json(frame),
+    })
+    assert json.loads(encoded) == {
+        'count': 3, 'date': '2026-01-05', 'rows': [{'code': '600000', 'pe': None}], 'tags': ['a'],
+    }
@@ -0,0 +1,133 @@
+# tests/test_screener.py
+# 筛选表达式编译器的测试：编译期类型检查、拒绝的语法，以及对齐数据上的求值结果。
+#
+# 用法：python -m pytest tests
+
+import re
+
+import pandas as pd
+import pytest
+
+from guzi_backend.services import screener
+from guzi_backend.services.screener import ScreenerError, compile_expression
+from guzi_backend.services.symbol_index import DataBundle, SymbolIndex
+
+
+@pytest.fixture
+def bundle():
+    index = SymbolIndex(['600000', '600001', '600002', '600003'],
+                        ['浦发银行', '白云机场', '东风汽车', '中国国贸'],
+                        ['银行', '机场', '汽车', None])
+    spot = index.align(pd.DataFrame({
+        '代码': ['600000', '600001', '600002'],
+        '最新价': [10.0, 20.0, 5.0],
+        '涨跌幅': [1.0, -2.0, 0.5],
+        '成交额': [1e8, 2e8, 3e7],
+        '总市值': [3e11, 4e10, 1e10],
+    }), '代码', ['最新价', '涨跌幅', '成交额', '总市值'])
+    valuation = index.align(pd.DataFrame({
+        '股票代码': ['600000', '600001', '600003'],
+        '市盈率': [5.0, 30.0, 12.0],
+        '市净率': [0.5, 3.0, 1.5],
+    }), '股票代码', ['市盈率', '市净率'])
+    return DataBundle(index, {'spot': spot, 'valuation': valuation})
+
+
+def selected(expression, bundle):
+    mask = compile_expression(expression).mask(bundle)
+    return [str(code) for code in bundle.index.codes[mask]]
+
+
+@pytest.mark.parametrize('expression, expected', [
+    ('pe < 15', ['600000', '600003']),
+    ('pe < 15 and pb < 1', ['600000']),
+    ('pe > 20 or market_cap < 2e10', ['600001', '600002']),
+    ('pe >= 15 or pe < 15', ['600000', '600001', '600003']),  # 缺失值（NaN）与任何数比较均不成立
+    ('not pe < 15', ['600001', '600002']),
+    ('industry in ("银行", "汽车")', ['600000', '600002']),
+    ('industry not in ("银行",)', ['600001', '600002', '600003']),
+    ('code == "600001"', ['600001']),
+    ('price * 2 > 30', ['600001']),
+    ('-change_percent > 1', ['600001']),
+    ('market_cap / 1e10 >= 4', ['600000', '600001']),
+    ('1 < pe < 20', ['600000', '600003']),
+    ('pb in (0.5, 3)', ['600000', '600001']),
+])
+def test_expressions_select_expected_stocks(bundle, expression, expected):
+    assert selected(expression, bundle) == expected
+
+
+def test_plan_lists_required_datasets():
+    assert compile_expression('pe < 15 and industry == "银行"').datasets == ('valuation',)
+    assert compile_expression('price > 1 and pb < 2').datasets == ('spot', 'valuation')
+    assert compile_expression('code == "600000"').datasets == ()
+
+
+@pytest.mark.parametrize('expression, message', [
+    # 类型错误在编译时发现，不依赖数据
+    ('code in (600001, 600002)', "'in' lists must contain strings"),
+    ('pe in ("5", "10")', "'in' lists must contain strings"),
+    ('industry in ("银行", 1)', "'in' lists must contain strings"),
+    ('pe < "15"', 'Text fields can only be compared with strings'),
+    ('name == 1', 'Text fields can only be compared with strings'),
+    ('"a" * 50000000 == name', 'Arithmetic (+ - * /) only applies to numeric fields'),
+    ('name + "x" == "y"', 'Arithmetic (+ - * /) only applies to numeric fields'),
+    ('-name == "x"', 'Unary + and - only apply to numbers'),
+    ('pe / 0 > 1', 'Division by zero'),
+    ('pe / (1 - 1) > 1', 'Division by zero'),
+    ('pe', 'Expression must evaluate to a condition'),
+    ('pe + 1', 'Expression must evaluate to a condition'),
+    ('pe and pb < 2', 'and / or / not can only combine conditions'),
+    ('not pe', 'and / or / not can only combine conditions'),
+    ('(pe < 1) < (pb < 2)', 'Conditions cannot be compared'),
+    ('pe in pb', "'in' must be followed by a list of constants"),
+    ('(pe < 1) in (True,)', "'in' can only test a field or arithmetic expression"),
+    ('unknown < 1', 'Unknown field: unknown'),
+    ('pe ** 2 > 1', 'Only + - * / are supported'),
+    ('pe is None', 'Unsupported comparison operator'),
+    ('pe <', 'Invalid expression'),
+    ('x' * (screener.MAX_EXPRESSION_LENGTH + 1), 'Expression is longer than'),
+])
+def test_invalid_expressions_fail_at_compile_time(expression, message):
+    with pytest.raises(ScreenerError, match=re.escape(message)):
+        compile_expression(expression)
+
+
+@pytest.mark.parametrize('expression', [
+    '__import__("os").system("true")',
+    'pe.real < 1',
+    'name[0] == "浦"',
+    '(lambda: 1)() == 1',
+    '[x for x in (1,)] == 1',
+    'pe < 15 if pb else pb < 2',
+    '{"a": 1} == 1',
+    'f"{name}" == "x"',
+    '(y := 1) == 1',
+    'pe < None',
+])
+def test_unsupported_syntax_is_rejected(expression):
+    with pytest.raises(ScreenerError):
+        compile_expression(expression)
+
+
+def test_screen_sorts_and_limits(bundle, monkeypatch):
+    monkeypatch.setattr(screener, 'fetch_bundle', lambda names: bundle)
+
+    result = screener.screen('pb > 0', sort='pe', descending=False, limit=2)
+    assert result['total'] == 3
+    assert [stock['code'] for stock in result['stocks']] == ['600000', '600003']
+    assert result['stocks'][1]['price'] is None  # 行情中缺失的股票
+
+
+def test_screen_rejects_bad_sort_and_limit():
+    with pytest.raises(ScreenerError, match='Cannot sort by name'):
+        screener.required_datasets('pe < 15', sort='name')
+    with pytest.raises(ScreenerError, match='limit must be between'):
+        screener.screen('pe < 15', limit=0)
+
+
+def test_screener_endpoint_returns_400_for_type_errors(make_app):
+    client = make_app().test_client()
+    response = client.get('/api/v1/screener', query_string={'q': 'code in (600001, 600002)'})
+    assert response.status_code == 400
+    assert response.get_json()['code'] == 40002
@@ -0,0 +1,111 @@
+# tests/test_watchlist.py
+# 自选股批量接口的测试：逐个代码返回的结果、去重、参数校验以及对在线推送订阅的更新。
+#
+# 用法：python -m pytest tests
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from guzi_backend import db
+from guzi_backend.models import Stock, User, UserWatchlist
+from guzi_backend.routes import watchlist as watchlist_routes
+from guzi_backend.services.identity_cache import identity_cache
+from guzi_backend.services.quote_hub import quote_hub
+
+
+@pytest.fixture(params=['conflict_insert', 'query_then_insert'])
+def app(request, make_app, monkeypatch):
+    if request.param == 'query_then_insert':
+        # 不支持 INSERT ... ON CONFLICT DO NOTHING RETURNING 的方言走先查询再插入的路径
+        monkeypatch.setattr(watchlist_routes, '_CONFLICT_IGNORE_INSERTS', {})
+    identity_cache.clear()
+    app = make_app()
+    with app.app_context():
+        db.session.add(User(id=1, username='alice', email='alice@example.com', password_hash='x'))
+        db.session.add_all([Stock(code=code, name=code, market='SH') for code in ('600000', '600001', '600002')])
+        db.session.add(UserWatchlist(user_id=1, stock_code='600000'))
+        db.session.commit()
+    return app
+
+
+@pytest.fixture
+def client(app):
+    with app.app_context():
+        token = create_access_token(identity='1')
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    return client
+
+
+def watchlist_codes(app):
+    with app.app_context():
+        return {code for (code,) in db.session.query(UserWatchlist.stock_code).filter_by(user_id=1)}
+
+
+def test_batch_add_reports_result_per_code(app, client):
+    response = client.post('/api/v1/watchlist/batch',
+                           json={'stock_codes': ['600001', '600000', '999999', '600001', '600002']})
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['message'] == '2 stocks added to watchlist'
+    assert body['data']['results'] == {
+        '600001': 'added', '600000': 'exists', '999999': 'not_found', '600002': 'added',
+    }
+    assert watchlist_codes(app) == {'600000', '600001', '600002'}
+
+
+def test_batch_add_accepts_numeric_codes(app, client):
+    response = client.post('/api/v1/watchlist/batch', json={'stock_codes': [600001]})
+    assert response.get_json()['data']['results'] == {'600001': 'added'}
+
+
+def test_batch_remove_reports_result_per_code(app, client):
+    client.post('/api/v1/watchlist/batch', json={'stock_codes': ['600001']})
+
+    response = client.delete('/api/v1/watchlist/batch', json={'stock_codes': ['600000', '600002', '600001']})
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['message'] == '2 stocks removed from watchlist'
+    assert body['data']['results'] == {'600000': 'removed', '600002': 'not_in_watchlist', '600001': 'removed'}
+    assert watchlist_codes(app) == set()
+
+
+@pytest.mark.parametrize('method', ['post', 'delete'])
+@pytest.mark.parametrize('payload, code', [
+    ({}, 40001),
+    ({'stock_codes': []}, 40001),
+    ({'stock_codes': '600000'}, 40001),
+    ({'stock_codes': [str(600000 + i) for i in range(watchlist_routes.WATCHLIST_BATCH_LIMIT + 1)]}, 40004),
+])
+def test_batch_rejects_invalid_payloads(app, client, method, payload, code):
+    response = getattr(client, method)('/api/v1/watchlist/batch', json=payload)
+    assert response.status_code == 400
+    assert response.get_json()['code'] == code
+    assert watchlist_codes(app) == {'600000'}
+
+
+def test_batch_requires_authentication(app):
+    response = app.test_client().post('/api/v1/watchlist/batch', json={'stock_codes': ['600001']})
+    assert response.status_code == 401
+
+
+def test_batch_changes_update_open_streams(app, client):
+    subscription = quote_hub.subscribe(1, ['600000'])
+    try:
+        client.post('/api/v1/watchlist/batch', json={'stock_codes': ['600001', '600002']})
+        assert subscription.symbols == {'600000', '600001', '600002'}
+        client.delete('/api/v1/watchlist/batch', json={'stock_codes': ['600000', '600001']})
+        assert subscription.symbols == {'600002'}
+    finally:
+        quote_hub.unsubscribe(subscription)
+
+
+def test_stream_rejects_connections_over_worker_limit(app, client, monkeypatch):
+    monkeypatch.setattr(quote_hub, 'max_streams', 0)
+    response = client.get('/api/v1/watchlist/stream')
+    assert response.status_code == 503
+    assert response.get_json()['code'] == 50303
+    assert response.headers['Retry-After'] == str(watchlist_routes.STREAM_HEARTBEAT_SECONDS)
+    assert quote_hub.stream_count == 0